@@ -0,0 +1,130 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import Objects.constants as constants
+
+
+class BackgroundPlanner:
+
+    # Plans the robot's next move while it is still doing the current one.
+    #
+    # As soon as the robot arm knows where its current move ends, it asks us to speculate on the next one.
+    # We choose the next target right away (without taking it, see robotManager.Target) and plan the route
+    # from the end of the current move on a worker thread. When the robot gets there, take() hands over the
+    # plan if it is still good: the target is still available, no obstacle moved, the robot really is where
+    # we planned from and the clock hands are still clear of the move. The hands were checked for when we expected
+    # the move to start, and the robot can get there later than that, so take() checks them again for now.
+    # Otherwise it returns None and the robot arm plans the usual way.
+    #
+    # The worker never touches the robot manager or the build sites the main thread uses. It plans with a snapshot of
+    # the robot manager (see RobotManager.snapshot) taken when we speculate, which has copies of the build sites.
+    # Meanwhile the main thread can go on processing the build sites and choosing targets. The only thing they share
+    # is the plan cache, which has its own lock.
+
+    # Kinds of moves
+    MOVE_TO_FEEDER      = 0
+    MOVE_TO_BUILD_SITE  = 1
+
+    # How far (mm) the robot can be from where we planned from and still use the plan
+    START_TOLERANCE = 2
+
+    def __init__(self, robotManager, threadedFlg: bool = True):
+        self.robotManager = robotManager
+
+        # Without a thread, speculating plans right away. The simulation does this so runs are repeatable
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='planner') if threadedFlg else None
+
+        # The plan in progress: (kind, start position, target, obstacle versions, future)
+        self.speculation = None
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+
+    def speculate(self, kind: int, startPos: tuple, clockPos: float = None, delay: float = 0) -> None:
+        """Starts planning the next move
+        Args:
+            kind (int): MOVE_TO_FEEDER or MOVE_TO_BUILD_SITE
+            startPos (tuple): (r, theta, z) where the robot will be when it starts the move
+            clockPos (float): Position of the minute hand, needed for build site moves
+            delay (float): Seconds until the move starts, so we know how long the minute hand gives the move
+                           and where the hands are during it
+        """
+        self.cancel()
+
+        if kind == self.MOVE_TO_FEEDER:
+            target = self.robotManager.chooseFeederTarget(clockPos)
+            moveTypes = self.robotManager.FEEDER_MOVES
+        else:
+            target = self.robotManager.chooseBuildSiteTarget(clockPos)
+            moveTypes = self.robotManager.BUILD_SITE_MOVES
+
+        if target is None:
+            return
+
+        # The minute hand keeps moving until the move starts
+        maxDuration = self.robotManager.maxMoveDuration(target, clockPos)
+        if maxDuration is not None:
+            maxDuration -= delay
+
+        obstacleVersions = self.robotManager.getObstacleVersions()
+        robotManager = self.robotManager.snapshot()
+
+        if self.executor is not None:
+            future = self.executor.submit(robotManager.planMove, startPos, target.location, moveTypes, maxDuration,
+                                          clockPos, delay)
+        else:
+            future = Future()
+            future.set_result(robotManager.planMove(startPos, target.location, moveTypes, maxDuration, clockPos, delay))
+
+        self.speculation = (kind, startPos, target, obstacleVersions, future)
+
+    def take(self, kind: int, robotPos: tuple, clockPos: float = None):
+        """Returns the speculated plan for a move if it is still good, otherwise None
+        The target of a plan that gets returned is taken, like moveToFeeder or moveToBuildSite would.
+        Args:
+            kind (int): MOVE_TO_FEEDER or MOVE_TO_BUILD_SITE
+            robotPos (tuple): (r, theta, z) position of the robot arm
+            clockPos (float): Position of the minute hand now, the move has to keep clear of the hands from here
+        Returns:
+            waypoints (Path): Waypoints for the robot arm to follow
+        """
+        if self.speculation is None:
+            return None
+
+        speculatedKind, startPos, target, obstacleVersions, future = self.speculation
+        self.speculation = None
+
+        # Let the plan finish either way, so we only ever make one at a time
+        waypoints = future.result()
+
+        if (speculatedKind != kind
+                or waypoints is None
+                or obstacleVersions != self.robotManager.getObstacleVersions()
+                or not self.robotManager.isTargetValid(target)
+                or not self.isNear(startPos, robotPos)
+                or not self.isClearOfHands(waypoints, target, robotPos, clockPos)):
+            self.misses += 1
+            return None
+
+        self.robotManager.commitTarget(target)
+        self.hits += 1
+        return waypoints
+
+    def cancel(self) -> None:
+        """Throws away the plan in progress"""
+        if self.speculation is not None:
+            self.speculation[4].result()
+            self.speculation = None
+
+    def isClearOfHands(self, waypoints, target, robotPos: tuple, clockPos: float) -> bool:
+        """Returns True if a plan starting now still beats the minute hand to its target and keeps clear of the hands"""
+        maxDuration = self.robotManager.maxMoveDuration(target, clockPos)
+        if maxDuration is not None and self.robotManager.estimateDuration(waypoints, robotPos) > maxDuration:
+            return False
+        hands = self.robotManager.getHands(clockPos)
+        return not hands or not self.robotManager.getHandHits(waypoints, robotPos, hands).any()
+
+    def isNear(self, position0: tuple, position1: tuple) -> bool:
+        x0, y0, z0 = constants.polarToCartesian(position0)
+        x1, y1, z1 = constants.polarToCartesian(position1)
+        return abs(x0 - x1) < self.START_TOLERANCE and abs(y0 - y1) < self.START_TOLERANCE and abs(z0 - z1) < self.START_TOLERANCE
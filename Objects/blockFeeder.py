@@ -1,7 +1,5 @@
-import time
-from time import sleep
-from DPi_ClockNBlock_Python.DPiClockNBlock import DPiClockNBlock
 import Objects.constants as constants
+import Objects.hardware as hardware
 
 
 class BlockFeeder:
@@ -19,7 +17,7 @@ class BlockFeeder:
         self.index = dpiClockNBlockNumber
         self.sidePiston = solenoidNumbers[0]
         self.upPiston = solenoidNumbers[1]
-        self.dpiClockNBlock = DPiClockNBlock()
+        self.dpiClockNBlock = hardware.createClockNBlock()
         self.dpiClockNBlock.setBoardNumber(dpiClockNBlockNumber)
         self.dpiSolenoid = dpiSolenoid
 
@@ -52,7 +50,7 @@ class BlockFeeder:
         self.dpiSolenoid.switchDriverOnOrOff(self.upPiston, False)
 
         # Wait for them to retract
-        sleep(2)
+        hardware.sleep(2)
 
         # Check if a block is ready to be pushed over, and there isn't a block already pushed over
         if self.dpiClockNBlock.readFeed_1() and not self.dpiClockNBlock.readFeed_2():
@@ -61,7 +59,7 @@ class BlockFeeder:
 
             # Wait for the block to be pushed over
             while not self.dpiClockNBlock.readFeed_2():
-                sleep(0.1)
+                hardware.sleep(0.1)
 
         # Check if block actually made it
         if self.dpiClockNBlock.readFeed_2():
@@ -70,7 +68,7 @@ class BlockFeeder:
 
             # Wait for the block to be at the top
             while not self.dpiClockNBlock.readExit():
-                sleep(0.1)
+                hardware.sleep(0.1)
 
             # Retract the side piston as it is not necessary for it to be pushed over anymore
             self.dpiSolenoid.switchDriverOnOrOff(self.sidePiston, False)
@@ -114,11 +112,11 @@ class BlockFeeder:
 
                 # Pull piston down
                 self.dpiSolenoid.switchDriverOnOrOff(self.upPiston, False)
-                self.start = time.time()
+                self.start = hardware.time()
                 self.newState = False
                 return
 
-            if time.time() - self.start > 1.5:
+            if hardware.time() - self.start > 1.5:
                 self.setState(self._STATE_PUSH_OVER)
                 return
 
@@ -172,9 +170,10 @@ class BlockFeeder:
 
     def updateReadyFlg(self, minuteHandPosition: float):
 
-        feederTheta = self.location[1]
+        feederR, feederTheta = self.location[0], self.location[1]
 
-        if abs(minuteHandPosition - feederTheta) < constants.clockDeadZone:
+        # The minute hand is in the robot's way
+        if constants.angleBetween(minuteHandPosition, feederTheta) < constants.handClearance(feederR):
             self.isReadyFlg = False
             return
 
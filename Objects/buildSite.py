@@ -22,9 +22,15 @@ class BuildSite:
         self.currentBlock = None
         self.blockPlacements = None
 
-        # Intersection rectangle in cartesian coordinates
+        # Intersection rectangle in polar coordinates. Only change it through setIntersectionRectangle
+        # or setIntersectionHeight so the cartesian copy below stays up to date
         self.intersectionRectangle = None
 
+        # The intersection rectangle in the cartesian form the collision checks use (see constants.rectangleToCartesian)
+        # The version goes up every time the rectangle changes so the robot manager knows when to update its copy
+        self.intersectionObstacle = None
+        self.intersectionVersion = 0
+
         # Flags
         self.isReadyFlg = False
 
@@ -36,13 +42,13 @@ class BuildSite:
         self.currentBlock = 0
         self.isReadyFlg = True
 
-        # Intersection rectangle in cartesian coordinates
+        # Intersection rectangle in polar coordinates
         corner0 = (self.location0[0] - constants.robotHeadRadius, self.location0[1], self.location0[2])
         corner1 = self.location1
         zHeight = corner0[2] + 10
         corner2 = (corner0[0], corner1[1], zHeight)
         corner3 = (corner1[0], corner0[1], zHeight)
-        self.intersectionRectangle = [corner0, corner1, corner2, corner3]
+        self.setIntersectionRectangle([corner0, corner1, corner2, corner3])
 
         return True
 
@@ -87,8 +93,11 @@ class BuildSite:
 
     def updateReadyFlg(self, minuteHandPosition: float) -> None:
 
-        # If the minute hand is within x degrees of the build site, we are not ready
-        if abs(self.location0[1] - minuteHandPosition) < constants.clockDeadZone or abs(self.location1[1] - minuteHandPosition) > 360 - constants.clockDeadZone:
+        # If the minute hand is in the robot's way anywhere on the build site, we are not ready.
+        # It knocks the tower over on its way past. The inside end is where it is in the way the longest
+        clearance = constants.handClearance(self.location0[0])
+        if (constants.angleBetween(self.location0[1], minuteHandPosition) < clearance
+                or constants.angleBetween(self.location1[1], minuteHandPosition) < clearance):
             self.isReadyFlg = False
             self.currentBlock = 0
             return
@@ -118,8 +127,24 @@ class BuildSite:
             return
 
         # Update the top of the rectangle
-        self.intersectionRectangle[2] = (self.intersectionRectangle[2][0], self.intersectionRectangle[2][1], currentZHeight)
-        self.intersectionRectangle[3] = (self.intersectionRectangle[3][0], self.intersectionRectangle[3][1], currentZHeight)
+        self.setIntersectionHeight(currentZHeight)
+
+    def setIntersectionRectangle(self, rectangle: list) -> None:
+        """Sets the intersection rectangle and updates its cartesian copy
+        Args:
+            rectangle (list): [point0, point1, point2, point3] in polar coordinates
+        """
+        self.intersectionRectangle = rectangle
+        self.intersectionObstacle = constants.rectangleToCartesian(rectangle)
+        self.intersectionVersion += 1
+
+    def setIntersectionHeight(self, zHeight: float) -> None:
+        """Moves the top of the intersection rectangle to zHeight"""
+        corner0, corner1, corner2, corner3 = self.intersectionRectangle
+        if corner2[2] == zHeight and corner3[2] == zHeight:
+            return
+
+        self.setIntersectionRectangle([corner0, corner1, (corner2[0], corner2[1], zHeight), (corner3[0], corner3[1], zHeight)])
 
     def placeNextBlock(self) -> tuple or None:
         """Places the next block in the list of placements"""
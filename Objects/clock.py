@@ -1,11 +1,217 @@
-from time import sleep, localtime
-from dpeaDPi.DPiStepper import DPiStepper
+import Objects.constants as constants
+import Objects.hardware as hardware
+
+
+class HandStateEstimator:
+
+    # Works out where a clock hand is without reading it from the board.
+    #
+    # The hands run at speeds we set, so the last position we read plus how far the hand has gone at its speed
+    # since then tells us where it is now. The position only gets read again every resyncPeriod seconds,
+    # or every time if we don't know the hand's speed, like while it makes a correction move.
+
+    def __init__(self, resyncPeriod: float = constants.handResyncPeriod):
+        self.resyncPeriod = resyncPeriod
+
+        # Where the hand was at positionTime, in steps, and its speed since then in steps per second.
+        # Either is None when we don't know it
+        self.position = None
+        self.positionTime = None
+        self.speed = None
+
+        # When the position was last read from the board, and when the speed last changed
+        self.readTime = None
+        self.speedTime = None
+
+    def measured(self, position: float, readTime: float) -> None:
+        """The position got read from the board at readTime"""
+        self.position = position
+        self.positionTime = readTime
+        self.readTime = readTime
+
+    def speedChanged(self, speed: float or None) -> None:
+        """The hand's speed got set, None if we don't know how it is going to move"""
+        now = hardware.time()
+        if speed is not None and self.speed is not None and self.position is not None:
+            # Carry on from where the hand is now
+            self.position += self.speed * (now - self.positionTime)
+            self.positionTime = now
+        else:
+            self.position = None
+        self.speed = speed
+        self.speedTime = now
+
+    def lastChange(self) -> float:
+        """Returns when the position was last read or the speed last changed, older readings are no use to us"""
+        return max(self.readTime or 0, self.speedTime or 0)
+
+    def estimate(self, now: float) -> float or None:
+        """Returns where the hand is at now, in steps, or None if it needs to be read"""
+        if self.position is None or self.speed is None or now - self.readTime > self.resyncPeriod:
+            return None
+        return self.position + self.speed * (now - self.positionTime)
+
+
+class HandTracker:
+
+    # Keeps one clock hand on time without sending it a new move every time the clock is processed.
+    #
+    # The hand runs towards a target a revolution ahead at its base speed, and every TRIM_PERIOD seconds a PI
+    # controller on how far it is from where it should be trims that speed a little. The speed only gets sent
+    # when it changes by more than SPEED_DEADBAND, and the target only gets pushed out once the hand is halfway
+    # there, so a hand on time barely uses the bus.
+    # If the hand is more than CORRECTION_TIME seconds off, like after the board lost steps or the time jumped,
+    # it goes there at its max speed and starts tracking again once it gets there.
+    # The time it tracks can run at some other rate than the base speed, like while the clock catches back up after
+    # fast forwarding. That goes straight into the speed, the controller still trims it.
+    # The tracker keeps its HandStateEstimator up to date with every speed it sends.
+
+    TRIM_PERIOD = 5  # Seconds
+    # The proportional gain takes out an error in about this many seconds, the integral this many more
+    PROPORTIONAL_TIME = 30
+    INTEGRAL_TIME = 120
+    # Most the speed gets trimmed by, as a fraction of the base speed
+    MAX_TRIM = 0.1
+    # Smallest speed change (fraction of the base speed) worth sending
+    SPEED_DEADBAND = 0.01
+    # Errors smaller than this many seconds (and at least a step) are just noise from when the position got read
+    ERROR_DEADBAND_TIME = 0.25
+    # Seconds off (and at least a few steps) before we stop trimming and move the hand
+    CORRECTION_TIME = 5
+
+    def __init__(self, dpiStepper, pin: int, stepsPerRevolution: int, baseSpeed: float, maxSpeed: float):
+        self.dpiStepper = dpiStepper
+        self.pin = pin
+        self.stepsPerRevolution = stepsPerRevolution
+        self.baseSpeed = baseSpeed
+        self.maxSpeed = maxSpeed
+        self.errorDeadband = max(self.ERROR_DEADBAND_TIME * baseSpeed, 1)
+        self.correctionThreshold = max(self.CORRECTION_TIME * baseSpeed, 3 * self.errorDeadband)
+
+        self.trackingFlg = False
+        self.correctingFlg = False
+        # Where the hand was last time, to tell when a correction move is done
+        self.lastPosition = None
+        # Where the move we are tracking with ends
+        self.target = None
+        self.speed = None
+        # How fast the time we track goes, as a fraction of the base speed
+        self.rate = 1
+        self.integral = 0
+        self.lastTrimTime = None
+
+        self.estimator = HandStateEstimator()
+
+        # Stats
+        self.commandsSent = 0
+        self.corrections = 0
+
+    def reset(self) -> None:
+        """Forgets what the hand was doing, like after it was stopped or moved somewhere else"""
+        self.trackingFlg = False
+        self.correctingFlg = False
+        self.estimator.speedChanged(None)
+
+    def process(self, position: int, desiredPosition: float, rate: float = 1) -> None:
+        """Keeps the hand on time
+        Args:
+            position (float): Where the hand is, in steps
+            desiredPosition (float): Where the hand should be, in steps. Only the position in the revolution matters
+            rate (float): How fast desiredPosition moves, as a fraction of the base speed
+        """
+        # How far behind the hand is, going whichever way around is shorter.
+        # This way going from 11:59 to 12:00 is a small step, not almost a whole revolution backwards
+        halfRevolution = self.stepsPerRevolution / 2
+        error = (desiredPosition - position + halfRevolution) % self.stepsPerRevolution - halfRevolution
+
+        if self.correctingFlg:
+            # The correction move is done once the hand stops
+            if position != self.lastPosition:
+                self.lastPosition = position
+                return
+            self.correctingFlg = False
+
+        if rate != self.rate:
+            if self.trackingFlg:
+                # Keep the trim, only the speed it trims changes
+                self.changeSpeed(self.speed + (rate - self.rate) * self.baseSpeed)
+            self.rate = rate
+
+        if abs(error) > self.correctionThreshold:
+            self.correct(position, error)
+            return
+
+        if not self.trackingFlg:
+            self.startTracking(position)
+            return
+
+        # Push the target out again once we are halfway there
+        if self.target - position < self.stepsPerRevolution / 2:
+            self.moveRelative(self.stepsPerRevolution)
+            self.target = position + self.stepsPerRevolution
+
+        now = hardware.time()
+        if now - self.lastTrimTime >= self.TRIM_PERIOD:
+            self.trim(error, now - self.lastTrimTime)
+            self.lastTrimTime = now
+
+    def trim(self, error: float, elapsed: float) -> None:
+        """Updates the PI controller and sends the new speed if it changed enough"""
+        if abs(error) <= self.errorDeadband:
+            error = 0
+
+        maxTrim = self.MAX_TRIM * self.baseSpeed
+        gain = 1 / self.PROPORTIONAL_TIME
+
+        # Only build up the integral while the trim isn't maxed out, or it overshoots once the error is gone
+        integral = self.integral + error * elapsed / self.INTEGRAL_TIME
+        trim = gain * (error + integral)
+        if abs(trim) <= maxTrim:
+            self.integral = integral
+        else:
+            trim = maxTrim if trim > 0 else -maxTrim
+
+        speed = self.rate * self.baseSpeed + trim
+        if abs(speed - self.speed) > self.SPEED_DEADBAND * self.baseSpeed:
+            self.changeSpeed(speed)
+
+    def startTracking(self, position: float) -> None:
+        speed = self.rate * self.baseSpeed
+        self.setSpeed(speed)
+        self.moveRelative(self.stepsPerRevolution)
+        # The hand was stopped or moving some other way, so this makes us read where it is next time
+        self.estimator.speedChanged(None)
+        self.estimator.speedChanged(speed)
+        self.target = position + self.stepsPerRevolution
+        self.integral = 0
+        self.lastTrimTime = hardware.time()
+        self.trackingFlg = True
+
+    def correct(self, position: float, error: float) -> None:
+        self.setSpeed(self.maxSpeed)
+        self.moveRelative(int(round(error)))
+        self.estimator.speedChanged(None)
+        self.correctingFlg = True
+        self.lastPosition = None
+        self.trackingFlg = False
+        self.corrections += 1
+
+    def changeSpeed(self, speed: float) -> None:
+        """Changes the speed of the hand while it is tracking"""
+        self.setSpeed(speed)
+        self.estimator.speedChanged(speed)
+
+    def setSpeed(self, speed: float) -> None:
+        self.dpiStepper.setSpeedInStepsPerSecond(self.pin, speed)
+        self.speed = speed
+        self.commandsSent += 1
+
+    def moveRelative(self, steps: int) -> None:
+        self.dpiStepper.moveToRelativePositionInSteps(self.pin, steps, False)
+        self.commandsSent += 1
 
 
 class Clock:
-    # Constants
-    dpiStepper = DPiStepper()
-
     # Motor Constants
     MICROSTEPPING = 8
 
@@ -30,11 +236,45 @@ class Clock:
     MINUTE_HAND_MAX_SPEED = 20000
     MINUTE_HAND_ACCELERATION = MINUTE_HAND_MAX_SPEED // 4
 
+    # Fast forwarding. Once there has been nothing to build for FAST_FORWARD_WAIT seconds, because no feeder has a
+    # block ready or no build site has room, the robot is waiting on the minute hand. So the hands jump ahead
+    # of the time FAST_FORWARD_STEP seconds at a time at their max speeds, up to constants.clockMaxDrift seconds,
+    # knocking the towers over and getting out of the way of the feeders sooner. A step only starts while the robot
+    # isn't moving, its path was planned around the hands going at their usual speeds.
+    # Once the robot is busy again the hands run at CATCH_UP_RATE of their base speeds until they show the time again.
+    # They never go backwards, that would knock over the towers the robot is building.
+    FAST_FORWARD_WAIT = 10  # Seconds
+    # A step is 6 degrees for the minute hand. The robot waits for a step to finish before it starts anything,
+    # since it doesn't know how fast the hand is going until then. See getMinuteHandSpeed
+    FAST_FORWARD_STEP = 60  # Seconds
+    CATCH_UP_RATE = 0.5
+
     # TODO: Ask Stan what's up with this
 
     def __init__(self):
+        self.dpiStepper = hardware.createStepper()
         self.initialize()
-        self.robotIdleFlg = False
+        # Set by main, see fast forwarding above
+        self.robotMovingFlg = False
+        self.nothingToBuildFlg = False
+
+        # How many seconds ahead of the time the hands are, when that was last updated,
+        # and since when the robot has been waiting on the minute hand
+        self.timeOffset = 0
+        self.offsetTime = None
+        self.waitingSince = None
+
+        # Reads the hand positions for us when main gives us one, see Objects/hardwareMonitor.py
+        self.hardwareMonitor = None
+
+        # Keep the hands on time once they are set up, see setup2 and process
+        self.hourHandTracker = HandTracker(self.dpiStepper, self.HOUR_HAND_PIN, self.HOUR_HAND_STEPS_PER_REVOLUTION,
+                                           self.HOUR_HAND_BASE_SPEED, self.HOUR_HAND_MAX_SPEED)
+        self.minuteHandTracker = HandTracker(self.dpiStepper, self.MINUTE_HAND_PIN, self.MINUTE_HAND_STEPS_PER_REVOLUTION,
+                                             self.MINUTE_HAND_BASE_SPEED, self.MINUTE_HAND_MAX_SPEED)
+
+        # Stats
+        self.fastForwardSteps = 0
 
     def initialize(self):
 
@@ -62,7 +302,7 @@ class Clock:
                                           self.MINUTE_HAND_STEPS_PER_REVOLUTION)
 
         while not self.dpiStepper.getAllMotorsStopped():
-            sleep(0.1)
+            hardware.sleep(0.1)
 
         # Move to 12:00 position
         self.setSpeeds(self.HOUR_HAND_MAX_SPEED, self.MINUTE_HAND_MAX_SPEED)
@@ -71,7 +311,7 @@ class Clock:
         self.dpiStepper.moveToRelativePositionInSteps(self.MINUTE_HAND_PIN, -81100, False)
 
         while not self.dpiStepper.getAllMotorsStopped():
-            sleep(0.1)
+            hardware.sleep(0.1)
 
         self.dpiStepper.setCurrentPositionInSteps(self.HOUR_HAND_PIN, 0)
         self.dpiStepper.setCurrentPositionInSteps(self.MINUTE_HAND_PIN, 0)
@@ -88,7 +328,7 @@ class Clock:
         # Send minute hand in a full circle
         self.dpiStepper.moveToRelativePositionInSteps(self.MINUTE_HAND_PIN, self.MINUTE_HAND_STEPS_PER_REVOLUTION, True)
         # Move to current time
-        t = localtime()
+        t = hardware.localtime()
         hourToSteps, minuteToSteps = self.convertTimeToSteps(t.tm_hour, t.tm_min, t.tm_sec)
         print(f'Hour: {t.tm_hour}, Minute: {t.tm_min}, Second: {t.tm_sec}')
         print(f'Hour Steps: {hourToSteps}, Minute Steps: {minuteToSteps}')
@@ -101,6 +341,13 @@ class Clock:
         print(self.setSpeeds(self.HOUR_HAND_BASE_SPEED, self.MINUTE_HAND_BASE_SPEED))
         print(f'Minute Hand Base Speed: {self.MINUTE_HAND_BASE_SPEED}')
 
+        # process() starts the hands tracking the time from here
+        self.hourHandTracker.reset()
+        self.minuteHandTracker.reset()
+        self.timeOffset = 0
+        self.offsetTime = None
+        self.waitingSince = None
+
         # Set minute hand going for a revolution
         # self.moveToPositionsRelative(minuteHandPosition=self.MINUTE_HAND_STEPS_PER_REVOLUTION)
 
@@ -108,40 +355,48 @@ class Clock:
 
     def process(self):
         """Processes the clock"""
-        # This just basically includes checking how far off from the desired position the hands are
-        # if they are too far away, then speed/slow them down to get them back to the desired position
-
-        # Note: One case where this will be off is when there is a transfer from 11:59 to 12:00
-        # or something along those lines. However, this will be fixed fairly quickly because it will only speed up for around
-        # 1 second and then slow down again. This needs to be tested though
-
-        # Get current time
-        t = localtime()
-        hourToSteps, minuteToSteps = self.convertTimeToSteps(t.tm_hour, t.tm_min, t.tm_sec)
-        hourToSteps = hourToSteps % self.HOUR_HAND_STEPS_PER_REVOLUTION
-        minuteToSteps = minuteToSteps % self.MINUTE_HAND_STEPS_PER_REVOLUTION
+        # The hands run at their base speeds all the time, the trackers only trim the speeds when the hands drift
+        # and move them if they get too far off, like when the time jumps. See HandTracker
+        now = hardware.time()
+        rate = self.updateTimeOffset(now)
 
+        # Get where the hands should be right now, to the fraction of a second
+        # Both parts come from the same reading, so they can't end up either side of a second
+        t = hardware.localtime(now)
+        hourToSteps, minuteToSteps = self.convertTimeToSteps(t.tm_hour, t.tm_min, t.tm_sec + now % 1 + self.timeOffset)
 
         # Get current positions
-        _successFlg, hourPosition = self.dpiStepper.getCurrentPositionInSteps(self.HOUR_HAND_PIN)
-        hourPosition = hourPosition % self.HOUR_HAND_STEPS_PER_REVOLUTION
-        _successFlg, minutePosition = self.dpiStepper.getCurrentPositionInSteps(self.MINUTE_HAND_PIN)
-        minutePosition = minutePosition % self.MINUTE_HAND_STEPS_PER_REVOLUTION
-
-        # Calculate the difference between the desired position and the current position
-        hourDifference = hourToSteps - hourPosition
-        minuteDifference = minuteToSteps - minutePosition
-
-        # If there is a difference in the hour hand, send it to the desired position
-        if hourDifference != 0:
-            # print(f'Hour hand is off by {hourDifference} steps')
-            self.dpiStepper.moveToRelativePositionInSteps(self.HOUR_HAND_PIN, hourDifference, False)
-
-
-        if minuteDifference != 0:
-            # print(f'Minute hand is off by {minuteDifference} steps')
-            self.dpiStepper.moveToRelativePositionInSteps(self.MINUTE_HAND_PIN, minuteDifference, False)
-
+        hourPosition, minutePosition = self.getPositionsInSteps()
+
+        self.hourHandTracker.process(hourPosition, hourToSteps, rate)
+        self.minuteHandTracker.process(minutePosition, minuteToSteps, rate)
+
+    def updateTimeOffset(self, now: float) -> float:
+        """Fast forwards the hands while the robot waits on the minute hand, and brings them back to the time after
+        Returns:
+            float: How fast the time the hands show goes, as a fraction of their base speeds
+        """
+        elapsed = 0 if self.offsetTime is None else now - self.offsetTime
+        self.offsetTime = now
+
+        if not self.nothingToBuildFlg:
+            self.waitingSince = None
+        elif self.waitingSince is None:
+            self.waitingSince = now
+
+        if self.waitingSince is not None and now - self.waitingSince >= self.FAST_FORWARD_WAIT:
+            # The trackers make each step a correction move, take the next one once the hands are done with it
+            correctingFlg = self.hourHandTracker.correctingFlg or self.minuteHandTracker.correctingFlg
+            if self.timeOffset < constants.clockMaxDrift and not correctingFlg and not self.robotMovingFlg:
+                self.timeOffset = min(self.timeOffset + self.FAST_FORWARD_STEP, constants.clockMaxDrift)
+                self.fastForwardSteps += 1
+            return 1
+
+        if self.timeOffset > 0:
+            self.timeOffset = max(self.timeOffset - (1 - self.CATCH_UP_RATE) * elapsed, 0)
+            if self.timeOffset > 0:
+                return self.CATCH_UP_RATE
+        return 1
 
     #--------------------------------    Helper functions    --------------------------------#
 
@@ -162,7 +417,7 @@ class Clock:
 
         if waitFlg:
             while not self.dpiStepper.getAllMotorsStopped():
-                sleep(0.1)
+                hardware.sleep(0.1)
 
     def moveToPositionDegrees(self, hourDegrees=None, minuteDegrees=None, waitFlg=True) -> None:
         """Moves the hands to the given positions in degrees"""
@@ -180,8 +435,7 @@ class Clock:
         hourToSteps, minuteToSteps = self.convertTimeToSteps(hour, minute, second)
 
         # Calculate the steps to move
-        _successFlg, hourPosition = self.dpiStepper.getCurrentPositionInSteps(self.HOUR_HAND_PIN)
-        _successFlg, minutePosition = self.dpiStepper.getCurrentPositionInSteps(self.MINUTE_HAND_PIN)
+        hourPosition, minutePosition = self.getPositionsInSteps()
 
         hourDifference = hourToSteps - hourPosition % self.HOUR_HAND_STEPS_PER_REVOLUTION
         minuteDifference = minuteToSteps - minutePosition % self.MINUTE_HAND_STEPS_PER_REVOLUTION
@@ -190,7 +444,8 @@ class Clock:
 
     def convertTimeToSteps(self, hour: int, minute: int, second=0) -> tuple:
         """Converts the given time to steps"""
-        hourToSteps = hour * self.HOUR_HAND_STEPS_PER_REVOLUTION // 12 + minute * self.HOUR_HAND_STEPS_PER_REVOLUTION // (12 * 60)
+        hourToSteps = (hour * self.HOUR_HAND_STEPS_PER_REVOLUTION // 12 + minute * self.HOUR_HAND_STEPS_PER_REVOLUTION // (12 * 60)
+                       + second * self.HOUR_HAND_STEPS_PER_REVOLUTION // (12 * 60 * 60))
         minuteToSteps = minute * self.MINUTE_HAND_STEPS_PER_REVOLUTION // 60 + second * self.MINUTE_HAND_STEPS_PER_REVOLUTION // (60 * 60)
 
         return hourToSteps, minuteToSteps
@@ -206,8 +461,7 @@ class Clock:
 
     def getPositionDegrees(self) -> tuple:
         """Gets the position of the hands in degrees"""
-        _successFlg, hourPosition = self.dpiStepper.getCurrentPositionInSteps(self.HOUR_HAND_PIN)
-        _successFlg, minutePosition = self.dpiStepper.getCurrentPositionInSteps(self.MINUTE_HAND_PIN)
+        hourPosition, minutePosition = self.getPositionsInSteps()
 
         hourPosition = hourPosition % self.HOUR_HAND_STEPS_PER_REVOLUTION
         minutePosition = minutePosition % self.MINUTE_HAND_STEPS_PER_REVOLUTION
@@ -221,7 +475,63 @@ class Clock:
 
         return hourDegrees, minuteDegrees
 
+    def getMinuteHandSpeed(self) -> float or None:
+        """Gets how fast the minute hand's angle is going down in degrees per second,
+        None if we don't know, like while it makes a correction move"""
+        speed = self.minuteHandTracker.estimator.speed
+        if speed is None:
+            return None
+        return speed / self.MINUTE_HAND_STEPS_PER_REVOLUTION * 360
+
+    def getHourHandSpeed(self) -> float or None:
+        """Gets how fast the hour hand's angle is going down in degrees per second,
+        None if we don't know, like while it makes a correction move"""
+        speed = self.hourHandTracker.estimator.speed
+        if speed is None:
+            return None
+        return speed / self.HOUR_HAND_STEPS_PER_REVOLUTION * 360
+
+    def getPositionsInSteps(self) -> tuple:
+        """Gets the (hour, minute) positions of the hands in steps
+        While the hands are tracking the time, this works them out from their speeds instead of reading them.
+        See HandStateEstimator
+        """
+        now = hardware.time()
+        estimators = (self.hourHandTracker.estimator, self.minuteHandTracker.estimator)
+        positions = tuple(estimator.estimate(now) for estimator in estimators)
+        if None not in positions:
+            return positions
+
+        readTime, positions = self.readPositionsInSteps()
+        for estimator, position in zip(estimators, positions):
+            estimator.measured(position, readTime)
+        return positions
+
+    def readPositionsInSteps(self) -> tuple:
+        """Reads the (hour, minute) positions of the hands in steps, returns (read time, positions)
+        Uses the hardware monitor's reading if it is recent enough
+        """
+        if self.hardwareMonitor is not None:
+            # Any reading since the hands' speeds last changed is good enough if we can work out where they went
+            # since. Otherwise it has to be recent
+            estimators = (self.hourHandTracker.estimator, self.minuteHandTracker.estimator)
+            since = max(estimator.lastChange() for estimator in estimators)
+            if all(estimator.speed is not None for estimator in estimators):
+                maxAge = constants.handResyncPeriod
+            else:
+                maxAge = 2 / constants.clockProcessRate
+            reading = self.hardwareMonitor.getHandReading(since, maxAge)
+            if reading is not None:
+                return reading
+
+        readTime = hardware.time()
+        _successFlg, hourPosition = self.dpiStepper.getCurrentPositionInSteps(self.HOUR_HAND_PIN)
+        _successFlg, minutePosition = self.dpiStepper.getCurrentPositionInSteps(self.MINUTE_HAND_PIN)
+        return readTime, (hourPosition, minutePosition)
+
     def emergencyStop(self) -> None:
         """Stops both hands"""
         self.dpiStepper.emergencyStop(self.HOUR_HAND_PIN)
-        self.dpiStepper.emergencyStop(self.MINUTE_HAND_PIN)
\ No newline at end of file
+        self.dpiStepper.emergencyStop(self.MINUTE_HAND_PIN)
+        self.hourHandTracker.reset()
+        self.minuteHandTracker.reset()
\ No newline at end of file
@@ -10,6 +10,15 @@ magnetSolenoid = 11
 rotationSolenoid = 10
 robotHeadRadius = 80  # Major radius of the robot end effector mm
 robotSpeed = 120
+# Limits for the speeds RobotManager.planSpeeds gives each move, in mm and seconds.
+# The acceleration and junction deviation are what oneTimeSetup/LinearDeltaRobotSetup.py gives the board,
+# 6400 steps/s^2 and 32 steps at 47.407 steps/mm
+robotMaxSpeed = 250
+robotApproachSpeed = 60  # For the last moves onto the target
+robotMinSpeed = 10
+robotAcceleration = 135
+robotJunctionDeviation = 0.675
+robotPlannerLookahead = 64  # How many waypoints ahead the robot plans its speed, it can always stop within them
 rotationHeight = -1430
 maximumMovingRadius = 350  # mm
 robotMovingPadding = 10  # Padding for robot arm to move around blocks mm
@@ -17,8 +26,35 @@ degreesPerBlock = 360 / blockSize + blockPadding  # Degrees per block
 maximumSpiralingZHeight = -1210  # mm
 
 # Clock
-clockDeadZone = 45  # Degrees
+# The hands run out from the center of the clock. The robot head is in a hand's way when it is below the hand's
+# z height and closer than handClearance() degrees to it. See ClockHand in Objects/robotManager.py
+minuteHandWidth = 30  # mm, where it goes over the feeders and build sites
+minuteHandLength = 560  # mm, past the outside end of the build sites
+minuteHandSpeed = 360 / (60 * 60)  # Degrees per second, the minute hand's angle goes down this fast
+# Most the clock gets ahead of the time while it fast forwards for the robot (seconds). See Clock.process
+clockMaxDrift = 15 * 60
 hourHandZHeight = -1416.5
+hourHandWidth = 30  # mm
+hourHandLength = 180  # mm, short of the robot head at the inside end of the build sites, see docs/setup.md
+hourHandSpeed = 360 / (12 * 60 * 60)  # Degrees per second
+
+# How often main() processes each object, in Hz
+clockProcessRate = 2
+feederProcessRate = 20
+buildSiteProcessRate = 10
+robotProcessRate = 50
+
+# Seconds between reading where the clock hands are, in between they are worked out from their speeds.
+# See HandStateEstimator in Objects/clock.py
+handResyncPeriod = 10
+
+# Waypoints sent before the robot starts moving, then at most this many each time it is processed.
+# See Objects/waypointStreamer.py
+robotInitialWaypoints = 16
+robotWaypointsPerProcess = 4
+
+# Outputs that haven't changed are only written again after this long, in seconds. See Objects/shadowRegisters.py
+outputResyncPeriod = 10
 
 # Feeder solenoids in (side, up) order
 blockFeederSolenoids = [(6, 7),
@@ -46,6 +82,8 @@ blockFeederLocations = [(343.0, 308.000, -1472.6),
 # The place where we will place a block on the clock's minute hand
 clockMinuteHandRadius = 325.6
 clockMinuteHandZHeight = -1416.5
+# Place blocks on the minute hand when there is no build site to place them on. Off, the robot goes idle instead
+placeOnMinuteHandFlg = False
 
 
 # Block Placement Arrays
@@ -114,6 +152,10 @@ pole2 = [(poleLocations[2][0] - robotHeadRadius, poleLocations[2][1], -np.inf),
 
 poles = [pole0, pole1, pole2]
 
+# The collision math can't work with infinite rectangles, so infinite heights get clipped to this.
+# It is far outside of anywhere the robot can reach
+obstacleHeightLimit = 10000  # mm
+
 
 def cartesianToPolar(position: tuple) -> tuple:
     """Helper function to change cartesian coordinates to polar
@@ -134,6 +176,19 @@ def cartesianToPolar(position: tuple) -> tuple:
     return r, theta, z
 
 
+def angleBetween(angle0: float, angle1: float) -> float:
+    """Smallest difference between two angles in degrees, going whichever way around is shorter"""
+    return abs((angle0 - angle1 + 180) % 360 - 180)
+
+
+def handClearance(radius: float, handWidth: float = minuteHandWidth) -> float:
+    """Degrees a hand has to be from something at radius (mm) to stay clear of the robot head over it
+    The hand runs out from the center, so it is clear once its edge is the head's radius plus padding away
+    """
+    halfWidth = robotHeadRadius + robotMovingPadding + handWidth / 2
+    return float(np.rad2deg(np.arcsin(min(halfWidth / radius, 1))))
+
+
 def polarToCartesian(position: tuple) -> tuple:
     """Converts polar coordinates to cartesian coordinates"""
     r, theta, z = position
@@ -141,3 +196,47 @@ def polarToCartesian(position: tuple) -> tuple:
     x = r * np.cos(theta)
     y = r * np.sin(theta)
     return x, y, z
+
+
+def polarToCartesianArray(positions: np.ndarray) -> np.ndarray:
+    """Converts an (N, 3) array of polar coordinates to an (N, 3) array of cartesian coordinates"""
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    theta = np.deg2rad(positions[:, 1])
+    return np.column_stack((positions[:, 0] * np.cos(theta), positions[:, 0] * np.sin(theta), positions[:, 2]))
+
+
+def cartesianToPolarArray(positions: np.ndarray) -> np.ndarray:
+    """Converts an (N, 3) array of cartesian coordinates to an (N, 3) array of polar coordinates
+    Theta is kept between 0 and 360 the same way as cartesianToPolar
+    """
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    r = np.hypot(positions[:, 0], positions[:, 1])
+    theta = (np.rad2deg(np.arctan2(positions[:, 1], positions[:, 0])) + 360) % 360
+    return np.column_stack((r, theta, positions[:, 2]))
+
+
+def rectangleToCartesian(rectangle: list) -> tuple:
+    """Converts an obstacle rectangle into the cartesian form the collision checks use
+    Args:
+        rectangle (list): [point0, point1, point2, point3] in polar coordinates. point0 is the origin,
+            point1 and point2 are the ends of the two edges that start at point0
+    Returns:
+        origin, edge0, edge1, normal (np.ndarray): Cartesian origin, edge vectors and normal of the rectangle
+        edge0LengthSq, edge1LengthSq (float): Squared lengths of the edges
+        clearance (float): Z height to move at to get over the rectangle
+    """
+    corners = np.array(rectangle[:3], dtype=float)
+    corners[:, 2] = np.clip(corners[:, 2], -obstacleHeightLimit, obstacleHeightLimit)
+    corners = polarToCartesianArray(corners)
+
+    origin = corners[0]
+    edge0 = corners[1] - origin
+    edge1 = corners[2] - origin
+    normal = np.cross(edge0, edge1)
+    clearance = rectangle[2][2] + robotMovingPadding
+
+    return origin, edge0, edge1, normal, edge0.dot(edge0), edge1.dot(edge1), clearance
+
+
+# Pole exclusion zones in the form the collision checks use. These never change so they only get converted once
+poleObstacles = [rectangleToCartesian(pole) for pole in poles]
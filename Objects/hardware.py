@@ -0,0 +1,135 @@
+"""Creates the hardware objects and time functions used by all of our objects
+
+By default these are the real DPi boards and the real clock. Calling useSimulation() swaps every board, and time
+itself, for the simulated ones in Simulation/ so the whole project can run (faster than real time) on a computer
+that isn't hooked up to the installation.
+
+The DPi libraries are only imported when a real board gets created, so nothing in Objects/ needs dpeaDPi
+installed to be imported.
+
+The solenoid and ClockNBlock boards come wrapped in shadow registers (see Objects/shadowRegisters.py), so
+writing an output that is already in that state doesn't use the bus.
+
+Real boards also come wrapped in a LockedBoard, so the hardware monitor's thread (see Objects/hardwareMonitor.py)
+and the main loop never talk on the bus at the same time.
+"""
+import threading
+import time as _time
+
+import Objects.shadowRegisters as shadowRegisters
+
+# The simulated world we are running in, None when we are running on the real hardware
+_world = None
+
+# Held for every call to a real board. All the boards share one RS-485 bus
+busLock = threading.RLock()
+
+
+def useSimulation(world) -> None:
+    """Runs everything created after this call in a Simulation.simulatedWorld.SimulatedWorld"""
+    global _world
+    _world = world
+
+
+def useHardware() -> None:
+    """Goes back to creating real DPi boards"""
+    global _world
+    _world = None
+
+
+def isSimulated() -> bool:
+    return _world is not None
+
+
+def getWorld():
+    """Returns the simulated world, or None if we are using the real hardware"""
+    return _world
+
+
+# ---------------------------------------------------------------------------------
+#                                  Boards
+# ---------------------------------------------------------------------------------
+
+class LockedBoard:
+
+    # Wraps a board so each of its methods holds the bus lock while it runs.
+    # Everything that isn't a method, like the STATE_ constants, comes straight from the board.
+
+    def __init__(self, board):
+        self._board = board
+
+    def __getattr__(self, name):
+        attribute = getattr(self._board, name)
+        if not callable(attribute):
+            return attribute
+
+        def locked(*args, **kwargs):
+            with busLock:
+                return attribute(*args, **kwargs)
+        return locked
+
+
+def createRobot():
+    """Creates a DPiRobot"""
+    if _world is not None:
+        return _world.robot
+
+    from dpeaDPi.DPiRobot import DPiRobot
+    return LockedBoard(DPiRobot())
+
+
+def createStepper():
+    """Creates a DPiStepper"""
+    if _world is not None:
+        return _world.stepper
+
+    from dpeaDPi.DPiStepper import DPiStepper
+    return LockedBoard(DPiStepper())
+
+
+def createSolenoid():
+    """Creates a DPiSolenoid, wrapped so it only writes drivers that change"""
+    if _world is not None:
+        return shadowRegisters.ShadowedDPiSolenoid(_world.solenoid)
+
+    from dpeaDPi.DPiSolenoid import DPiSolenoid
+    return shadowRegisters.ShadowedDPiSolenoid(LockedBoard(DPiSolenoid()))
+
+
+def createClockNBlock():
+    """Creates a DPiClockNBlock, wrapped so it only writes the arrow when it changes.
+    The board number still needs to be set
+    """
+    if _world is not None:
+        return shadowRegisters.ShadowedDPiClockNBlock(_world.createClockNBlock())
+
+    from DPi_ClockNBlock_Python.DPiClockNBlock import DPiClockNBlock
+    return shadowRegisters.ShadowedDPiClockNBlock(LockedBoard(DPiClockNBlock()))
+
+
+# ---------------------------------------------------------------------------------
+#                                   Time
+# ---------------------------------------------------------------------------------
+
+def time() -> float:
+    """Seconds since the epoch, same as time.time()"""
+    if _world is not None:
+        return _world.time()
+    return _time.time()
+
+
+def sleep(seconds: float) -> None:
+    """Same as time.sleep(), in the simulation this moves the simulated time forward"""
+    if _world is not None:
+        _world.sleep(seconds)
+    else:
+        _time.sleep(seconds)
+
+
+def localtime(seconds: float = None) -> _time.struct_time:
+    """Same as time.localtime(), give it a time from time() to break that same moment into fields"""
+    if seconds is not None:
+        return _time.localtime(seconds)
+    if _world is not None:
+        return _world.localtime()
+    return _time.localtime()
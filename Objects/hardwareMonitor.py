@@ -0,0 +1,100 @@
+import collections
+import threading
+
+import Objects.constants as constants
+import Objects.hardware as hardware
+from Objects.scheduler import Scheduler
+
+
+# Everything the monitor last read from the boards. It never changes once it is made, a new one replaces it.
+# Each group of readings has the time its reads started, None until it has been read once.
+HardwareSnapshot = collections.namedtuple('HardwareSnapshot', [
+    'robotTime', 'robotStatus', 'robotPosition',  # DPiRobot state and cartesian (x, y, z)
+    'handsTime', 'handPositions',                 # (hour, minute) stepper positions in steps
+])
+
+
+class HardwareMonitor:
+
+    # Reads the boards for all of our objects, so each reading is only done once no matter how many objects need it.
+    #
+    # Each group of readings (robot, clock hands) is read at the rate of the object that uses it,
+    # except the clock hands that the clock only needs now and then, and published in a new HardwareSnapshot. The objects read from the latest snapshot instead of the boards.
+    # Replacing the snapshot is a single assignment, so reading it doesn't need a lock.
+    #
+    # On the real hardware the reads happen on their own thread, using the bus lock in Objects/hardware.py.
+    # In the simulation they are tasks in main's scheduler instead, so runs stay repeatable.
+
+    def __init__(self, dpiRobot, dpiStepper, hourHandPin: int, minuteHandPin: int):
+        self.dpiRobot = dpiRobot
+        self.dpiStepper = dpiStepper
+        self.hourHandPin = hourHandPin
+        self.minuteHandPin = minuteHandPin
+
+        self.snapshot = HardwareSnapshot(None, None, None, None, None)
+
+        self.thread = None
+        self.runningFlg = False
+
+    # ---------------------------------------------------------------------------------
+    #                                    Reading
+    # ---------------------------------------------------------------------------------
+
+    def pollRobot(self) -> None:
+        now = hardware.time()
+        _successFlg, status = self.dpiRobot.getRobotStatus()
+        _successFlg, x, y, z = self.dpiRobot.getCurrentPosition()
+        self.snapshot = self.snapshot._replace(robotTime=now, robotStatus=status, robotPosition=(x, y, z))
+
+    def pollHands(self) -> None:
+        now = hardware.time()
+        _successFlg, hourPosition = self.dpiStepper.getCurrentPositionInSteps(self.hourHandPin)
+        _successFlg, minutePosition = self.dpiStepper.getCurrentPositionInSteps(self.minuteHandPin)
+        self.snapshot = self.snapshot._replace(handsTime=now, handPositions=(hourPosition, minutePosition))
+
+    def addTasks(self, scheduler: Scheduler) -> None:
+        """Adds the reads to a scheduler, each at the rate of the objects that use it"""
+        scheduler.addTask('readRobot', self.pollRobot, constants.robotProcessRate)
+        # The clock works out where the hands are in between, see HandStateEstimator in Objects/clock.py
+        scheduler.addTask('readHands', self.pollHands, 2 / constants.handResyncPeriod)
+
+    def start(self) -> None:
+        """Starts reading the boards on a thread"""
+        if self.thread is not None:
+            return
+
+        scheduler = Scheduler()
+        self.addTasks(scheduler)
+        self.runningFlg = True
+
+        def run():
+            while self.runningFlg:
+                scheduler.runOnce()
+
+        self.thread = threading.Thread(target=run, name='hardwareMonitor', daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.runningFlg = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # ---------------------------------------------------------------------------------
+    #                                    Getting
+    # ---------------------------------------------------------------------------------
+
+    def getRobot(self, since: float, maxAge: float) -> tuple or None:
+        """Returns (status, (x, y, z)) if they were read after since and are at most maxAge seconds old, otherwise None"""
+        snapshot = self.snapshot
+        if snapshot.robotTime is None or snapshot.robotTime <= since or hardware.time() - snapshot.robotTime > maxAge:
+            return None
+        return snapshot.robotStatus, snapshot.robotPosition
+
+    def getHandReading(self, since: float, maxAge: float) -> tuple or None:
+        """Returns (read time, (hour, minute) positions in steps) if they were read after since
+        and are at most maxAge seconds old, otherwise None"""
+        snapshot = self.snapshot
+        if snapshot.handsTime is None or snapshot.handsTime <= since or hardware.time() - snapshot.handsTime > maxAge:
+            return None
+        return snapshot.handsTime, snapshot.handPositions
@@ -0,0 +1,154 @@
+import numpy as np
+import Objects.constants as constants
+
+
+class Path:
+
+    # A path is the list of waypoints the robot arm follows, stored as one contiguous (N, 3) float64 array
+    # in polar coordinates (r, theta, z).
+    #
+    # The planners used to build these as python lists of tuples and splice them together, which meant
+    # allocating a tuple per point and copying the whole list every time a zig-zag or dodge got inserted.
+    # Here the points live in a buffer that grows by doubling, so appending is amortized O(1) and inserting
+    # k points only has to shift the tail of the buffer.
+    #
+    # Markers are named point indices (for example, the last point we need to check for collisions).
+    # They get shifted automatically when points are inserted before them, so planners don't need to
+    # search the path for a point's value to find it again.
+    #
+    # A finished path can also have a speed for each point, the speed to move to it at (see RobotManager.planSpeeds).
+    # Changing the points throws the speeds away, since they were planned for the old ones.
+
+    # Marker for the last point we need to check for collisions, everything after it is the approach to the target
+    CHECK_COLLISIONS_UNTIL = 'checkCollisionsUntil'
+
+    def __init__(self, points=None, capacity: int = 16):
+        self._data = np.empty((max(capacity, 1), 3))
+        self._length = 0
+        self._cartesian = None
+        self._speeds = None
+        self.markers = {}
+
+        if points is not None:
+            self.extend(points)
+
+    @classmethod
+    def fromArray(cls, points: np.ndarray):
+        """Creates a path from an (N, 3) array of polar points"""
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        path = cls(capacity=len(points))
+        path._data[:len(points)] = points
+        path._length = len(points)
+        return path
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        return self.polar[index]
+
+    def __setitem__(self, index, value) -> None:
+        self._data[:self._length][index] = value
+        self._changed()
+
+    def __iter__(self):
+        return iter(self.polar)
+
+    def __repr__(self) -> str:
+        return f'Path({self.polar.tolist()}, markers={self.markers})'
+
+    @property
+    def polar(self) -> np.ndarray:
+        """(N, 3) view of the points in polar coordinates"""
+        return self._data[:self._length]
+
+    @property
+    def cartesian(self) -> np.ndarray:
+        """(N, 3) array of the points in cartesian coordinates
+        This is cached until the path is changed
+        """
+        if self._cartesian is None:
+            self._cartesian = constants.polarToCartesianArray(self.polar)
+        return self._cartesian
+
+    @property
+    def speeds(self) -> np.ndarray or None:
+        """(N,) array of the speed in mm/s to move to each point at, None if they haven't been planned"""
+        return self._speeds
+
+    def setSpeeds(self, speeds) -> None:
+        speeds = np.asarray(speeds, dtype=float)
+        if speeds.shape != (self._length,):
+            raise ValueError(f'Expected {self._length} speeds, got {speeds.shape}')
+        self._speeds = speeds
+
+    def append(self, point: tuple) -> None:
+        """Adds a single polar point to the end of the path"""
+        self._reserve(self._length + 1)
+        self._data[self._length] = point
+        self._length += 1
+        self._changed()
+
+    def extend(self, points) -> None:
+        """Adds many polar points to the end of the path
+        If points is another path, its markers are carried over to where its points end up.
+        """
+        if isinstance(points, Path):
+            for name, markerIndex in points.markers.items():
+                self.markers[name] = self._length + markerIndex
+            points = points.polar
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+
+        self._reserve(self._length + len(points))
+        self._data[self._length:self._length + len(points)] = points
+        self._length += len(points)
+        self._changed()
+
+    def insert(self, index: int, points) -> None:
+        """Inserts polar points so the first one ends up at index
+        Markers at or after index move back with the points they marked.
+        """
+        if isinstance(points, Path):
+            points = points.polar
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        numPoints = len(points)
+
+        self._reserve(self._length + numPoints)
+        # Shift the tail back to make room, then drop the new points in
+        self._data[index + numPoints:self._length + numPoints] = self._data[index:self._length]
+        self._data[index:index + numPoints] = points
+        self._length += numPoints
+        self._changed()
+
+        for name, markerIndex in self.markers.items():
+            if markerIndex >= index:
+                self.markers[name] = markerIndex + numPoints
+
+    def setMarker(self, name: str, index: int = None) -> None:
+        """Marks a point in the path. Defaults to the last point added"""
+        self.markers[name] = self._length - 1 if index is None else index
+
+    def getMarker(self, name: str, default: int = None) -> int:
+        """Returns the index of a marked point"""
+        return self.markers.get(name, default)
+
+    def copy(self):
+        """Returns a copy of the path with its own buffer and markers"""
+        path = Path.fromArray(self.polar.copy())
+        path.markers = dict(self.markers)
+        if self._speeds is not None:
+            path._speeds = self._speeds.copy()
+        return path
+
+    def _changed(self) -> None:
+        """Forgets everything worked out from the old points"""
+        self._cartesian = None
+        self._speeds = None
+
+    def _reserve(self, size: int) -> None:
+        """Makes sure the buffer can hold size points, doubling it if it can't"""
+        if size <= len(self._data):
+            return
+        newData = np.empty((max(size, 2 * len(self._data)), 3))
+        newData[:self._length] = self._data[:self._length]
+        self._data = newData
@@ -1,8 +1,9 @@
-import time
-
-from dpeaDPi.DPiRobot import DPiRobot
 import Objects.constants as constants
 from Objects.robotManager import RobotManager
+from Objects.backgroundPlanner import BackgroundPlanner
+from Objects.path import Path
+from Objects.waypointStreamer import WaypointStreamer
+import Objects.hardware as hardware
 
 
 class RobotArm:
@@ -26,19 +27,35 @@ class RobotArm:
         if buildSites is not None or blockFeeders is not None:
             self.robotManager = RobotManager(buildSites, blockFeeders)
 
+            # Plans the next move while we do this one. Simulated time doesn't pass while we plan,
+            # so the simulation plans without a thread to keep runs repeatable
+            self.planner = BackgroundPlanner(self.robotManager, threadedFlg=not hardware.isSimulated())
+
         # Create our dpiRobot object
-        self.dpiRobot = DPiRobot()
+        self.dpiRobot = hardware.createRobot()
+        # Sends our paths to the robot a few waypoints at a time
+        self.streamer = WaypointStreamer(self.dpiRobot)
 
         # State machine
         self.state = self.STATE_IDLE
         self.newState = False
         self.target = None
         self.start = None
+        # Where we chose to pick up a block from while idle, see STATE_IDLE
+        self.idleTarget = None
 
         # Flags
         self.rotationPositionFlg = False  # False is the position to pick up blocks, True is there to place
         self.isHomedFlg = False
 
+        # Reads the robot's status and position for us when main gives us one, see Objects/hardwareMonitor.py
+        self.hardwareMonitor = None
+        # When we last sent the robot a command, readings from before then are out of date
+        self.lastCommandTime = 0
+        # Status and position for this process call, see getRobotStatus and getPositionCartesian
+        self.cachedStatus = None
+        self.cachedPosition = None
+
         self.initialize()
 
         # For homing
@@ -61,7 +78,7 @@ class RobotArm:
         """Set up robot arm"""
 
         # Homes robot
-        if not self.dpiRobot.homeRobot(True):
+        if not self.homeRobot():
             print("Homing failed.")
 
             _success_flg, status = self.dpiRobot.getRobotStatus()
@@ -77,21 +94,37 @@ class RobotArm:
 
         self.setState(self.STATE_MOVE_TO_FEEDER)
 
-        self.homingStartTime = time.time()
+        self.homingStartTime = hardware.time()
 
         return True
 
-    def process(self, minuteHandPosition: float) -> None:
+    def process(self, minuteHandPosition: float, minuteHandSpeed: float = constants.minuteHandSpeed,
+                hourHandPosition: float = None, hourHandSpeed: float = constants.hourHandSpeed) -> None:
+        """Runs the state machine
+        Args:
+            minuteHandPosition (float): Position of the minute hand
+            minuteHandSpeed (float): Degrees per second the minute hand's angle goes down,
+                                     None while the clock moves it somewhere, like when it fast forwards
+            hourHandPosition (float): Position of the hour hand, None to not keep clear of it
+            hourHandSpeed (float): Degrees per second the hour hand's angle goes down, None like minuteHandSpeed
+        """
+
+        # The robot has moved since we were last processed, and so have the hands
+        self.invalidatePose()
+        self.robotManager.updateHands(minuteHandSpeed, hourHandPosition, hourHandSpeed)
 
-        _status, robotState = self.dpiRobot.getRobotStatus()
+        # Keep the robot's waypoint buffer topped up with the rest of the path
+        self.streamer.process()
+
+        robotState = self.getRobotStatus()
 
         if robotState == self.dpiRobot.STATE_E_STOPPED_PRESSED or robotState == self.dpiRobot.STATE_NOT_HOMED:
             self.isHomedFlg = False
 
         # Every 5 minutes, home the robot. Just incase we missed steps
-        if time.time() - self.homingStartTime > self.homingTime:
+        if hardware.time() - self.homingStartTime > self.homingTime:
             self.homeRobotFlg = True
-            self.homingStartTime = time.time()
+            self.homingStartTime = hardware.time()
             print('Setting home robot flag')
             return
 
@@ -99,14 +132,27 @@ class RobotArm:
 
         if self.state == self.STATE_MOVE_TO_FEEDER:
             if self.newState:
-                # Try getting a block 3 times.
+                # The moves keep clear of the hands at the speeds they are going, so wait while the clock moves one
+                if minuteHandSpeed is None or hourHandSpeed is None:
+                    return None
+
+                # Use the plan we made while placing the last block, otherwise try getting a block 3 times.
+                waypoints = self.planner.take(self.planner.MOVE_TO_FEEDER, currentPosition, minuteHandPosition)
                 for _ in range(3):
-                    waypoints = self.robotManager.moveToFeeder(currentPosition)
-                    if waypoints is not None and waypoints:
-                        self.queueWaypoints(waypoints, robotState=robotState)
+                    if waypoints is None or not len(waypoints):
+                        # The first try goes where we chose while idle, if we were
+                        waypoints = self.robotManager.moveToFeeder(currentPosition, target=self.idleTarget,
+                                                                   clockPos=minuteHandPosition)
+                        self.idleTarget = None
+                    if waypoints is not None and len(waypoints):
+                        self.queueWaypoints(waypoints, robotState=robotState, streamFlg=True)
                         self.target = waypoints[-1]
                         self.newState = False
-                        self.start = time.time()
+                        self.start = hardware.time()
+
+                        # Plan the move to a build site while we go pick up the block, which takes the move plus 0.5s
+                        delay = self.robotManager.estimateDuration(waypoints, currentPosition) + 0.5
+                        self.planner.speculate(self.planner.MOVE_TO_BUILD_SITE, self.target, minuteHandPosition, delay)
                         return self.target[1]
                 self.setState(self.STATE_IDLE)
                 return None
@@ -114,7 +160,7 @@ class RobotArm:
             # In this state, we will need to rotate the block before we pick it up
             # This does break our method for having the states be do something -> wait -> next state
             # But this also saves us from having to create a whole new state to rotate the block
-            elif time.time() - self.start > 1 and self.rotationPositionFlg and self.robotManager.blockRotationFlg:
+            elif hardware.time() - self.start > 1 and self.rotationPositionFlg and self.robotManager.blockRotationFlg:
                 self.rotate()
                 # print('rotated')
                 return None
@@ -127,26 +173,43 @@ class RobotArm:
         elif self.state == self.STATE_PICKUP_BLOCK:
             if self.newState:
                 self.dpiSolenoid.switchDriverOnOrOff(constants.magnetSolenoid, True)
-                self.start = time.time()
+                self.start = hardware.time()
                 self.newState = False
                 # print('picking up block')
                 return None
 
-            elif time.time() - self.start > 0.5:
+            elif hardware.time() - self.start > 0.5:
                 self.setState(self.STATE_MOVE_TO_BUILD_SITE)
                 return None
 
         elif self.state == self.STATE_MOVE_TO_BUILD_SITE:
             if self.newState:
-                # Try placing a block 3 times.
+                # Wait while the clock moves a hand, like going to a feeder
+                if minuteHandSpeed is None or hourHandSpeed is None:
+                    return None
+
+                # Use the plan we made while picking up the block, otherwise try placing a block 3 times.
+                waypoints = self.planner.take(self.planner.MOVE_TO_BUILD_SITE, currentPosition, minuteHandPosition)
                 for _ in range(3):
-                    waypoints = self.robotManager.moveToBuildSite(currentPosition, clockPos=minuteHandPosition)
+                    if waypoints is None:
+                        waypoints = self.robotManager.moveToBuildSite(currentPosition, clockPos=minuteHandPosition)
                     if waypoints is not None:
-                        self.queueWaypoints(waypoints, robotState=robotState)
-                        self.target = waypoints[-1]
-                        self.newState = False
-                        self.start = time.time()
-                        return self.target[1]
+                        break
+
+                # With nowhere to build, put the block on the minute hand instead of going idle with it
+                if waypoints is None and constants.placeOnMinuteHandFlg:
+                    waypoints = self.robotManager.moveToMinuteHand(currentPosition, minuteHandPosition, minuteHandSpeed)
+
+                if waypoints is not None:
+                    self.queueWaypoints(waypoints, robotState=robotState, streamFlg=True)
+                    self.target = waypoints[-1]
+                    self.newState = False
+                    self.start = hardware.time()
+
+                    # Plan the move back to a feeder while we go place the block
+                    delay = self.robotManager.estimateDuration(waypoints, currentPosition) + 0.5
+                    self.planner.speculate(self.planner.MOVE_TO_FEEDER, self.target, minuteHandPosition, delay)
+                    return self.target[1]
 
                 self.setState(self.STATE_IDLE)
                 return None
@@ -154,7 +217,7 @@ class RobotArm:
             # In this state, we will need to rotate the block after it clear the hole
             # This does break our method for having the states be do something -> wait -> next state
             # But this also saves us from having to create a whole new state to rotate the block
-            elif time.time() - self.start > 1 and not self.rotationPositionFlg and self.robotManager.blockRotationFlg:
+            elif hardware.time() - self.start > 1 and not self.rotationPositionFlg and self.robotManager.blockRotationFlg:
                 self.rotate()
                 # print('rotated')
                 return None
@@ -167,12 +230,12 @@ class RobotArm:
         elif self.state == self.STATE_PLACE_BLOCK:
             if self.newState:
                 self.dpiSolenoid.switchDriverOnOrOff(constants.magnetSolenoid, False)
-                self.start = time.time()
+                self.start = hardware.time()
                 self.newState = False
                 # print('placing block')
                 return None
 
-            elif time.time() - self.start > 0.5:
+            elif hardware.time() - self.start > 0.5:
                 if self.homeRobotFlg:
                     self.setState(self.STATE_HOME_ROBOT)
                 else:
@@ -181,7 +244,7 @@ class RobotArm:
 
         elif self.state == self.STATE_IDLE:
             if self.newState:
-                self.dpiRobot.homeRobot(True)
+                self.homeRobot()
                 if self.rotationPositionFlg:
                     self.rotate()
 
@@ -189,14 +252,18 @@ class RobotArm:
                 self.newState = False
                 return None
 
-            elif self.robotManager.moveToFeeder(currentPosition) is not None:
-                self.setState(self.STATE_MOVE_TO_FEEDER)
+            # The moves keep clear of the hands at the speeds they are going, so wait while the clock moves one
+            elif (minuteHandSpeed is not None and hourHandSpeed is not None
+                  and self.robotManager.canServeFeeder(minuteHandPosition)):
+                self.idleTarget = self.robotManager.chooseFeederTarget(minuteHandPosition)
+                if self.idleTarget is not None:
+                    self.setState(self.STATE_MOVE_TO_FEEDER)
                 return None
 
         elif self.state == self.STATE_HOME_ROBOT:
             if self.newState:
                 print('Homing robot')
-                self.dpiRobot.homeRobot(True)
+                self.homeRobot()
                 self.newState = False
                 self.homeRobotFlg = False
                 return None
@@ -209,20 +276,67 @@ class RobotArm:
         self.rotationPositionFlg = not self.rotationPositionFlg
         self.dpiSolenoid.switchDriverOnOrOff(self.ROTATING_SOLENOID, self.rotationPositionFlg)
 
+    def homeRobot(self) -> bool:
+        """Homes the robot arm, returns True if it worked"""
+        # Homing clears the robot's waypoints, so there is no path left to send
+        self.streamer.cancel()
+        homedFlg = self.dpiRobot.homeRobot(True)
+        self.commandSent()
+        return homedFlg
+
     def moveCartesian(self, position: tuple, speed: float = constants.robotSpeed) -> None:
         """Moves the robot arm to a cartesian position"""
         x, y, z = position
         self.dpiRobot.addWaypoint(x, y, z, speed)
+        self.commandSent()
 
     def movePolar(self, position: tuple, speed: float = constants.robotSpeed) -> None:
         """Moves the robot arm to a polar position"""
         x, y, z = constants.polarToCartesian(position)
         self.moveCartesian((x, y, z), speed)
 
+    def commandSent(self) -> None:
+        """Call after sending the robot a command, so we don't use readings from before it"""
+        self.lastCommandTime = hardware.time()
+        self.invalidatePose()
+
+    def invalidatePose(self) -> None:
+        """Makes the next getRobotStatus and getPositionCartesian read the robot again"""
+        self.cachedStatus = None
+        self.cachedPosition = None
+
+    def getRobotStatus(self) -> int:
+        """Returns the DPiRobot state, from the hardware monitor if it has read it since our last command
+        It is only read once per process call, see invalidatePose
+        """
+        if self.cachedStatus is not None:
+            return self.cachedStatus
+
+        if self.hardwareMonitor is not None:
+            reading = self.hardwareMonitor.getRobot(self.lastCommandTime, maxAge=2 / constants.robotProcessRate)
+            if reading is not None:
+                self.cachedStatus, self.cachedPosition = reading
+                return self.cachedStatus
+
+        _success_flg, self.cachedStatus = self.dpiRobot.getRobotStatus()
+        return self.cachedStatus
+
     def getPositionCartesian(self) -> tuple:
-        """Returns the current position of the robot arm"""
+        """Returns the current position of the robot arm
+        It is only read once per process call, see invalidatePose
+        """
+        if self.cachedPosition is not None:
+            return self.cachedPosition
+
+        if self.hardwareMonitor is not None:
+            reading = self.hardwareMonitor.getRobot(self.lastCommandTime, maxAge=2 / constants.robotProcessRate)
+            if reading is not None:
+                self.cachedStatus, self.cachedPosition = reading
+                return self.cachedPosition
+
         _success_flg, x, y, z = self.dpiRobot.getCurrentPosition()
-        return x, y, z
+        self.cachedPosition = x, y, z
+        return self.cachedPosition
 
     def getPositionPolar(self) -> tuple:
         """Returns the current position of the robot arm in polar coordinates"""
@@ -230,6 +344,10 @@ class RobotArm:
         r, theta, z = constants.cartesianToPolar((x, y, z))
         return r, theta, z
 
+    def isMoving(self) -> bool:
+        """Returns True while the robot is following a path or homing, see Clock for why it matters"""
+        return self.streamer.isStreaming() or self.getRobotStatus() != self.dpiRobot.STATE_STOPPED
+
     def isAtLocation(self, position: tuple, tolerance: float = 2) -> bool:
         """Returns true if the robot arm is within a tolerance of a position
         Args:
@@ -249,20 +367,29 @@ class RobotArm:
         self.state = state
         self.newState = True
 
-    def queueWaypoints(self, waypoints: list, speed: int = constants.robotSpeed, robotState=-1) -> bool:
-        """Helper function to queue waypoints in a list.
+    def queueWaypoints(self, waypoints: Path, speed: int = constants.robotSpeed, robotState=-1,
+                       streamFlg: bool = False) -> bool:
+        """Helper function to queue waypoints in a path.
         Args:
-            waypoints (list): List of waypoints to queue all in polar coordinates
-            speed (int): How fast to move robot
+            waypoints (Path): Path of waypoints to queue
+            speed (int): How fast to move robot, if the path doesn't have its own speeds
             robotState (int): Robot state given by DPiRobot board
+            streamFlg (bool): Only send the start of the path now, process() sends the rest as the robot goes.
+                Otherwise this returns once the whole path has been sent
         Returns:
             True if waypoints were queued successfully
         """
+        if not isinstance(waypoints, Path):
+            waypoints = Path(waypoints)
+
         if robotState == self.dpiRobot.STATE_STOPPED:
-            self.dpiRobot.bufferWaypointsBeforeStartingToMove(True)
-            [self.movePolar(waypoint, speed) for waypoint in waypoints]
-            self.dpiRobot.bufferWaypointsBeforeStartingToMove(False)
-            return True
+            if waypoints.speeds is not None:
+                speed = waypoints.speeds
+            successFlg = self.streamer.start(waypoints.cartesian, speed)
+            if successFlg and not streamFlg:
+                successFlg = self.streamer.finish()
+            self.commandSent()
+            return successFlg
         else:
             print('Robot is not stopped')
             return False
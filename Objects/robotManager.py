@@ -1,7 +1,123 @@
 # Controls how the robot arm moves
+import collections
+import copy
+import math
+import threading
 import numpy as np
 import Objects.constants as constants
-import math
+from Objects.path import Path
+
+
+class Target:
+
+    # Where the robot is going and what it is taking there. Choosing a target doesn't change anything,
+    # RobotManager.commitTarget() takes the block or spot, so a target can be chosen and planned for ahead of time
+    # and checked with RobotManager.isTargetValid() before it gets used.
+
+    PICKUP_FROM_FEEDER      = 0
+    PICKUP_FROM_BUILD_SITE  = 1
+    PLACE_ON_BUILD_SITE     = 2
+
+    def __init__(self, kind: int, location: tuple, feeder=None, buildSite=None, blockIndex: int = None):
+        self.kind = kind
+        self.location = location
+        self.feeder = feeder
+        self.buildSite = buildSite
+        self.blockIndex = blockIndex
+
+
+class ClockHand:
+
+    # One of the clock's hands as an obstacle that moves. It runs out from the center of the clock at angle,
+    # the angle goes down speed degrees per second, and the robot head is in its way below its z height.
+    # Times are in seconds from when the hand was at angle, which is when the robot arm was last processed.
+
+    # How far off our estimate of when the robot makes a move can be, see RobotManager.estimateMoveDurations
+    TIME_MARGIN = 2  # Seconds
+
+    def __init__(self, angle: float, speed: float, length: float, width: float, z: float):
+        self.angle = angle
+        self.speed = speed
+        self.length = length
+        self.width = width
+        self.z = z
+
+        # How close the middle of the robot head can get to the middle of the hand
+        self.clearance = constants.robotHeadRadius + constants.robotMovingPadding + width / 2
+
+    @classmethod
+    def minuteHand(cls, angle: float, speed: float = None):
+        """The minute hand at angle. Without a speed, like while the clock moves the hand somewhere, it has its usual one"""
+        return cls(angle, constants.minuteHandSpeed if speed is None else speed, constants.minuteHandLength,
+                   constants.minuteHandWidth, constants.clockMinuteHandZHeight)
+
+    @classmethod
+    def hourHand(cls, angle: float, speed: float = None):
+        """The hour hand at angle. Without a speed, like while the clock moves the hand somewhere, it has its usual one"""
+        return cls(angle, constants.hourHandSpeed if speed is None else speed, constants.hourHandLength,
+                   constants.hourHandWidth, constants.hourHandZHeight)
+
+    def window(self, position: tuple) -> tuple:
+        """Works out when the hand is in the robot's way at a feeder, build site or block, see constants.handClearance
+        The hand sweeps the tower on a build site however tall it is, so the height doesn't matter.
+        Args:
+            position (tuple): (r, theta, z) of the feeder, build site or block
+        Returns:
+            (start, end) (tuple): Seconds from now, start is 0 or less if the hand is in the way already.
+                                  Both are infinite if the hand never gets in the way there
+        """
+        r, theta, _z = position
+        if r - self.length >= self.clearance:
+            return np.inf, np.inf
+        clearance = constants.handClearance(r, self.width)
+
+        # The hand's angle goes down, so it is coming up on things with smaller angles
+        distance = (self.angle - theta) % 360
+        if distance > 360 - clearance:
+            # It just went past and is still in the way
+            distance -= 360
+        if self.speed <= 0:
+            return (-np.inf, np.inf) if distance < clearance else (np.inf, np.inf)
+        return (distance - clearance) / self.speed, (distance + clearance) / self.speed
+
+    def sweeps(self, startPoints: np.ndarray, endPoints: np.ndarray, startTimes: np.ndarray,
+               endTimes: np.ndarray) -> np.ndarray:
+        """Checks moves against where the hand is while the robot makes them
+        Args:
+            startPoints (np.ndarray): (S, 3) cartesian start points of the moves
+            endPoints (np.ndarray): (S, 3) cartesian end points of the moves
+            startTimes (np.ndarray): (S,) seconds from now until each move starts
+            endTimes (np.ndarray): (S,) seconds from now until each move is done
+        Returns:
+            hits (np.ndarray): (S,) True where the hand gets in the way of a move
+        """
+        startPoints = np.asarray(startPoints, dtype=float).reshape(-1, 3)
+        endPoints = np.asarray(endPoints, dtype=float).reshape(-1, 3)
+
+        # We check the start, middle and end of each move. The rest of a move is within a quarter of its length
+        # of one of them, so that much more clearance covers it
+        r, theta, z = constants.cartesianToPolarArray(
+            np.concatenate((startPoints, (startPoints + endPoints) / 2, endPoints))).T
+        slack = np.tile(np.linalg.norm(endPoints - startPoints, axis=1) / 4, 3)
+
+        # Where the hand is when each move starts, and how far around it goes until the move is done
+        startAngles = np.tile(self.angle - self.speed * (np.asarray(startTimes) - self.TIME_MARGIN), 3)
+        sweptAngles = np.tile(np.maximum(self.speed * (np.asarray(endTimes) - np.asarray(startTimes)
+                                                       + 2 * self.TIME_MARGIN), 0), 3)
+
+        # Degrees from each point to the closest the hand gets to it during the move, 0 if the hand goes past it
+        ahead = (startAngles - theta) % 360
+        angles = np.deg2rad(np.where(ahead <= sweptAngles, 0, np.minimum(ahead - sweptAngles, 360 - ahead)))
+
+        # Distance from each point to the hand there, the hand being a line from the center out to its length
+        along = r * np.cos(angles)
+        distances = np.where(along <= 0, r, r * np.abs(np.sin(angles)))
+        pastTheEnd = along > self.length
+        distances[pastTheEnd] = np.sqrt(r[pastTheEnd] ** 2 + self.length ** 2
+                                        - 2 * self.length * along[pastTheEnd])
+
+        hits = (z < self.z + constants.robotMovingPadding) & (distances < self.clearance + slack)
+        return hits.reshape(3, -1).any(axis=0)
 
 
 class RobotManager:
@@ -28,16 +144,61 @@ class RobotManager:
     # How we choose the feeders and build sites will be based on the following:
     #    The feeder will be chosen randomly out of the ones that are ready.
     #        If no feeder is ready, the robot arm will home. Not go to a build site to pick up a block.
-    #    The build site will be chosen pseudo randomly based on the following:
-    #        We assign weights to each build site based on how far away the clock hand is
-    #        And how many blocks need to be placed at said build site.
-    #        Additionally, we add a default weight based on how many blocks the build site can hold
+    #    The build site will be the one the minute hand sweeps next, as long as we can get there first.
+    #        The sweep knocks the tower down, so we fill the build sites in the order they get swept.
+    #    The clock hands are moving obstacles, see ClockHand. Feeders and build sites a hand is about to get to are
+    #    skipped, and the moves to them skip the fun parts if they would take too long. Ones it just went past are fine.
+    #    Every move of a path is checked against where the hands are while the robot makes it. See planMove
+    #    If there is no build site to place the block on, we place it on the minute hand as it goes by. See planIntercept
     #
-    # The robotManager will always return a list of waypoints for the robot arm to follow.
+    # The robotManager will always return a Path of waypoints for the robot arm to follow.
     # The robot arm does not do any logic on its own.
     # Also, the robot arm will always move to polar coordinates. Even if it is going in a straight line
     # cartesian wise.
 
+    # Different fun things we can do
+    MOVE_NOTHING    = 0
+    MOVE_POLAR      = 1
+    MOVE_ZIG_ZAG    = 2
+    MOVE_CIRCLE     = 3
+
+    # Names of the fun things we can do, indexed by their number
+    MOVE_TYPES = ('Nothing', 'PolarMove', 'ZigZag', 'Circle')
+
+    # Fun things we can do on the way to each kind of location
+    FEEDER_MOVES = (MOVE_NOTHING, MOVE_POLAR, MOVE_ZIG_ZAG, MOVE_CIRCLE)
+    BUILD_SITE_MOVES = (MOVE_NOTHING, MOVE_POLAR, MOVE_CIRCLE)
+
+    # Random choices for the fun moves, [low, high)
+    ZIG_ZAG_ANGLE_RANGE = (30, 60)  # Degrees
+    CIRCLE_ROTATIONS_RANGE = (1, 3)
+
+    # How many plans we remember, and how finely the start position is rounded for looking them up
+    PLAN_CACHE_SIZE = 128
+    PLAN_CACHE_R_QUANTUM = 1  # mm
+    PLAN_CACHE_THETA_QUANTUM = 0.1  # degrees
+    PLAN_CACHE_Z_QUANTUM = 1  # mm
+
+    # How far a simplified path or an arc may stray from the exact one, and the longest move either may make.
+    # See simplifyPath and planArc
+    SIMPLIFY_TOLERANCE = 0.5  # mm
+    MAX_SEGMENT_LENGTH = 20  # mm, the same as ensureStraightLineCartesian splits moves into
+
+    # Seconds we leave between the robot getting to a feeder or build site and the minute hand sweeping it,
+    # to pick up or place the block and get out of the way. See timeUntilSwept
+    SWEEP_MARGIN = 5
+    # About how long going straight to a feeder or build site takes. We don't choose one the hand gets to sooner
+    MIN_MOVE_TIME = 15  # Seconds
+    # How far above the clock hands we travel when they would be in the way, see moveAboveHands
+    HAND_CLEARANCE_HEIGHT = 20  # mm
+
+    # Placing a block on the minute hand, see planIntercept. We meet the hand this high above it,
+    # then come down onto it over a few moves
+    INTERCEPT_HOVER_HEIGHT = 20  # mm
+    INTERCEPT_DESCENT_STEPS = 4
+    # Times we work out where to meet the hand. The hand is slow enough that it hardly changes after the first
+    INTERCEPT_ITERATIONS = 3
+
     def __init__(self, buildSites, blockFeeders):
         self.blockFeeders = blockFeeders
         self.buildSites = buildSites
@@ -50,72 +211,48 @@ class RobotManager:
         self.maximumMovingR = constants.maximumMovingRadius
         self.blockRotationFlg = True
 
-    def moveToFeeder(self, robotPos):
-        """Moves to a feeder
-        Args:
-            robotPos (tuple): (r, theta, z) position of the robot arm
-        Returns:
-            waypoints (list): List of waypoints for the robot arm to follow
-        """
-
-        # Different fun things we can do:
-        Nothing = 0
-        PolarMove = 1
-        ZigZag = 2
-        Circle = 3
-        GetRandomBlock = False
-
-        # Choose a fun thing to do
-        funThingToDo = np.random.choice([Nothing, PolarMove, ZigZag, Circle])
-        # funThingToDo = np.random.choice([Nothing, PolarMove, Circle])
+        # The last move type we planned, one of MOVE_TYPES
+        self.lastMoveType = None
 
-        # Decide if we want to get a random block, this has a 5% chance of happening
-        if np.random.random() < 0.05:
-            GetRandomBlock = True
+        # Obstacles stacked for the collision checks.
+        # The build site obstacles are only updated for build sites whose intersection rectangle changed
+        self.poleObstacles = self.stackObstacles(constants.poleObstacles)
+        self.buildSiteObstacles = None
+        self.buildSiteObstacleVersions = None
 
-        # Get the buildSite to move to
-        if GetRandomBlock:
-            buildSitesWithBlocks = [buildSite for buildSite in self.buildSites if buildSite.currentBlock != 0]
+        # Plans we made before, least recently used first, and how often they got used. See planMove.
+        # Snapshots share these with us, so they are only used while holding the lock
+        self.planCache = collections.OrderedDict()
+        self.planCacheStats = {'hits': 0, 'misses': 0}
+        self.planCacheLock = threading.Lock()
 
-            # Check if list is empty
-            if not buildSitesWithBlocks:
-                return None
+        # The clock hands, see updateHands and getHands
+        self.hourHand = None
+        self.minuteHandSpeed = constants.minuteHandSpeed
 
-            buildSite = np.random.choice(buildSitesWithBlocks)
-            buildSite.currentBlock -= 1
-            finalLocation = buildSite.blockPlacements[buildSite.currentBlock]
-            self.blockRotationFlg = False
-            print(f'Robot arm getting random block from build site {buildSite.buildSiteNumber}')
-        else:
-            # Find a feeder with blocks
-            feeder = self.chooseFeeder()
-            if feeder is None:
-                return None
-            finalLocation = feeder.location
-            print(f'Robot arm moving to feeder {feeder.index}')
-            self.blockRotationFlg = True
+        # Stats
+        self.minuteHandPlacements = 0
 
-        # Now that we have our final locations, we plan our route there
-        if funThingToDo == PolarMove:
-            # print('Robot arm polar move to feeder')
-            waypoints = self.planPolarMove(robotPos, finalLocation)
-            waypoints = self.ensureStraightLinePolar(waypoints)
-
-        elif funThingToDo == ZigZag:
-            print('Robot arm zig zag move to feeder')
-            waypoints, _checkUpUntilIndex = self.planZigZagMove(robotPos, finalLocation)
-            waypoints = self.ensureStraightLineCartesian(waypoints)
-
-        elif funThingToDo == Circle:
-            # print('Robot arm circle move to feeder')
-            waypoints = self.planCircle(robotPos, finalLocation)
-            waypoints = self.ensureStraightLineCartesian(waypoints)
-
-        else:
-            # print('Robot arm straight move to feeder')
-            waypoints, _checkUpUntilIndex = self.planStraightMove(robotPos, finalLocation)
-            waypoints = self.ensureStraightLineCartesian(waypoints)
+    def moveToFeeder(self, robotPos, target=None, clockPos: float = None):
+        """Moves to a feeder
+        Args:
+            robotPos (tuple): (r, theta, z) position of the robot arm
+            target (Target): Where to pick up the block from chooseFeederTarget, chooses one if None
+            clockPos (float): Position of the clock hand, None to not keep clear of it
+        Returns:
+            waypoints (Path): Waypoints for the robot arm to follow, None if there is nowhere we can get to in time
+        """
+        if target is None or not self.isTargetValid(target):
+            target = self.chooseFeederTarget(clockPos)
+        if target is None:
+            return None
 
+        # Now that we have our final location, we plan our route there.
+        # The block is only ours once we know we get there before the minute hand
+        waypoints = self.planMove(robotPos, target.location, self.FEEDER_MOVES, self.maxMoveDuration(target, clockPos),
+                                  clockPos)
+        if waypoints is not None:
+            self.commitTarget(target)
         return waypoints
 
     def moveToBuildSite(self, robotPos: tuple, clockPos: float):
@@ -124,31 +261,19 @@ class RobotManager:
             robotPos (tuple): (r, theta, z) position of the robot arm
             clockPos (float): Position of the clock hand
         Returns:
-            waypoints (list): List of waypoints for the robot arm to follow
+            waypoints (Path): Waypoints for the robot arm to follow, None if there is nowhere we can get to in time
         """
-
-
-        # Different fun things we can do:
-        Nothing = 0
-        PolarMove = 1
-        ZigZag = 2
-        Circle = 3
         FakePlacement = False
 
-        # Choose a fun thing to do
-        funThingToDo = np.random.choice([Nothing, PolarMove, Circle])
-
         # Get the buildSite to move to
-        buildSite = self.chooseBuildSite(clockPos)
-
+        target = self.chooseBuildSiteTarget(clockPos)
 
         # If there are no build sites, return None
-        if buildSite is None:
+        if target is None:
             return None
 
-        finalLocation = buildSite.placeNextBlock()
-        if finalLocation is None:
-            return None
+        buildSite = target.buildSite
+        finalLocation = target.location
 
         # Decide if we want to do a fake placement, this has a 5% chance of happening
         # This caused the robot to lose steps a lot as it had to quickly reverse directions. Needs to be fixed
@@ -156,6 +281,7 @@ class RobotManager:
         #     FakePlacement = True
 
         if FakePlacement:
+            self.commitTarget(target)
             # print('Robot arm fake placement move to build site')
             # Create our list of locations. We know our final location, so we just choose other build open build sites
 
@@ -182,41 +308,370 @@ class RobotManager:
             waypoints = self.ensureStraightLineCartesian(waypoints)
             return waypoints
 
-        # Now that we have our final locations, we plan our route there
-        if funThingToDo == PolarMove:
-            # print('Robot arm polar move to build site')
-            waypoints = self.planPolarMove(robotPos, finalLocation)
+        # Now that we have our final location, we plan our route there, leaving no time for fun if the hand is close
+        waypoints = self.planMove(robotPos, finalLocation, self.BUILD_SITE_MOVES, self.maxMoveDuration(target, clockPos),
+                                  clockPos)
+        if waypoints is not None:
+            self.commitTarget(target)
+        return waypoints
+
+    def moveToMinuteHand(self, robotPos: tuple, clockPos: float, handSpeed: float) -> Path or None:
+        """Places the block on the minute hand as it goes by, for when there is no build site to place it on
+        Args:
+            robotPos (tuple): (r, theta, z) position of the robot arm
+            clockPos (float): Position of the clock hand
+            handSpeed (float): Degrees per second the minute hand's angle goes down, None if we don't know,
+                               like while the clock moves the hand to a new time
+        Returns:
+            waypoints (Path): Waypoints for the robot arm to follow, None if we can't meet the hand
+        """
+        if clockPos is None or handSpeed is None:
+            return None
+
+        # print('Robot arm placing block on the minute hand')
+        self.lastMoveType = self.MOVE_TYPES[self.MOVE_NOTHING]
+        waypoints, _meetTime = self.planIntercept(robotPos, clockPos, handSpeed)
+        if waypoints is not None:
+            self.minuteHandPlacements += 1
+        return waypoints
+
+    def planMove(self, robotPos: tuple, finalLocation: tuple, moveTypes: tuple, maxDuration: float = None,
+                 clockPos: float = None, delay: float = 0) -> Path:
+        """Picks one of the fun things to do and plans the route to a location
+        This doesn't change anything about the feeders or build sites, so it is safe to call ahead of time.
+        Args:
+            robotPos (tuple): (r, theta, z) position of the robot arm
+            finalLocation (tuple): (r, theta, z) location to move to
+            moveTypes (tuple): Fun things we are allowed to do, e.g. FEEDER_MOVES
+            maxDuration (float): Seconds the move has to be done in. Fun moves that take longer
+                                 are swapped for going straight there. None means no limit
+            clockPos (float): Position of the clock hand, we come down next to the location on the side away from it
+                              and keep clear of the hands on the way. None to not keep clear of them
+            delay (float): Seconds until the robot starts the move, so we know where the hands are during it
+        Returns:
+            waypoints (Path): Waypoints for the robot arm to follow, None if even going straight there takes too long
+                              or a clock hand gets in the way of it
+        """
+        approachSide = self.approachSide(finalLocation, clockPos)
+        hands = self.getHands(clockPos)
+        waypoints = self.planFunMove(robotPos, finalLocation, moveTypes, approachSide)
+        if self.isMovePossible(waypoints, robotPos, maxDuration, hands, delay):
+            return waypoints
+
+        if self.lastMoveType != self.MOVE_TYPES[self.MOVE_NOTHING]:
+            waypoints = self.planFunMove(robotPos, finalLocation, (self.MOVE_NOTHING,), approachSide)
+            if self.isMovePossible(waypoints, robotPos, maxDuration, hands, delay):
+                return waypoints
+
+        # A clock hand would get in the way before we are done there
+        return None
+
+    def isMovePossible(self, waypoints: Path, robotPos: tuple, maxDuration: float, hands: tuple,
+                       delay: float = 0) -> bool:
+        """Returns True if the robot can follow a path within maxDuration seconds without the clock hands getting in
+        its way. If a hand gets in the way while we travel, the travel height is moved up over the hands first.
+        Args:
+            waypoints (Path): Path with its speeds planned, changed in place
+            robotPos (tuple): (r, theta, z) position the robot starts the path from
+            maxDuration (float): Seconds the path has to be done in, None means no limit
+            hands (tuple): ClockHands to keep clear of, see getHands
+            delay (float): Seconds until the robot starts the path
+        """
+        if hands:
+            self.moveAboveHands(waypoints, robotPos, hands, delay)
+        if maxDuration is not None and self.estimateDuration(waypoints, robotPos) > maxDuration:
+            return False
+        return not hands or not self.getHandHits(waypoints, robotPos, hands, delay).any()
+
+    def updateHands(self, minuteHandSpeed: float = None, hourHandPosition: float = None,
+                    hourHandSpeed: float = None) -> None:
+        """Keeps track of how the clock hands move, the robot arm calls this every time it is processed
+        The minute hand's position comes with each call that keeps clear of it, as clockPos.
+        Args:
+            minuteHandSpeed (float): Degrees per second the minute hand's angle goes down, see Clock.getMinuteHandSpeed
+            hourHandPosition (float): Position of the hour hand, None to not keep clear of it
+            hourHandSpeed (float): Degrees per second the hour hand's angle goes down, see Clock.getHourHandSpeed
+        """
+        self.minuteHandSpeed = minuteHandSpeed
+        self.hourHand = None if hourHandPosition is None else ClockHand.hourHand(hourHandPosition, hourHandSpeed)
+
+    def getHands(self, clockPos: float) -> tuple:
+        """Returns the ClockHands to keep clear of, with the minute hand at clockPos. None without a clock position"""
+        if clockPos is None:
+            return ()
+
+        minuteHand = ClockHand.minuteHand(clockPos, self.minuteHandSpeed)
+        if self.hourHand is None:
+            return (minuteHand,)
+        return self.hourHand, minuteHand
+
+    def getHandHits(self, waypoints: Path, robotPos: tuple, hands: tuple, delay: float = 0) -> np.ndarray:
+        """Checks every move of a path against where the clock hands are while the robot makes it
+        Args:
+            waypoints (Path): Path with its speeds planned
+            robotPos (tuple): (r, theta, z) position the robot starts the path from
+            hands (tuple): ClockHands to keep clear of, see getHands
+            delay (float): Seconds until the robot starts the path
+        Returns:
+            hits (np.ndarray): True for each move a hand gets in the way of, move i goes to waypoint i
+        """
+        if not len(waypoints):
+            return np.zeros(0, dtype=bool)
+
+        points = np.vstack((constants.polarToCartesian(robotPos), waypoints.cartesian))
+        endTimes = delay + np.cumsum(self.estimateMoveDurations(waypoints, robotPos))
+        startTimes = np.concatenate(([delay], endTimes[:-1]))
+
+        hits = np.zeros(len(waypoints), dtype=bool)
+        for hand in hands:
+            hits |= hand.sweeps(points[:-1], points[1:], startTimes, endTimes)
+
+        # Going straight up from where we are is how we get out of a hand's way, so we always can
+        goingUp = np.cumprod(np.linalg.norm(points[1:, :2] - points[0, :2], axis=1) < 1).astype(bool)
+        return hits & ~goingUp
+
+    def moveAboveHands(self, waypoints: Path, robotPos: tuple, hands: tuple, delay: float = 0) -> None:
+        """Moves the travel height of a path above the clock hands if one of them gets in the way while we travel
+        Only the moves up until the path's CHECK_COLLISIONS_UNTIL marker are checked, the rest come down next to
+        the target. If the path changes, its speeds are planned again. See moveAboveObstacles
+        Args:
+            waypoints (Path): Path with its speeds planned, changed in place
+            robotPos (tuple): (r, theta, z) position the robot starts the path from
+            hands (tuple): ClockHands to keep clear of, see getHands
+            delay (float): Seconds until the robot starts the path
+        """
+        checkUpUntil = waypoints.getMarker(Path.CHECK_COLLISIONS_UNTIL, len(waypoints) - 1)
+        if not self.getHandHits(waypoints, robotPos, hands, delay)[:checkUpUntil + 1].any():
+            return
+
+        travelHeight = waypoints[checkUpUntil][2]
+        clearance = max(hand.z for hand in hands) + self.HAND_CLEARANCE_HEIGHT
+        if travelHeight < clearance:
+            waypoints[waypoints.polar[:, 2] == travelHeight, 2] = clearance
+            self.planSpeeds(waypoints, robotPos)
+
+    def planFunMove(self, robotPos: tuple, finalLocation: tuple, moveTypes: tuple, approachSide: int = None) -> Path:
+        """Picks one of the fun things to do and plans the route to a location, see planMove"""
+        # Choose a fun thing to do, and how to do it
+        funThingToDo = np.random.choice(moveTypes)
+        self.lastMoveType = self.MOVE_TYPES[funThingToDo]
+
+        if funThingToDo == self.MOVE_ZIG_ZAG:
+            variant = np.random.randint(*self.ZIG_ZAG_ANGLE_RANGE)
+        elif funThingToDo == self.MOVE_CIRCLE:
+            variant = np.random.randint(*self.CIRCLE_ROTATIONS_RANGE)
+        else:
+            variant = None
+
+        # The robot goes back and forth between the same few locations, so we have usually planned this before.
+        # A plan only stays good while the obstacles don't move, so their versions are part of the key
+        key = (self.quantizePosition(robotPos), tuple(finalLocation), funThingToDo, variant, approachSide,
+               self.getObstacleVersions())
+        with self.planCacheLock:
+            waypoints = self.planCache.get(key)
+            if waypoints is not None:
+                self.planCache.move_to_end(key)
+                self.planCacheStats['hits'] += 1
+                return waypoints.copy()
+            self.planCacheStats['misses'] += 1
+
+        if funThingToDo == self.MOVE_POLAR:
+            # print('Robot arm polar move')
+            waypoints = self.planPolarMove(robotPos, finalLocation, approachSide)
             waypoints = self.ensureStraightLinePolar(waypoints)
 
-        elif funThingToDo == ZigZag:
-            print('Robot arm zig zag move to build site')
-            waypoints, _checkUpUntilIndex = self.planZigZagMove(robotPos, finalLocation)
+        elif funThingToDo == self.MOVE_ZIG_ZAG:
+            print('Robot arm zig zag move')
+            waypoints = self.planZigZagMove(robotPos, finalLocation, zigZagAngle=variant, approachSide=approachSide)
             waypoints = self.ensureStraightLineCartesian(waypoints)
 
-        elif funThingToDo == Circle:
-            # print('Robot arm circle move to build site')
-            waypoints = self.planCircle(robotPos, finalLocation)
+        elif funThingToDo == self.MOVE_CIRCLE:
+            # print('Robot arm circle move')
+            waypoints = self.planCircle(robotPos, finalLocation, numRotations=variant, approachSide=approachSide)
             waypoints = self.ensureStraightLineCartesian(waypoints)
 
         else:
-            # print('Robot arm straight move to build site')
-            waypoints, _checkUpUntilIndex = self.planStraightMove(robotPos, finalLocation)
+            # print('Robot arm straight move')
+            waypoints = self.planStraightMove(robotPos, finalLocation, approachSide)
             waypoints = self.ensureStraightLineCartesian(waypoints)
 
+        waypoints = self.simplifyPath(waypoints)
+        self.planSpeeds(waypoints, robotPos)
+
+        self.cachePlan(key, waypoints)
         return waypoints
 
-    def chooseFeeder(self):
+    def cachePlan(self, key: tuple, waypoints: Path) -> None:
+        """Remembers a plan, forgetting the least recently used one if the cache is full
+        Plans made with old obstacle versions can never be looked up again, so they get dropped right away.
+        """
+        obstacleVersions = key[-1]
+        with self.planCacheLock:
+            if self.planCache and next(reversed(self.planCache))[-1] != obstacleVersions:
+                self.planCache.clear()
+
+            self.planCache[key] = waypoints.copy()
+            if len(self.planCache) > self.PLAN_CACHE_SIZE:
+                self.planCache.popitem(last=False)
+
+    def snapshot(self):
+        """Returns a robot manager to plan with on another thread, see BackgroundPlanner
+        It has copies of the build sites the way they are now, so the main thread can keep processing the real ones,
+        and choosing and taking targets, while it plans. It shares our plan cache.
+        """
+        # Build sites replace their intersection rectangles instead of changing them, so shallow copies stay put
+        buildSites = None if self.buildSites is None else [copy.copy(buildSite) for buildSite in self.buildSites]
+        snapshot = RobotManager(buildSites, self.blockFeeders)
+        snapshot.offSetAngle = self.offSetAngle
+        snapshot.maximumMovingR = self.maximumMovingR
+        snapshot.hourHand = self.hourHand
+        snapshot.minuteHandSpeed = self.minuteHandSpeed
+        snapshot.planCache = self.planCache
+        snapshot.planCacheStats = self.planCacheStats
+        snapshot.planCacheLock = self.planCacheLock
+        return snapshot
+
+    def quantizePosition(self, position: tuple) -> tuple:
+        """Rounds a polar position so nearly identical start positions share a plan"""
+        r, theta, z = position
+        return (round(r / self.PLAN_CACHE_R_QUANTUM),
+                round(theta % 360 / self.PLAN_CACHE_THETA_QUANTUM),
+                round(z / self.PLAN_CACHE_Z_QUANTUM))
+
+    def chooseFeederTarget(self, clockPos: float = None):
+        """Chooses where to pick up the next block from, without taking it yet
+        Args:
+            clockPos (float): Position of the clock hand, None to not keep clear of it
+        Returns:
+            target (Target): Where to pick up the block, None if there is nowhere to get one
+        """
+        # Decide if we want to get a random block, this has a 5% chance of happening
+        if np.random.random() < 0.05:
+            buildSitesWithBlocks = self.getBuildSitesWithBlocks(clockPos)
+
+            # Check if list is empty
+            if not buildSitesWithBlocks:
+                return None
+
+            buildSite = np.random.choice(buildSitesWithBlocks)
+            blockIndex = buildSite.currentBlock - 1
+            return Target(Target.PICKUP_FROM_BUILD_SITE, buildSite.blockPlacements[blockIndex],
+                          buildSite=buildSite, blockIndex=blockIndex)
+
+        # Choose a random feeder with blocks, if there are none we wait for one
+        readyFeeders = self.getReadyFeeders(clockPos)
+        if not readyFeeders:
+            return None
+        feeder = np.random.choice(readyFeeders)
+        return Target(Target.PICKUP_FROM_FEEDER, feeder.location, feeder=feeder)
+
+    def canServeFeeder(self, clockPos: float = None) -> bool:
+        """Returns True if there is a feeder with a block ready that the minute hand is clear of
+        Moving a block from a build site is only ever the 5% chance in chooseFeederTarget, so with no feeder ready the
+        robot stays idle instead of moving blocks between build sites, and the clock can fast forward. With a feeder
+        ready, chooseFeederTarget always finds somewhere to pick up a block.
+        It doesn't plan or choose anything, so it is cheap enough to call every time we are idle.
+        Args:
+            clockPos (float): Position of the clock hand, None to not keep clear of it
+        """
+        return bool(self.getReadyFeeders(clockPos))
+
+    def getReadyFeeders(self, clockPos: float = None) -> list:
+        """Returns the feeders with a block ready that the minute hand won't get to before we do"""
+        return [feeder for feeder in self.blockFeeders
+                if feeder.isReadyFlg and self.isClearOfHand(feeder.location, clockPos)]
+
+    def getBuildSitesWithBlocks(self, clockPos: float = None) -> list:
+        """Returns the build sites with blocks on them that the minute hand won't get to before we do"""
+        return [buildSite for buildSite in self.buildSites
+                if buildSite.currentBlock != 0 and self.isClearOfHand(buildSite.location0, clockPos)]
+
+    def chooseBuildSiteTarget(self, clockPos: float):
+        """Chooses where to place the next block, without taking the spot yet
+        Args:
+            clockPos (float): Position of the clock hand
+        Returns:
+            target (Target): Where to place the block, None if there is nowhere to place it
+        """
+        buildSite = self.chooseBuildSite(clockPos)
+        if buildSite is None or buildSite.currentBlock >= len(buildSite.blockPlacements):
+            return None
+
+        return Target(Target.PLACE_ON_BUILD_SITE, buildSite.blockPlacements[buildSite.currentBlock],
+                      buildSite=buildSite, blockIndex=buildSite.currentBlock)
+
+    @staticmethod
+    def approachSide(position: tuple, clockPos: float) -> int or None:
+        """Returns the side of a position away from the minute hand, 1 for bigger theta and -1 for smaller,
+        None without a clock position. See planStraightMove
+        """
+        if clockPos is None:
+            return None
+        # The hand is coming up on the position from bigger angles, or it went past and is at smaller ones
+        return -1 if (clockPos - position[1]) % 360 < 180 else 1
+
+    def timeUntilSwept(self, position: tuple, clockPos: float) -> float:
+        """Returns how many seconds until a clock hand gets in the robot's way at a feeder or build site,
+        0 if one is in the way now. See ClockHand.window
+        Args:
+            position (tuple): (r, theta, z) of the feeder, build site or block
+            clockPos (float): Position of the clock hand
+        """
+        return max(min(hand.window(position)[0] for hand in self.getHands(clockPos)), 0)
+
+    def isClearOfHand(self, position: tuple, clockPos: float) -> bool:
+        """Returns True if we have time to go to something at position before the minute hand gets there
+        Without a clock position, everything is clear
+        """
+        return clockPos is None or self.timeUntilSwept(position, clockPos) > self.SWEEP_MARGIN + self.MIN_MOVE_TIME
+
+    def maxMoveDuration(self, target, clockPos: float) -> float or None:
+        """Returns how many seconds the move to a target can take before the minute hand gets in the way,
+        None without a clock position
+        """
+        if clockPos is None:
+            return None
+        return self.timeUntilSwept(target.location, clockPos) - self.SWEEP_MARGIN
+
+    @staticmethod
+    def isTargetValid(target) -> bool:
+        """Checks if a target chosen earlier can still be used"""
+        if target.kind == Target.PICKUP_FROM_FEEDER:
+            return target.feeder.isReadyFlg
+
+        if target.kind == Target.PICKUP_FROM_BUILD_SITE:
+            return target.buildSite.currentBlock == target.blockIndex + 1
+
+        return target.buildSite.isReadyFlg and target.buildSite.currentBlock == target.blockIndex
+
+    def commitTarget(self, target) -> None:
+        """Takes the block or the placement spot of a target"""
+        if target.kind == Target.PICKUP_FROM_FEEDER:
+            print(f'Robot arm moving to feeder {target.feeder.index}')
+            self.blockRotationFlg = True
+
+        elif target.kind == Target.PICKUP_FROM_BUILD_SITE:
+            target.buildSite.currentBlock -= 1
+            self.blockRotationFlg = False
+            print(f'Robot arm getting random block from build site {target.buildSite.buildSiteNumber}')
+
+        else:
+            target.buildSite.placeNextBlock()
+
+    def chooseFeeder(self, clockPos: float = None):
         """Chooses a feeder to move to based on the following
-            If a feeder is ready, choose a random one
+            If a feeder is ready and the minute hand won't get to it before we do, choose a random one
             If no feeder is ready, return None
 
+        Args:
+            clockPos (float): Position of the clock hand, None to not keep clear of it
         Returns:
             feeder (Feeder): Feeder to move to
         """
         # Get a list of all the feeders that are ready
-        readyFeeders = [feeder for feeder in self.blockFeeders if feeder.isReadyFlg]
+        readyFeeders = self.getReadyFeeders(clockPos)
 
-        print(f'Ready feeders: {[feeder.index for feeder in readyFeeders]}')
+        # print(f'Ready feeders: {[feeder.index for feeder in readyFeeders]}')
 
         # If there are no ready feeders, return None
         if len(readyFeeders) == 0:
@@ -229,64 +684,32 @@ class RobotManager:
 
     def chooseBuildSite(self, clockPos: float):
         """Chooses a build site to move to based on the following
-            If a build site is ready, assign weights to each then choose a random one
-            If no build site is ready, return None
+            Of the build sites that are ready and that we can get to before the minute hand does,
+            choose the one the minute hand gets to first
+            If there are none, return None
 
+        Args:
+            clockPos (float): Position of the clock hand
         Returns:
             buildSite (BuildSite): Build site to move to
         """
         # Get a list of all the build sites that are ready
-        readyBuildSites = [buildSite for buildSite in self.buildSites if buildSite.isReadyFlg]
+        readyBuildSites = [buildSite for buildSite in self.buildSites
+                           if buildSite.isReadyFlg and self.isClearOfHand(buildSite.location0, clockPos)]
 
-        print(f'Ready build sites: {[buildSite.buildSiteNumber for buildSite in readyBuildSites]}')
+        # print(f'Ready build sites: {[buildSite.buildSiteNumber for buildSite in readyBuildSites]}')
 
         # If there are no ready build sites, return None
         if len(readyBuildSites) == 0:
             return None
 
-        # Assign weights to each build site
-        # The weight is based on how far away the clock hand is and how many blocks are left to place
-        # We also add a default weight based on how many blocks the build site can hold
-        weights = []
-        for index, buildSite in enumerate(readyBuildSites):
-            # Get the distance from the clock hand to the build site
-            buildSiteTheta = buildSite.location0[1]
-
-            # We only want the distance from one side of the clock hand to the build site.
-            # The clock hand's degree value should be GREATER THAN the build site's degree value
-            distance = (clockPos - buildSiteTheta) % 360
-
-            # If the distance is less than 90 degrees, it is a priority to finish building
-            # Add a 3% weight per block left to place. Max is 98%
-            if distance < 80:
-                blocksToPlace = len(buildSite.blockPlacements) - buildSite.currentBlock
-                weight = 0.03 * blocksToPlace
-                if weight > 0.98:
-                    weight = 0.98
-
-                weights.append(weight)
-            else:
-                # If the distance is greater than 90 degrees, it is not a priority to finish building
-                # Add a 0.5% weight per block left to place. Max is 98%
-                blocksToPlace = len(buildSite.blockPlacements) - buildSite.currentBlock
-                weight = 0.005 * blocksToPlace
-                if weight > 0.98:
-                    weight = 0.98
-
-                weights.append(weight)
-
-        # We have our weights, now we need to normalize them
-        weightsSum = sum(weights)
-        if weightsSum != 1:
-            weights = [weight / weightsSum for weight in weights]
+        # Every block on a build site when the minute hand sweeps it counts towards the tower, and the sweep
+        # empties the build site again. So we build on the one that gets swept first, which frees it up soonest,
+        # and save the room on the others for later. Once we can't get there in time, we move on to the next one
+        return min(readyBuildSites, key=lambda buildSite: self.timeUntilSwept(buildSite.location0, clockPos))
 
-        # Choose a random build site
-        buildSite = np.random.choice(readyBuildSites, p=weights)
-
-        return buildSite
-
-    def planPolarMove(self, currentPos: tuple, targetPos: tuple) -> list:
-        waypoints = []
+    def planPolarMove(self, currentPos: tuple, targetPos: tuple, approachSide: int = None) -> Path:
+        waypoints = Path()
         currentR, currentTheta, currentZ = currentPos
         if currentZ < -1400:
             travelHeight = currentZ + 100
@@ -301,24 +724,25 @@ class RobotManager:
             waypoints.append((self.maximumMovingR - 100, currentTheta, travelHeight))
 
         # Get straight move
-        straightMove, checkUpUntil = self.planStraightMove(waypoints[-1], targetPos)
-
-        # Remove the first two moves of the straight move as we already have those
-        straightMove = straightMove[2:]
-
-        waypoints.extend(straightMove)
+        straightMove = self.planStraightMove(waypoints[-1], targetPos, approachSide)
+        checkUpUntil = straightMove.getMarker(Path.CHECK_COLLISIONS_UNTIL)
 
         # Our intersections will be different than the straight move's intersections as we are moving in an arc
         # Find how long our original move is
-        polarWaypointsLength = len(waypoints) - len(straightMove)
+        polarWaypointsLength = len(waypoints)
+
+        # Remove the first two moves of the straight move as we already have those
+        waypoints.extend(straightMove.polar[2:])
+        if checkUpUntil is not None:
+            waypoints.setMarker(Path.CHECK_COLLISIONS_UNTIL, polarWaypointsLength + checkUpUntil - 2)
 
-        for i in range(polarWaypointsLength + checkUpUntil - 1):
-            initialR, initialTheta, initialZ = waypoints[i]
-            finalR, finalTheta, finalZ = waypoints[i + 1]
+        polar = waypoints.polar
+        buildSiteThetas = [buildSite.location0[1] for buildSite in self.buildSites]
+        for i in range(min(polarWaypointsLength + checkUpUntil, len(waypoints) - 1)):
+            initialR, initialTheta, initialZ = polar[i]
+            finalR, finalTheta, finalZ = polar[i + 1]
 
             # If there is a build site in the way, we need to move up
-            # First check for that build site
-            buildSiteThetas = [buildSite.location0[1] for buildSite in self.buildSites]
             # Check if either radius is over 300mm (the ring of empty space around the center of the clock)
             if initialR > 300 or finalR > 300:
                 # Now check if any build site is in the way
@@ -326,20 +750,22 @@ class RobotManager:
                     if initialTheta < buildSiteTheta < finalTheta or initialTheta > buildSiteTheta > finalTheta:
                         # If a build site is in the way, move up
                         zHeight = self.buildSites[idx].intersectionRectangle[2][2] + 20
-                        waypoints[i] = (initialR, initialTheta, zHeight)
-                        waypoints[i + 1] = (finalR, finalTheta, zHeight)
+                        waypoints[i, 2] = zHeight
+                        waypoints[i + 1, 2] = zHeight
 
         return waypoints
 
-    def planStraightMove(self, currentPos: tuple, targetPos: tuple) -> tuple[list, int]:
+    def planStraightMove(self, currentPos: tuple, targetPos: tuple, approachSide: int = None) -> Path:
         """ Plans a path from the current position to the target position
         Args:
             currentPos (tuple): Current position of the robot
             targetPos (tuple): Target position of the robot
+            approachSide (int): 1 to come down next to the target on its bigger theta side, -1 on its smaller theta
+                                side, None for the side we are coming from
         Returns:
-            waypoints (list): List of waypoints to travel to
+            waypoints (Path): Waypoints to travel to, the last point we check for collisions is marked
         """
-        waypoints = []
+        waypoints = Path()
         currentR, currentTheta, currentZ = currentPos
         targetR, targetTheta, targetZ = targetPos
 
@@ -357,12 +783,15 @@ class RobotManager:
             waypoints.append((self.maximumMovingR, currentTheta, travelHeight))
 
         # Then, move next to and above the target location
-        sign = 1 if currentTheta > targetTheta else -1
+        if approachSide is not None:
+            sign = approachSide
+        else:
+            sign = 1 if currentTheta > targetTheta else -1
 
         waypoints.append((targetR, targetTheta + sign * self.offSetAngle, travelHeight))
 
         # So we don't check waypoints that will place a block.
-        checkWaypointsUpUntil = len(waypoints)
+        waypoints.setMarker(Path.CHECK_COLLISIONS_UNTIL)
 
         # Go down to 5mm above the target location
         waypoints.append((targetR, targetTheta + sign * self.offSetAngle, targetZ + 5))
@@ -374,173 +803,105 @@ class RobotManager:
         waypoints.append((targetR, targetTheta, targetZ))
 
         # Check if we are intersecting any obstacles
-        if self.buildSites is not None:
-            maxZ = -np.inf
-            for building in self.buildSites:
-                obstacle = building.intersectionRectangle
-                for i in range(checkWaypointsUpUntil - 1):
-                    # Check if the line intersects the obstacle
-                    intersection, zHeight = self.checkIntersection(waypoints[i], waypoints[i + 1], obstacle)
-                    if intersection:
-                        # print("Found intersection")
-                        if zHeight > maxZ:
-                            maxZ = zHeight
-
-            # If we found an intersection, change all the waypoints that move at travelHeight to move at maxZ
-            if maxZ != -np.inf:
-                for i in range(len(waypoints)):
-                    if waypoints[i][2] == travelHeight:
-                        waypoints[i] = (waypoints[i][0], waypoints[i][1], maxZ)
-
-        return waypoints, checkWaypointsUpUntil
-
-    def planZigZagMove(self, currentPos: tuple, targetPos: tuple) -> tuple[list, int]:
+        self.moveAboveObstacles(waypoints, travelHeight)
+
+        return waypoints
+
+    def planZigZagMove(self, currentPos: tuple, targetPos: tuple, zigZagAngle: int = None,
+                       approachSide: int = None) -> Path:
         """ Plans a zig-zagging path from the current position to the target position
         Args:
             currentPos (tuple): Current position of the robot
             targetPos (tuple): Target position of the robot
+            zigZagAngle (int): The angle to zig-zag at in degrees, random if None
+            approachSide (int): Which side to come down next to the target on, see planStraightMove
         Returns:
-            waypoints (list): List of waypoints to travel to
+            waypoints (Path): Waypoints to travel to, the last point we check for collisions is marked
         """
 
         zigZagDistance = 300  # The threshold for when to zig-zag in mm
-        zigZagAngleRange = (30, 60)  # The angle to zig-zag at
-        zigZagAngle = np.random.randint(zigZagAngleRange[0], zigZagAngleRange[1])  # The angle to zig-zag at
+        if zigZagAngle is None:
+            zigZagAngle = np.random.randint(*self.ZIG_ZAG_ANGLE_RANGE)  # The angle to zig-zag at
         # print(f'Zig-zag angle: {zigZagAngle}')
 
         # As this is a zig-zag, we just need to alter all the straight moves
         # Get the waypoints for a straight move
-        waypoints, checkWaypointsUpUntil = self.planStraightMove(currentPos, targetPos)
-        travelHeight = waypoints[checkWaypointsUpUntil - 1][2]
+        waypoints = self.planStraightMove(currentPos, targetPos, approachSide)
+        travelHeight = waypoints[waypoints.getMarker(Path.CHECK_COLLISIONS_UNTIL)][2]
 
-        # print(f'Waypoints: {waypoints}')
-        checkWaypointsValue = waypoints[checkWaypointsUpUntil - 1]
+        cartesianWaypoints = waypoints.cartesian
 
         zigZagDict = {}
         # Loop through the waypoints and alter the moves
         for i in range(len(waypoints) - 1):
             # Get the current and next waypoint cartesian coordinates
-            initialPoint = constants.polarToCartesian(waypoints[i])
-            # print(f'Initial point: {initialPoint}')
-
-            finalPoint = constants.polarToCartesian(waypoints[i + 1])
-            # print(f'Final point: {finalPoint}')
+            initialPoint = cartesianWaypoints[i]
+            finalPoint = cartesianWaypoints[i + 1]
 
             # Represent our move as a vector in the form v0 + t * d
             # Where v0 is the starting point, d is the direction vector and t is a scalar corresponding to the distance
-            v0 = np.array(initialPoint)
-            d = (np.array(finalPoint) - v0) / np.linalg.norm(np.array(finalPoint) - v0)
-            d[2] = 0
-            # print(f'Direction: {d}')
-            t = np.linalg.norm(np.array(finalPoint) - v0)
-            # print(f'Distance: {t}')
+            v0 = initialPoint
+            t = np.linalg.norm(finalPoint - v0)
 
             # Get regular angle between the two start and end points
             angle = np.rad2deg(np.arctan2(finalPoint[1] - initialPoint[1], finalPoint[0] - initialPoint[0]))
-            # print(f'Angle: {angle}')
 
             # Get the two direction vectors for the zig-zag
             # The first one is at the zig-zag angle
             # And the second one is at the negative zig-zag angle
-
-            zigZagDirection0 = np.array([np.cos(np.deg2rad(angle + zigZagAngle)), np.sin(np.deg2rad(angle + zigZagAngle)), d[2]])
-            zigZagDirection1 = np.array([np.cos(np.deg2rad(angle - zigZagAngle)), np.sin(np.deg2rad(angle - zigZagAngle)), d[2]])
-
-            # print(f'zigZagDirection0: {zigZagDirection0}')
-            # print(f'zigZagDirection1: {zigZagDirection1}')
-            # print(f'direction: {d}')
+            zigZagDirection0 = np.array([np.cos(np.deg2rad(angle + zigZagAngle)), np.sin(np.deg2rad(angle + zigZagAngle)), 0])
+            zigZagDirection1 = np.array([np.cos(np.deg2rad(angle - zigZagAngle)), np.sin(np.deg2rad(angle - zigZagAngle)), 0])
 
             # Split the move up into segments of length zigZagDistance
             # If the move is less than zigZagDistance, don't zig-zag
             if t < zigZagDistance:
-                # print(f'passing')
                 continue
 
-            else:
-                numSteps = round(t / (zigZagDistance / 2))
-                stepDistance = t / numSteps
-                lineDistance = stepDistance / 2 / np.cos(np.deg2rad(zigZagAngle))
-                intermediateStoppingPoints = []
-
-                # Get the first move
-                dist = lineDistance
-                point0 = v0 + dist * zigZagDirection0
-                intermediateStoppingPoints.append(point0)
-
-                for j in range(numSteps - 1):
-                    # Every other move follows this scheme
-                    if j % 2 == 1:
-                        dist = lineDistance * 2
-                        point = intermediateStoppingPoints[-1] + dist * zigZagDirection0
-                        intermediateStoppingPoints.append(point)
-                    else:
-                        dist = lineDistance * 2
-                        point = intermediateStoppingPoints[-1] + dist * zigZagDirection1
-                        intermediateStoppingPoints.append(point)
-
-                if numSteps % 2 == 0:
-                    dist = lineDistance
-                    point = intermediateStoppingPoints[-1] + dist * zigZagDirection1
-                    intermediateStoppingPoints.append(point)
-                else:
-                    dist = lineDistance
-                    point = intermediateStoppingPoints[-1] + dist * zigZagDirection0
-                    intermediateStoppingPoints.append(point)
-
-
-                # Verify this is our target point.
-                # print(f'Zig zag final cartesian point: {intermediateStoppingPoints[-1]}')
-                intermediateStoppingPoints = [constants.cartesianToPolar(point) for point in intermediateStoppingPoints]
-
-                # Check if we are intersecting any poles, we will never intersect a pole more than once
-                path = None
-                for k in range(len(waypoints) - 1):
-                    path = k, self.avoidPoles(waypoints[i], waypoints[k + 1])
-                    break
-
-                if path is not None:
-                    intermediateStoppingPoints = intermediateStoppingPoints[:path[0] + 1] + path[1] + intermediateStoppingPoints[path[0] + 1:]
-
-                zigZagDict[i] = intermediateStoppingPoints
-
-
-        for key in zigZagDict:
-            waypoints = waypoints[:key + 1] + zigZagDict[key] + waypoints[key + 1:]
-
-        checkWaypointsUpUntil = waypoints.index(checkWaypointsValue)
+            # If the move goes through a pole, dodge the pole instead of zig-zagging
+            poleDodge = self.avoidPoles(waypoints[i], waypoints[i + 1])
+            if poleDodge is not None:
+                zigZagDict[i] = poleDodge.polar[1:-1]
+                continue
 
-        # Check if we are intersecting any obstacles
-        if self.buildSites is not None:
-            maxZ = -np.inf
-            for building in self.buildSites:
-                obstacle = building.intersectionRectangle
-                for i in range(checkWaypointsUpUntil - 1):
-                    # Check if the line intersects the obstacle
-                    intersection, zHeight = self.checkIntersection(waypoints[i], waypoints[i + 1], obstacle)
-                    if intersection:
-                        # print("Found intersection")
-                        if zHeight > maxZ:
-                            maxZ = zHeight
+            numSteps = round(t / (zigZagDistance / 2))
+            stepDistance = t / numSteps
+            lineDistance = stepDistance / 2 / np.cos(np.deg2rad(zigZagAngle))
+            intermediateStoppingPoints = np.empty((numSteps + 1, 3))
+
+            # Get the first move
+            intermediateStoppingPoints[0] = v0 + lineDistance * zigZagDirection0
 
-            # If we found an intersection, change all the waypoints that move at travelHeight to move at maxZ
-            if maxZ != -np.inf:
-                for i in range(len(waypoints)):
-                    if waypoints[i][2] == travelHeight:
-                        waypoints[i] = (waypoints[i][0], waypoints[i][1], maxZ)
+            # Every other move follows this scheme
+            for j in range(numSteps - 1):
+                direction = zigZagDirection0 if j % 2 == 1 else zigZagDirection1
+                intermediateStoppingPoints[j + 1] = intermediateStoppingPoints[j] + lineDistance * 2 * direction
 
+            lastDirection = zigZagDirection1 if numSteps % 2 == 0 else zigZagDirection0
+            intermediateStoppingPoints[-1] = intermediateStoppingPoints[-2] + lineDistance * lastDirection
 
+            zigZagDict[i] = constants.cartesianToPolarArray(intermediateStoppingPoints)
 
-        return waypoints, checkWaypointsUpUntil
+        # Insert from the back so the indices of the earlier moves stay the same
+        for key in sorted(zigZagDict, reverse=True):
+            waypoints.insert(key + 1, zigZagDict[key])
+
+        # Check if we are intersecting any obstacles
+        self.moveAboveObstacles(waypoints, travelHeight)
 
-    def planCircle(self, currentPos: tuple, targetPos: tuple) -> list:
+        return waypoints
+
+    def planCircle(self, currentPos: tuple, targetPos: tuple, numRotations: int = None,
+                   approachSide: int = None) -> Path:
         """ Plans a path including a circle from the current position to the target position
                 Args:
                     currentPos (tuple): Current position of the robot
                     targetPos (tuple): Target position of the robot
+                    numRotations (int): How many times to go around the circle, random if None
+                    approachSide (int): Which side to come down next to the target on, see planStraightMove
                 Returns:
-                    waypoints (list): List of waypoints to travel to
+                    waypoints (Path): Waypoints to travel to
                 """
-        waypoints = []
+        waypoints = Path(capacity=1024)
         currentR, currentTheta, currentZ = currentPos
         targetR, targetTheta, targetZ = targetPos
 
@@ -558,196 +919,537 @@ class RobotManager:
         waypoints.append((circleRadius, currentTheta, travelHeight))
 
         # Decide how many rotations to do
-        numRotations = np.random.randint(1, 3)
-
-        # Now we move around the circle
-        for i in range(numRotations):
-            for j in range(360):
-                currentTheta += 1
-                waypoints.append((circleRadius, currentTheta, travelHeight))
-            currentTheta = currentTheta % 360
-
-        # Move along the circle to the target theta
-        for i in range(int(currentTheta), int(targetTheta)):
-            waypoints.append((circleRadius, i, travelHeight))
+        if numRotations is None:
+            numRotations = np.random.randint(*self.CIRCLE_ROTATIONS_RANGE)
 
+        # Now we move around the circle, then the short way along it to the target theta
+        waypoints.extend(self.planArc(waypoints[-1], (circleRadius, targetTheta, travelHeight),
+                                      extraRotations=numRotations))
 
         # Now we move to the target position
-        pathToTarget, _checkUpUntil = self.planStraightMove(waypoints[-1], targetPos)
+        pathToTarget = self.planStraightMove(waypoints[-1], targetPos, approachSide)
 
-        waypoints += pathToTarget
+        waypoints.extend(pathToTarget)
 
         return waypoints
 
-    def planFakePlacement(self, currentPos, targetPositions: list[tuple]) -> list:
+    @classmethod
+    def planArc(cls, startPos: tuple, endPos: tuple, direction: int = None, extraRotations: int = 0,
+                tolerance: float = None) -> Path:
+        """Plans a move around the center of the clock
+        r and z change evenly with theta, so if both positions have the same r and z this is an arc of a circle.
+        The points are spaced so the moves between them are never more than tolerance from the true arc
+        or longer than MAX_SEGMENT_LENGTH.
+        Args:
+            startPos (tuple): (r, theta, z) to start from, this isn't part of the returned path
+            endPos (tuple): (r, theta, z) to end at
+            direction (int): 1 to go with increasing theta, -1 against it, None for whichever way is shorter
+            extraRotations (int): Whole times to go around the circle on the way
+            tolerance (float): Furthest in mm a move may be from the arc, SIMPLIFY_TOLERANCE if None
+        Returns:
+            waypoints (Path): Waypoints after startPos up to and including endPos
+        """
+        if tolerance is None:
+            tolerance = cls.SIMPLIFY_TOLERANCE
+        startR, startTheta, startZ = startPos
+        endR, endTheta, endZ = endPos
+
+        # How far we turn, in the direction we are going
+        sweep = (endTheta - startTheta) % 360
+        if direction is None:
+            direction = 1 if sweep <= 180 else -1
+        if direction < 0 and sweep:
+            sweep -= 360
+        sweep += direction * 360 * extraRotations
+
+        # A step of angle a on radius r is off the arc by r(1 - cos(a / 2)) in the middle, and 2r sin(a / 2) long
+        radius = max(startR, endR)
+        if radius > tolerance:
+            stepAngle = min(2 * np.arccos(1 - tolerance / radius),
+                            2 * np.arcsin(min(cls.MAX_SEGMENT_LENGTH / (2 * radius), 1)))
+            numSteps = max(int(np.ceil(np.deg2rad(abs(sweep)) / stepAngle)), 1)
+        else:
+            numSteps = 1
+
+        fractions = np.arange(1, numSteps + 1) / numSteps
+        points = np.column_stack((startR + fractions * (endR - startR),
+                                  startTheta + fractions * sweep,
+                                  startZ + fractions * (endZ - startZ)))
+        points[-1] = endPos
+
+        return Path.fromArray(points)
+
+    def planIntercept(self, robotPos: tuple, angle: float, angularSpeed: float, delay: float = 0,
+                      radius: float = constants.clockMinuteHandRadius,
+                      z: float = constants.clockMinuteHandZHeight) -> tuple:
+        """Plans a path that meets a spot going around the clock, like the one on the minute hand, and comes down onto it
+        We go straight to INTERCEPT_HOVER_HEIGHT above where the spot will be when we get there. How long that takes
+        depends on where we meet it, so we work it out a few times, starting from where it is now.
+        Then we come down with the spot, each move timed to end where the spot is by then, so we stay over it.
+        Args:
+            robotPos (tuple): (r, theta, z) position of the robot arm
+            angle (float): Where the spot is now, degrees
+            angularSpeed (float): Degrees per second the spot's angle goes down, like constants.minuteHandSpeed
+            delay (float): Seconds until the robot starts following the path
+            radius (float): Radius of the spot in mm
+            z (float): Height of the spot in mm
+        Returns:
+            waypoints (Path): Path with a speed for every waypoint, it ends on the spot
+            meetTime (float): Seconds from now until the robot is on the spot
+        """
+        hoverZ = z + self.INTERCEPT_HOVER_HEIGHT
+        meetTime = delay
+        for _ in range(self.INTERCEPT_ITERATIONS):
+            hoverAngle = angle - angularSpeed * meetTime
+            waypoints = self.planStraightMove(robotPos, (radius, hoverAngle, hoverZ))
+            waypoints = self.simplifyPath(self.ensureStraightLineCartesian(waypoints))
+            self.planSpeeds(waypoints, robotPos)
+            meetTime = delay + self.estimateDuration(waypoints, robotPos)
+
+        # Come down at the approach speed, turning with the spot
+        descentTime = self.INTERCEPT_HOVER_HEIGHT / constants.robotApproachSpeed
+        times = np.arange(1, self.INTERCEPT_DESCENT_STEPS + 1) / self.INTERCEPT_DESCENT_STEPS * descentTime
+        descent = np.column_stack((np.full(len(times), radius),
+                                   hoverAngle - angularSpeed * times,
+                                   hoverZ - (hoverZ - z) * times / descentTime))
+        moveLengths = np.linalg.norm(np.diff(constants.polarToCartesianArray(np.vstack((waypoints[-1], descent))),
+                                             axis=0), axis=1)
+        descentSpeeds = np.clip(moveLengths / (descentTime / self.INTERCEPT_DESCENT_STEPS),
+                                constants.robotMinSpeed, constants.robotMaxSpeed)
+
+        speeds = waypoints.speeds
+        waypoints.extend(descent)
+        waypoints.setSpeeds(np.concatenate((speeds, descentSpeeds)))
+
+        return waypoints, meetTime + descentTime
+
+    def planFakePlacement(self, currentPos, targetPositions: list[tuple]) -> Path:
         # This one is just a string of straight moves.
-        waypoints = []
+        waypoints = Path()
         # print(f'Target positions: {targetPositions}')
         for targetPos in targetPositions:
-            path, _extra = self.planStraightMove(currentPos, targetPos)
-            waypoints += path
+            path = self.planStraightMove(currentPos, targetPos)
+            waypoints.extend(path)
             currentPos = targetPos
 
         # print(waypoints)
         return waypoints
 
+    def moveAboveObstacles(self, waypoints: Path, travelHeight: float) -> None:
+        """Moves the travel height of a path above any build site it runs into
+        Only the moves up until the path's CHECK_COLLISIONS_UNTIL marker are checked.
+        Args:
+            waypoints (Path): Path to check, changed in place
+            travelHeight (float): The height the path travels at
+        """
+        if self.buildSites is None:
+            return
+
+        checkUpUntil = waypoints.getMarker(Path.CHECK_COLLISIONS_UNTIL, len(waypoints) - 1)
+        if checkUpUntil < 1:
+            return
+
+        # Check every move up until the marker against every build site at once
+        obstacles = self.getBuildSiteObstacles()
+        cartesianWaypoints = waypoints.cartesian
+        hits, clearances = self.checkIntersections(cartesianWaypoints[:checkUpUntil],
+                                                   cartesianWaypoints[1:checkUpUntil + 1], obstacles)
+
+        # If we found an intersection, change all the waypoints that move at travelHeight to move
+        # over the tallest obstacle we hit
+        hitObstacles = hits.any(axis=0)
+        if hitObstacles.any():
+            waypoints[waypoints.polar[:, 2] == travelHeight, 2] = clearances[hitObstacles].max()
+
+    def getObstacleVersions(self) -> tuple:
+        """Returns the intersection rectangle version of each build site"""
+        if self.buildSites is None:
+            return ()
+        return tuple(buildSite.intersectionVersion for buildSite in self.buildSites)
+
+    def getBuildSiteObstacles(self) -> tuple:
+        """Returns the build sites' intersection rectangles stacked for checkIntersections
+        Only the rows of build sites whose rectangle changed since the last call get updated.
+        """
+        versions = self.getObstacleVersions()
+
+        if self.buildSiteObstacles is None or len(versions) != len(self.buildSiteObstacleVersions):
+            self.buildSiteObstacles = self.stackObstacles([buildSite.intersectionObstacle for buildSite in self.buildSites])
+
+        else:
+            for row, buildSite in enumerate(self.buildSites):
+                if versions[row] != self.buildSiteObstacleVersions[row]:
+                    for part, value in zip(self.buildSiteObstacles, buildSite.intersectionObstacle):
+                        part[row] = value
+
+        self.buildSiteObstacleVersions = versions
+        return self.buildSiteObstacles
+
     @staticmethod
-    def ensureStraightLineCartesian(waypoints: list) -> list:
+    def ensureStraightLineCartesian(waypoints) -> Path:
         """Ensures that the robot arm moves in a straight line
         This ensures that the robot will travel in a straight line as it does not do so with a long move.
         Check DPi_Robot firmware to see why. Alternatively, google how linear delta arms work.
         This makes the robot move in a straight line for cartesian coordinates. (As in no arcs)
         Args:
-            waypoints (list): List of polar waypoints with possible long moves
+            waypoints (Path): Polar waypoints with possible long moves
         Returns:
-            straightWaypoints (list): List of waypoints with long moves broken up in polar coordinates
+            straightWaypoints (Path): Waypoints with long moves broken up, markers follow the points they marked
         """
-        # Create our list of waypoints to return
-        # Also, add our current position to the list
-        straightWaypoints = []
-
-        # Convert our list of waypoints in polar coordinates to a list in cartesian coordinates
+        if not isinstance(waypoints, Path):
+            waypoints = Path(waypoints)
+        if len(waypoints) < 2:
+            return Path()
 
-        # Note: this operation is fairly slow because of the nested for loops.
-        #   If this moves us in a straight line, it might be worth refactoring
-        #   The code to work in cartesian coordinates
-        for point in range(len(waypoints) - 1):
-            x1, y1, z1 = constants.polarToCartesian(waypoints[point])
-            x2, y2, z2 = constants.polarToCartesian(waypoints[point + 1])
+        # Do all the work in cartesian coordinates, one segment per row
+        cartesian = waypoints.cartesian
+        starts = cartesian[:-1]
+        deltas = cartesian[1:] - starts
+        distances = np.linalg.norm(deltas, axis=1)
 
-            # Calculating the distance between our last point and the next point we need to go to
-            distance = abs(math.dist((x1, y1, z1), (x2, y2, z2)))
+        # Segments longer than 20mm get split into int(distance / 20) steps starting at the segment's first point.
+        # Every segment also contributes its end point, so a segment with n steps adds n + 1 points.
+        numSteps = np.where(distances > 20, (distances / 20).astype(int), 0)
+        counts = numSteps + 1
 
-            # If the distance is greater than 20mm, split the move into many steps
-            if distance > 20:
-                numSteps = int(distance / 20)
+        # For every output point, find which segment it belongs to and how far along that segment it is
+        segment = np.repeat(np.arange(len(starts)), counts)
+        stepIndex = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
 
-                # Split our move into a bunch of steps
-                xSteps = np.linspace(x1, x2, numSteps, False)
-                ySteps = np.linspace(y1, y2, numSteps, False)
-                zSteps = np.linspace(z1, z2, numSteps, False)
+        # Unsplit segments only have their end point (fraction 1)
+        fractions = (stepIndex + (numSteps == 0)[segment]) / np.maximum(numSteps, 1)[segment]
 
-                # Add these points to our list
-                [straightWaypoints.append(point) for point in zip(xSteps, ySteps, zSteps)]
+        straightWaypoints = starts[segment] + fractions[:, np.newaxis] * deltas[segment]
 
-            straightWaypoints.append((x2, y2, z2))
+        # Convert back to polar coordinates
+        straightPath = Path.fromArray(constants.cartesianToPolarArray(straightWaypoints))
 
-        # Convert our list of waypoints in cartesian coordinates to a list in polar coordinates
-        straightWaypoints = [constants.cartesianToPolar(waypoint) for waypoint in straightWaypoints]
+        # Point i of the old path is now the end of segment i - 1
+        ends = np.cumsum(counts) - 1
+        for name, index in waypoints.markers.items():
+            straightPath.setMarker(name, int(ends[index - 1]) if index > 0 else 0)
 
-        return straightWaypoints
+        return straightPath
 
     @staticmethod
-    def ensureStraightLinePolar(waypoints: list) -> list:
+    def ensureStraightLinePolar(waypoints) -> Path:
         """Ensures a straight line move in polar coordinates
         This will cause the robot to move in an arc and in a straight line on the polar plane
         Args:
-            waypoints (list): List of polar waypoints with possible long moves
+            waypoints (Path): Polar waypoints with possible long moves
         Returns:
-            straightWaypoints (list): List of waypoints with long moves broken up in polar coordinates
-        """
-        straightWaypoints = []
-
-        # Loop through our list to find which moves are too far to be a straight line
-        #   We don't need to check how far the points are away in Z because the robot moves downwards in a straight line
-        for point in range(len(waypoints) - 1):
-            r1, theta1, z1 = waypoints[point]
-            r2, theta2, z2 = waypoints[point + 1]
-            theta1, theta2 = np.deg2rad(theta1), np.deg2rad(theta2)
-            distance = np.sqrt(r1 * r1 + r2 * r2 - 2 * r1 * r2 * np.cos(theta1 - theta2))
-            # If the distance is greater than 20mm, split our moves up into 20mm segments
-            if distance > 20:
-                # Number of steps to split our line into
-                numSteps = int(distance / 20)
-
-                # To generate the intermediary waypoints, np.linspace() is used on r, theta, and z values individually
-                #   We create the points by merging the same index of each array into a tuple, and add it to our list
-
-                # Convert theta back to degrees
-                theta1, theta2 = np.rad2deg(theta1), np.rad2deg(theta2)
-
-                rSteps = np.linspace(r1, r2, numSteps)
-                thetaSteps = np.linspace(theta1, theta2, numSteps)
-                zSteps = np.linspace(z1, z2, numSteps)
-
-                # Add our points to the list
-                #   Final point is omitted as it will  get added in the next iteration of the loop or at the very end
-                for i in range(len(rSteps) - 1):
-                    straightWaypoints.append((rSteps[i], thetaSteps[i], zSteps[i]))
-            else:
-                straightWaypoints.append(waypoints[point])
+            straightWaypoints (Path): Waypoints with long moves broken up, markers follow the points they marked
+        """
+        if not isinstance(waypoints, Path):
+            waypoints = Path(waypoints)
+        if len(waypoints) < 2:
+            return waypoints.copy()
+
+        polar = waypoints.polar
+        starts = polar[:-1]
+        deltas = polar[1:] - starts
+
+        # We don't need to check how far the points are away in Z because the robot moves downwards in a straight line
+        r1, r2 = starts[:, 0], polar[1:, 0]
+        theta1, theta2 = np.deg2rad(starts[:, 1]), np.deg2rad(polar[1:, 1])
+        distances = np.sqrt(r1 * r1 + r2 * r2 - 2 * r1 * r2 * np.cos(theta1 - theta2))
+
+        # If the distance is greater than 20mm, split our moves up into int(distance / 20) evenly spaced points
+        # in r, theta and z. The last of those points is left off as it is the start of the next move.
+        # Moves that are short enough just keep their starting point.
+        splitFlgs = distances > 20
+        numSteps = (distances / 20).astype(int)
+        counts = np.where(splitFlgs, numSteps - 1, 1)
+
+        segment = np.repeat(np.arange(len(starts)), counts)
+        stepIndex = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        fractions = stepIndex / np.maximum(np.where(splitFlgs, numSteps - 1, 1), 1)[segment]
+
+        straightPath = Path(capacity=len(segment) + 1)
+        straightPath.extend(starts[segment] + fractions[:, np.newaxis] * deltas[segment])
 
         # Add final point to list
-        straightWaypoints.append(waypoints[-1])
+        straightPath.append(polar[-1])
+
+        # Point i of the old path is now the start of segment i
+        segmentStarts = np.cumsum(counts) - counts
+        for name, index in waypoints.markers.items():
+            straightPath.setMarker(name, int(segmentStarts[index]) if index < len(segmentStarts) else len(straightPath) - 1)
+
+        return straightPath
+
+    @classmethod
+    def planSpeeds(cls, waypoints: Path, robotPos: tuple) -> None:
+        """Gives every move in a path the fastest speed the robot can reach on it
+        The robot starts and ends the path stopped, speeds up and slows down at constants.robotAcceleration
+        and slows down for corners the way the DPiRobot does (the sharper the corner, the slower).
+        Moves are never faster than constants.robotMaxSpeed, or constants.robotApproachSpeed once we are down
+        next to the target (past the path's CHECK_COLLISIONS_UNTIL marker and within 5mm of the target's height),
+        so we slide over and onto the target gently.
+        Args:
+            waypoints (Path): Path to plan, its speeds get set
+            robotPos (tuple): (r, theta, z) position the robot starts the path from
+        """
+        if not len(waypoints):
+            return
+
+        # Move i goes from points[i] to points[i + 1]
+        points = np.vstack((constants.polarToCartesian(robotPos), waypoints.cartesian))
+        maxSpeeds = np.full(len(waypoints), float(constants.robotMaxSpeed))
+        approachStart = waypoints.getMarker(Path.CHECK_COLLISIONS_UNTIL)
+        if approachStart is not None:
+            targetZ = points[-1, 2]
+            approachFlgs = points[:-1, 2] <= targetZ + 5 + 0.5
+            approachFlgs[:approachStart + 1] = False
+            maxSpeeds[approachFlgs] = constants.robotApproachSpeed
+
+        lengths, speedsSquared = cls.planPointSpeeds(points, maxSpeeds)
+
+        # The fastest we get on a move is where speeding up from its start meets slowing down for its end
+        peakSpeeds = np.sqrt((speedsSquared[:-1] + speedsSquared[1:]) / 2 + constants.robotAcceleration * lengths)
+        waypoints.setSpeeds(np.clip(peakSpeeds, constants.robotMinSpeed, maxSpeeds))
+
+    @classmethod
+    def estimateDuration(cls, waypoints: Path, robotPos: tuple = None, speeds=None) -> float:
+        """Estimates how long the robot takes to follow a path, in seconds
+        Every move speeds up, cruises and slows down (a trapezoid) with the same limits planSpeeds uses,
+        starting and ending stopped.
+        Args:
+            waypoints (Path): Path to follow
+            robotPos (tuple): (r, theta, z) position the robot starts from, the first waypoint if None
+            speeds: Speed of each move, the path's own speeds if None, constants.robotSpeed if it has none
+        Returns:
+            duration (float): Seconds from starting the path until the robot stops at its last waypoint
+        """
+        return float(cls.estimateMoveDurations(waypoints, robotPos, speeds).sum())
 
-        return straightWaypoints
+    @classmethod
+    def estimateMoveDurations(cls, waypoints: Path, robotPos: tuple = None, speeds=None) -> np.ndarray:
+        """Estimates how long each move of a path takes, see estimateDuration
+        Returns:
+            durations (np.ndarray): Seconds for each move. With robotPos, move i goes to waypoint i,
+                                    without it move i goes from waypoint i to waypoint i + 1
+        """
+        if not len(waypoints):
+            return np.zeros(0)
+
+        points = waypoints.cartesian
+        if robotPos is not None:
+            points = np.vstack((constants.polarToCartesian(robotPos), points))
+        if speeds is None:
+            speeds = waypoints.speeds if waypoints.speeds is not None else constants.robotSpeed
+        maxSpeeds = np.broadcast_to(np.asarray(speeds, dtype=float), (len(waypoints),))[-(len(points) - 1):]
+        if len(points) < 2:
+            return np.zeros(0)
+
+        acceleration = constants.robotAcceleration
+        lengths, speedsSquared = cls.planPointSpeeds(points, maxSpeeds)
+        startSpeeds, endSpeeds = np.sqrt(speedsSquared[:-1]), np.sqrt(speedsSquared[1:])
+        peakSpeeds = np.minimum(maxSpeeds, np.sqrt((speedsSquared[:-1] + speedsSquared[1:]) / 2 + acceleration * lengths))
+        peakSpeeds = np.maximum(peakSpeeds, np.maximum(startSpeeds, endSpeeds))
+
+        # Time and distance to speed up and slow down, the rest of the move is at the peak speed
+        speedUpTimes = (peakSpeeds - startSpeeds) / acceleration
+        slowDownTimes = (peakSpeeds - endSpeeds) / acceleration
+        cruiseDistances = np.maximum(lengths - (peakSpeeds + startSpeeds) / 2 * speedUpTimes
+                                     - (peakSpeeds + endSpeeds) / 2 * slowDownTimes, 0)
+        cruiseTimes = cruiseDistances / np.where(peakSpeeds > 0, peakSpeeds, 1)
+
+        return speedUpTimes + cruiseTimes + slowDownTimes
 
     @staticmethod
-    def checkIntersection(initialPoint: tuple, finalPoint: tuple, rectangle: list) -> tuple:
-        """Checks if a line intersects a polygon
+    def planPointSpeeds(points: np.ndarray, maxSpeeds: np.ndarray) -> tuple:
+        """Works out how fast the robot can be going at each point of a path
         Args:
-            initialPoint (tuple): The starting point of the line in polar coordinates
-            finalPoint (tuple): The ending point of the line in polar coordinates
-            rectangle(list): The rectangle to check for intersection, in the form [point0, point1, point2, point3], All in polar coordinates
+            points (np.ndarray): (N, 3) cartesian points, the robot is stopped at the first and last one
+            maxSpeeds (np.ndarray): (N - 1,) fastest speed for the move to each point after the first
         Returns:
-            intersection (bool): True if the line intersects the polygon, False otherwise
-            zHeight (float): The height of the intersection, if there is one
+            lengths (np.ndarray): (N - 1,) length of each move
+            speedsSquared (np.ndarray): (N,) the square of the fastest speed at each point
         """
-        # Implements answer from https://stackoverflow.com/questions/8812073/ray-and-square-rectangle-intersection-in-3d/8862483#8862483
-
-        # First, we need to convert our points to cartesian coordinates
-        initialPoint = constants.polarToCartesian(initialPoint)
-        finalPoint = constants.polarToCartesian(finalPoint)
+        acceleration = constants.robotAcceleration
+        deltas = np.diff(points, axis=0)
+        lengths = np.linalg.norm(deltas, axis=1)
+        directions = deltas / np.where(lengths > 0, lengths, 1)[:, np.newaxis]
+
+        # Fastest we can go through each corner, from the junction deviation:
+        # v^2 = a * deviation * sin(angle / 2) / (1 - sin(angle / 2)), angle being how far we turn
+        cosAngles = np.clip(-(directions[:-1] * directions[1:]).sum(axis=1), -1, 1)
+        sinHalfAngles = np.sqrt((1 - cosAngles) / 2)
+        with np.errstate(divide='ignore'):
+            cornerSpeedsSquared = acceleration * constants.robotJunctionDeviation * sinHalfAngles / (1 - sinHalfAngles)
+        cornerSpeedsSquared = np.minimum(cornerSpeedsSquared, np.minimum(maxSpeeds[:-1], maxSpeeds[1:]) ** 2)
+
+        # Speed squared at each point, we start and end stopped
+        speedsSquared = np.concatenate(([0], cornerSpeedsSquared, [0]))
+
+        # Make sure we can slow down in time for every point, then that we can speed up in time
+        for i in range(len(lengths) - 1, -1, -1):
+            speedsSquared[i] = min(speedsSquared[i], speedsSquared[i + 1] + 2 * acceleration * lengths[i])
+
+        # The robot only looks so far ahead, so it has to be able to stop within the waypoints it can see
+        distancesLeft = np.concatenate(([0], np.cumsum(lengths[::-1])))[::-1]
+        lookaheadEnds = np.minimum(np.arange(len(points)) + constants.robotPlannerLookahead, len(points) - 1)
+        speedsSquared = np.minimum(speedsSquared, 2 * acceleration * (distancesLeft - distancesLeft[lookaheadEnds]))
+        for i in range(len(lengths)):
+            speedsSquared[i + 1] = min(speedsSquared[i + 1], speedsSquared[i] + 2 * acceleration * lengths[i])
+
+        return lengths, speedsSquared
+
+    @classmethod
+    def simplifyPath(cls, waypoints, tolerance: float = None, maxSegmentLength: float = None) -> Path:
+        """Removes waypoints the robot doesn't need, like the ones along a straight line or a gentle curve
+        This is Ramer-Douglas-Peucker in cartesian coordinates: a run of points is replaced by a straight move
+        if none of them are more than tolerance away from it. A move is never made longer than maxSegmentLength,
+        so long moves stay broken up (see ensureStraightLineCartesian).
+        Marked points and everything after CHECK_COLLISIONS_UNTIL (the approach to the target) are always kept.
+        Args:
+            waypoints (Path): Polar waypoints to simplify
+            tolerance (float): Furthest the simplified path may be from the original in mm, SIMPLIFY_TOLERANCE if None
+            maxSegmentLength (float): Longest move in mm, MAX_SEGMENT_LENGTH if None
+        Returns:
+            simplifiedWaypoints (Path): Waypoints that were kept, markers follow the points they marked
+        """
+        if tolerance is None:
+            tolerance = cls.SIMPLIFY_TOLERANCE
+        if maxSegmentLength is None:
+            maxSegmentLength = cls.MAX_SEGMENT_LENGTH
+
+        if not isinstance(waypoints, Path):
+            waypoints = Path(waypoints)
+        if len(waypoints) < 3:
+            return waypoints.copy()
+
+        cartesian = waypoints.cartesian
+        keep = np.zeros(len(waypoints), dtype=bool)
+        keep[0] = keep[-1] = True
+        for index in waypoints.markers.values():
+            keep[index] = True
+        approachStart = waypoints.getMarker(Path.CHECK_COLLISIONS_UNTIL)
+        if approachStart is not None:
+            keep[approachStart:] = True
+
+        # Simplify each run between two points we have to keep on its own
+        points = cartesian.tolist()
+        mandatory = np.flatnonzero(keep)
+        stack = [(int(start), int(end)) for start, end in zip(mandatory[:-1], mandatory[1:]) if end - start > 1]
+        while stack:
+            start, end = stack.pop()
+
+            # A move that is too long gets split in the middle, no matter how straight it is
+            if math.dist(points[start], points[end]) > maxSegmentLength:
+                split = (start + end) // 2
+            else:
+                # Squared distance of every point in between from the straight move
+                offsets = cartesian[start + 1:end] - cartesian[start]
+                direction = cartesian[end] - cartesian[start]
+                lengthSquared = direction @ direction
+                distancesSquared = (offsets * offsets).sum(axis=1)
+                if lengthSquared > 0:
+                    projections = offsets @ direction
+                    distancesSquared -= projections * projections / lengthSquared
+
+                farthest = int(np.argmax(distancesSquared))
+                if distancesSquared[farthest] <= tolerance * tolerance:
+                    continue
+                split = start + 1 + farthest
+
+            keep[split] = True
+            if split - start > 1:
+                stack.append((start, split))
+            if end - split > 1:
+                stack.append((split, end))
+
+        keptIndices = np.flatnonzero(keep)
+        simplifiedPath = Path.fromArray(waypoints.polar[keptIndices])
+
+        # Marked points are always kept, so find where they ended up
+        newIndices = np.cumsum(keep) - 1
+        for name, index in waypoints.markers.items():
+            simplifiedPath.setMarker(name, int(newIndices[index]))
+
+        return simplifiedPath
 
-        # Transform our line into a vector of the form v0 + t * d
-        # Where v0 is the initial point, d is the direction vector, and t is the scalar
-        vectorInitial = np.array(initialPoint)
-        d = (np.array(finalPoint) - vectorInitial) / np.linalg.norm(np.array(finalPoint) - vectorInitial)
+    @staticmethod
+    def stackObstacles(obstacles: list) -> tuple:
+        """Stacks obstacles from constants.rectangleToCartesian into the arrays checkIntersections works on
+        Args:
+            obstacles (list): Obstacles from constants.rectangleToCartesian
+        Returns:
+            obstacles (tuple): Each part of the obstacles as an array with a row per obstacle
+        """
+        if not obstacles:
+            return tuple(np.empty((0, 3)) for _ in range(4)) + tuple(np.empty(0) for _ in range(3))
+        return tuple(np.array(part, dtype=float) for part in zip(*obstacles))
 
-        # The t is never used, just there for completeness
-        t = np.linalg.norm(np.array(finalPoint) - vectorInitial)
+    @staticmethod
+    def checkIntersections(startPoints: np.ndarray, endPoints: np.ndarray, obstacles: tuple) -> tuple:
+        """Checks every line segment against every obstacle rectangle at once
+        Args:
+            startPoints (np.ndarray): (S, 3) cartesian start points of the segments
+            endPoints (np.ndarray): (S, 3) cartesian end points of the segments
+            obstacles (tuple): R stacked obstacles from stackObstacles
+        Returns:
+            hits (np.ndarray): (S, R) True where a segment goes through an obstacle
+            clearances (np.ndarray): (R,) Z height to move at to get over each obstacle
+        """
+        # Implements answer from https://stackoverflow.com/questions/8812073/ray-and-square-rectangle-intersection-in-3d/8862483#8862483
+        origins, edges0, edges1, normals, edge0LengthsSq, edge1LengthsSq, clearances = obstacles
+        startPoints = np.asarray(startPoints, dtype=float).reshape(-1, 3)
+        endPoints = np.asarray(endPoints, dtype=float).reshape(-1, 3)
 
-        # Converto to cartesian coordinates
-        rectangle = [constants.polarToCartesian(point) for point in rectangle]
+        # Each segment is v0 + a * d where d goes all the way to the end point, so 0 <= a <= 1 is on the segment
+        d = endPoints - startPoints
 
-        # Represent our rectangle as an initial point and 2 vectors. r0 is the initial point, s0 and s1 are the vectors
-        # The initial point is the bottom left corner of the rectangle (point0)
-        r0 = np.array(rectangle[0])
-        s0 = np.array(rectangle[1]) - r0
-        s1 = np.array(rectangle[2]) - r0
+        # Solve for where each segment's line meets each rectangle's plane
+        # Segments parallel to a plane (d.n == 0) never go through it
+        dDotN = d @ normals.T
+        parallel = np.abs(dDotN) < 1e-9
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a = (np.sum(origins * normals, axis=1) - startPoints @ normals.T) / np.where(parallel, 1, dDotN)
+        onSegment = ~parallel & (a >= 0) & (a <= 1)
 
-        # We also need the normal vector of the rectangle
-        n = np.cross(s0, s1)
+        # Project the vector from each rectangle's origin to the intersection point onto the rectangle's edges
+        # The point is inside the rectangle if both projections are between 0 and 1 edge length
+        rectOriginToIntersection = startPoints[:, np.newaxis, :] + a[..., np.newaxis] * d[:, np.newaxis, :] - origins
+        projectionOntoEdge0 = np.sum(rectOriginToIntersection * edges0, axis=2) / edge0LengthsSq
+        projectionOntoEdge1 = np.sum(rectOriginToIntersection * edges1, axis=2) / edge1LengthsSq
 
-        # Assuming our intersection point is P; P = v0 + a * d where a is how far away from v0 the intersection is
-        a = ((r0 - vectorInitial).dot(n)) / (d.dot(n))
+        hits = (onSegment
+                & (projectionOntoEdge0 >= 0) & (projectionOntoEdge0 <= 1)
+                & (projectionOntoEdge1 >= 0) & (projectionOntoEdge1 <= 1))
 
-        # All we need to do now is check if our point is within the rectangle
-        # To do this, we project the vector from point0 of the rectangle onto the s0 and s1 vectors
-        rectOriginToIntersection = (vectorInitial + a * d) - r0
+        return hits, clearances
 
-        projectionOntoS0 = np.dot(rectOriginToIntersection, s0) / np.linalg.norm(s0)
-        projectionOntoS1 = np.dot(rectOriginToIntersection, s1) / np.linalg.norm(s1)
+    @staticmethod
+    def checkIntersection(initialPoint: tuple, finalPoint: tuple, rectangle: list) -> tuple:
+        """Checks if a line intersects a polygon
+        Args:
+            initialPoint (tuple): The starting point of the line in polar coordinates
+            finalPoint (tuple): The ending point of the line in polar coordinates
+            rectangle(list): The rectangle to check for intersection, in the form [point0, point1, point2, point3], All in polar coordinates
+        Returns:
+            intersection (bool): True if the line intersects the polygon, False otherwise
+            zHeight (float): The height of the intersection, if there is one
+        """
+        points = constants.polarToCartesianArray([initialPoint, finalPoint])
+        obstacles = RobotManager.stackObstacles([constants.rectangleToCartesian(rectangle)])
+        hits, clearances = RobotManager.checkIntersections(points[:1], points[1:], obstacles)
 
-        if 0 <= np.linalg.norm(projectionOntoS0) <= np.linalg.norm(s0) and 0 <= np.linalg.norm(
-                projectionOntoS1) <= np.linalg.norm(s1):
-            # print(f'Intersection at {vectorInitial + a * d}')
-            # Find Z height to move at
-            zMovingHeight = rectangle[2][2] + constants.robotMovingPadding
-            return True, zMovingHeight
+        if hits[0, 0]:
+            return True, clearances[0]
 
         return False, None
 
-
-    def avoidPoles(self, initialPoint: tuple, finalPoint: tuple) -> list or None:
-        poles = constants.poles
+    def avoidPoles(self, initialPoint: tuple, finalPoint: tuple) -> Path or None:
+        points = constants.polarToCartesianArray([initialPoint, finalPoint])
 
         # Check intersection with each pole
-        for pole in poles:
-            if self.checkIntersection(initialPoint, finalPoint, pole):
-                # If we intersect with a pole, dodge it
-                print('Dodging pole')
-                return self.dodgePole(initialPoint, finalPoint)
+        hits, _clearances = self.checkIntersections(points[:1], points[1:], self.poleObstacles)
+        if hits.any():
+            # If we intersect with a pole, dodge it
+            print('Dodging pole')
+            return self.dodgePole(initialPoint, finalPoint)
 
         # If we don't intersect with any poles, return None
         return None
@@ -756,7 +1458,7 @@ class RobotManager:
     @staticmethod
     def dodgePole(initialPoint, finalPoint):
         # We don't actually need to do any math here, just move to max moving R and then move over
-        waypoints = []
+        waypoints = Path()
         waypoints.append(initialPoint)
         waypoints.append((constants.maximumMovingRadius, initialPoint[1], initialPoint[2]))
         waypoints.append((constants.maximumMovingRadius, finalPoint[1], finalPoint[2]))
@@ -0,0 +1,115 @@
+import time
+
+import Objects.hardware as hardware
+
+
+class Task:
+
+    # One job the scheduler runs at a fixed rate, and its stats
+
+    # Upper edges of the CPU time histogram buckets in seconds, the last bucket holds everything slower
+    CPU_TIME_BUCKETS = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1)
+
+    def __init__(self, name: str, function, rate: float):
+        self.name = name
+        self.function = function
+        self.period = 1 / rate
+
+        # When the task should run next
+        self.nextRun = None
+
+        # Stats
+        self.runs = 0
+        self.missedDeadlines = 0
+        self.maxLateness = 0
+        self.cpuTime = 0
+        self.maxCpuTime = 0
+        self.cpuTimeHistogram = [0] * (len(self.CPU_TIME_BUCKETS) + 1)
+
+    def run(self, now: float) -> None:
+        # The task should have run at nextRun. If we are past the next one too, it missed its deadline.
+        lateness = now - self.nextRun
+        self.maxLateness = max(self.maxLateness, lateness)
+        if lateness > self.period:
+            self.missedDeadlines += 1
+            # Don't try to catch up on the runs we missed, just start again from now
+            self.nextRun = now + self.period
+        else:
+            self.nextRun += self.period
+
+        start = time.process_time()
+        self.function()
+        cpuTime = time.process_time() - start
+
+        self.runs += 1
+        self.cpuTime += cpuTime
+        self.maxCpuTime = max(self.maxCpuTime, cpuTime)
+        for bucket, limit in enumerate(self.CPU_TIME_BUCKETS):
+            if cpuTime <= limit:
+                break
+        else:
+            bucket = len(self.CPU_TIME_BUCKETS)
+        self.cpuTimeHistogram[bucket] += 1
+
+    def getStats(self) -> dict:
+        labels = [f'<={limit * 1000:g}ms' for limit in self.CPU_TIME_BUCKETS] + [f'>{self.CPU_TIME_BUCKETS[-1] * 1000:g}ms']
+        return {
+            'rate': 1 / self.period,
+            'runs': self.runs,
+            'missedDeadlines': self.missedDeadlines,
+            'maxLateness': self.maxLateness,
+            'meanCpuTime': self.cpuTime / self.runs if self.runs else 0,
+            'maxCpuTime': self.maxCpuTime,
+            'cpuTimeHistogram': dict(zip(labels, self.cpuTimeHistogram)),
+        }
+
+
+class Scheduler:
+
+    # Runs each of our objects' process functions at its own rate instead of all of them as fast as possible.
+    # This keeps us from re-reading sensors that haven't changed, which frees up the CPU and the RS-485 bus
+    # for the things that need to be quick, like the robot arm.
+    #
+    # It is cooperative: every task runs to completion, so a slow task makes the others late.
+    # A task that starts more than a whole period late counts as a missed deadline.
+
+    def __init__(self):
+        self.tasks = []
+
+    def addTask(self, name: str, function, rate: float) -> Task:
+        """Adds a task to run rate times a second
+        When more than one task is due, they run in the order they were added.
+        """
+        task = Task(name, function, rate)
+        self.tasks.append(task)
+        return task
+
+    def reset(self) -> None:
+        """Makes every task due right away, for example after the robot has been set up again"""
+        now = hardware.time()
+        for task in self.tasks:
+            task.nextRun = now
+
+    def runOnce(self) -> None:
+        """Runs the tasks that are due, then sleeps until the next one is"""
+        if self.tasks and self.tasks[0].nextRun is None:
+            self.reset()
+
+        for task in self.tasks:
+            now = hardware.time()
+            if task.nextRun <= now:
+                task.run(now)
+
+        sleepTime = min(task.nextRun for task in self.tasks) - hardware.time()
+        if sleepTime > 0:
+            hardware.sleep(sleepTime)
+
+    def getStats(self) -> dict:
+        return {task.name: task.getStats() for task in self.tasks}
+
+    def printStats(self) -> None:
+        for task in self.tasks:
+            stats = task.getStats()
+            print(f'{task.name}: {stats["runs"]} runs at {stats["rate"]:g} Hz, '
+                  f'{stats["missedDeadlines"]} missed deadlines, '
+                  f'cpu mean {stats["meanCpuTime"] * 1000:.2f} ms max {stats["maxCpuTime"] * 1000:.2f} ms')
@@ -0,0 +1,112 @@
+import Objects.constants as constants
+import Objects.hardware as hardware
+
+
+class ShadowRegisters:
+
+    # Remembers the last value written to each output so writing the same value again can be skipped.
+    # A write still goes through if the output hasn't been written for resyncPeriod seconds,
+    # so the board gets corrected if it ever missed a command. None turns that off.
+
+    def __init__(self, resyncPeriod: float = constants.outputResyncPeriod):
+        self.resyncPeriod = resyncPeriod
+        self.values = {}
+
+        # Stats
+        self.sentWrites = 0
+        self.skippedWrites = 0
+
+    def needsWrite(self, output, value) -> bool:
+        """Returns True if the value has to be sent to the board. Call written() once it has been"""
+        if output in self.values:
+            lastValue, lastWriteTime = self.values[output]
+            if lastValue == value and (self.resyncPeriod is None or hardware.time() - lastWriteTime < self.resyncPeriod):
+                self.skippedWrites += 1
+                return False
+        return True
+
+    def written(self, output, value, successFlg: bool) -> None:
+        self.sentWrites += 1
+        if successFlg:
+            self.values[output] = (value, hardware.time())
+        else:
+            # We don't know what the board has now, send the next write no matter what
+            self.forget(output)
+
+    def forget(self, output) -> None:
+        self.values.pop(output, None)
+
+
+class ShadowedDPiSolenoid:
+
+    # Wraps a DPiSolenoid so switching a driver to the state it is already in doesn't use the bus.
+    # Everything else goes straight to the board.
+
+    def __init__(self, dpiSolenoid, resyncPeriod: float = constants.outputResyncPeriod):
+        self.dpiSolenoid = dpiSolenoid
+        self.shadow = ShadowRegisters(resyncPeriod)
+
+    def __getattr__(self, name):
+        return getattr(self.dpiSolenoid, name)
+
+    def initialize(self) -> bool:
+        # The board goes back to all drivers off, but we don't trust that until we write them
+        self.shadow.values.clear()
+        return self.dpiSolenoid.initialize()
+
+    def switchDriverOnOrOff(self, driverNumber: int, onOffValue: bool) -> bool:
+        onOffValue = bool(onOffValue)
+        if not self.shadow.needsWrite(driverNumber, onOffValue):
+            return True
+
+        successFlg = self.dpiSolenoid.switchDriverOnOrOff(driverNumber, onOffValue)
+        self.shadow.written(driverNumber, onOffValue, successFlg)
+        return successFlg
+
+
+class ShadowedDPiClockNBlock:
+
+    # Wraps a DPiClockNBlock so the arrow only gets written when it changes.
+    # We don't know if turning the arrow on or off stops it blinking on the board,
+    # so writing one of them always makes us send the next write of the other.
+    # Everything else goes straight to the board.
+
+    _ARROW = 'arrow'
+    _BLINK = 'blink'
+
+    def __init__(self, dpiClockNBlock, resyncPeriod: float = constants.outputResyncPeriod):
+        self.dpiClockNBlock = dpiClockNBlock
+        self.shadow = ShadowRegisters(resyncPeriod)
+
+    def __getattr__(self, name):
+        return getattr(self.dpiClockNBlock, name)
+
+    def initialize(self) -> bool:
+        self.shadow.values.clear()
+        return self.dpiClockNBlock.initialize()
+
+    def arrowOn(self) -> bool:
+        return self.toggleArrow(True)
+
+    def arrowOff(self) -> bool:
+        return self.toggleArrow(False)
+
+    def toggleArrow(self, onOffValue: bool) -> bool:
+        onOffValue = bool(onOffValue)
+        if not self.shadow.needsWrite(self._ARROW, onOffValue):
+            return True
+
+        successFlg = self.dpiClockNBlock.toggleArrow(onOffValue)
+        self.shadow.written(self._ARROW, onOffValue, successFlg)
+        self.shadow.forget(self._BLINK)
+        return successFlg
+
+    def blinkArrow(self, enableFlg=False, blinkDurationMS=1000) -> bool:
+        value = (bool(enableFlg), blinkDurationMS)
+        if not self.shadow.needsWrite(self._BLINK, value):
+            return True
+
+        successFlg = self.dpiClockNBlock.blinkArrow(enableFlg, blinkDurationMS)
+        self.shadow.written(self._BLINK, value, successFlg)
+        self.shadow.forget(self._ARROW)
+        return successFlg
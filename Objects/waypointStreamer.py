@@ -0,0 +1,114 @@
+import itertools
+
+import numpy as np
+
+import Objects.constants as constants
+
+
+class WaypointStreamer:
+
+    # Sends a path to the DPiRobot a few waypoints at a time instead of all at once.
+    #
+    # start() buffers the first few waypoints and starts the robot moving, then process() tops up the robot's
+    # waypoint buffer each time the robot arm is processed, until the path runs out. This way the robot starts
+    # moving after a handful of bus transactions, main() is never stuck uploading a long path, and we never
+    # buffer more waypoints before moving than the board has room for.
+    #
+    # The board only tells us whether its buffer is full, not how full it is, so that is what we check.
+    # The waypoints can come from any iterable, like a generator, and are only read when they get sent.
+
+    def __init__(self, dpiRobot, initialWaypoints: int = constants.robotInitialWaypoints,
+                 waypointsPerProcess: int = constants.robotWaypointsPerProcess):
+        self.dpiRobot = dpiRobot
+        self.initialWaypoints = initialWaypoints
+        self.waypointsPerProcess = waypointsPerProcess
+
+        # (waypoint, speed) pairs we haven't sent yet, None when we aren't streaming
+        self.waypoints = None
+
+        # Stats
+        self.sentWaypoints = 0
+        self.bufferFullCount = 0
+
+    def isStreaming(self) -> bool:
+        return self.waypoints is not None
+
+    def start(self, waypoints, speed=constants.robotSpeed) -> bool:
+        """Sends the first waypoints and starts the robot moving. The robot needs to be stopped
+        Args:
+            waypoints: Iterable of cartesian (x, y, z) waypoints
+            speed: How fast to move the robot, either one speed or an iterable with a speed for each waypoint
+        Returns:
+            True if the robot took the waypoints
+        """
+        speeds = itertools.repeat(speed) if np.isscalar(speed) else speed
+        self.waypoints = zip(waypoints, speeds)
+
+        # Check for room before each waypoint, if the buffer fills before we start moving it would never empty
+        self.dpiRobot.bufferWaypointsBeforeStartingToMove(True)
+        successFlg = True
+        for _ in range(self.initialWaypoints):
+            successFlg, _status, bufferFullFlg = self.dpiRobot.getRobotStatusWithWaypointBufferFullFlg()
+            if not successFlg or bufferFullFlg:
+                break
+            successFlg = self.sendNext()
+            if not successFlg or not self.isStreaming():
+                break
+        self.dpiRobot.bufferWaypointsBeforeStartingToMove(False)
+
+        return successFlg
+
+    def process(self) -> bool:
+        """Sends the next few waypoints if the robot has room for them
+        Returns:
+            True while there are waypoints left to send
+        """
+        if not self.isStreaming():
+            return False
+
+        successFlg, _status, bufferFullFlg = self.dpiRobot.getRobotStatusWithWaypointBufferFullFlg()
+        if not successFlg:
+            return True
+        if bufferFullFlg:
+            self.bufferFullCount += 1
+            return True
+
+        # If the buffer fills up part way through, addWaypoint waits until the robot finishes a waypoint
+        for _ in range(self.waypointsPerProcess):
+            if not self.sendNext() or not self.isStreaming():
+                break
+        return self.isStreaming()
+
+    def finish(self) -> bool:
+        """Sends all the waypoints that are left, waiting for room in the robot's buffer when it is full
+        Returns:
+            True if the robot took all of them
+        """
+        while self.isStreaming():
+            if not self.sendNext():
+                return False
+        return True
+
+    def cancel(self) -> None:
+        """Stops sending waypoints. The ones the robot already has still get run"""
+        self.waypoints = None
+
+    def sendNext(self) -> bool:
+        """Sends the next waypoint, and stops streaming once there are none left
+        Returns:
+            False if the robot didn't take it
+        """
+        waypoint = next(self.waypoints, None)
+        if waypoint is None:
+            self.cancel()
+            return True
+
+        (x, y, z), speed = waypoint
+        if not self.dpiRobot.addWaypoint(x, y, z, speed):
+            # The robot can't take waypoints right now, like when the E-Stop is pressed
+            print('Robot did not take waypoint, stopped streaming')
+            self.cancel()
+            return False
+
+        self.sentWaypoints += 1
+        return True
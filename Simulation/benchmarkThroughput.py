@@ -0,0 +1,278 @@
+"""Blocks per hour benchmark
+
+Runs the whole loop in the simulation for a number of simulated hours with a fixed seed and start time,
+then reports how the robot did:
+    - cycle times, from starting to move to a feeder until the block is placed
+    - how much of the time the robot sat idle
+    - blocks placed on each build site
+    - how tall the towers were when the minute hand swept them
+    - planning CPU time for each move type
+    - how many waypoints got queued per move
+    - how far off RobotManager.estimateDuration was from how long the moves really took
+    - how each of main's scheduled tasks kept up
+
+    python -m Simulation.benchmarkThroughput --hours 1 --output throughput.json
+    python -m Simulation.benchmarkThroughput --hours 1 --compare throughput.json
+
+The results are saved as JSON so runs from different commits can be compared.
+"""
+import argparse
+import contextlib
+import io
+import json
+import subprocess
+import time
+
+import numpy as np
+
+from Simulation.runSimulation import runSimulation
+from Simulation.simulatedWorld import SimulatedWorld
+
+# Midnight, January 1st 2024 UTC. A fixed start time keeps the clock hands in the same place every run
+DEFAULT_START_TIME = 1704067200
+
+
+class ThroughputRecorder:
+
+    # Watches the robot arm and robot manager during a simulation and collects the benchmark numbers.
+    # It wraps a few of their methods, so nothing in Objects/ needs to know it is being measured.
+
+    def __init__(self, world: SimulatedWorld):
+        self.world = world
+
+        self.cycleStart = None
+        self.cycleTimes = []
+
+        self.state = None
+        self.stateStart = None
+        self.timeInState = {}
+
+        self.pendingBuildSite = None
+        self.blocksPerBuildSite = {}
+        self.sweptTowerHeights = []
+
+        self.planningTimes = {}
+        self.queuedWaypoints = []
+        self.moveStart = None
+        self.moveEstimate = None
+        self.moveEstimateErrors = []
+        self.planner = None
+        self.robotManager = None
+
+    def attach(self, main) -> None:
+        """Starts recording the objects in the main module"""
+        robot = main.robot
+        robotManager = robot.robotManager
+
+        for buildSite in main.buildSites:
+            self.blocksPerBuildSite[buildSite.buildSiteNumber] = 0
+            self.wrapPlaceNextBlock(buildSite)
+            self.wrapUpdateReadyFlg(buildSite)
+
+        self.state = robot.state
+        self.stateStart = self.world.now
+
+        setState = robot.setState
+        def recordSetState(state):
+            self.stateChanged(robot, state)
+            setState(state)
+        robot.setState = recordSetState
+
+        self.wrapPlanner(robotManager)
+        self.planner = robot.planner
+        self.robotManager = robotManager
+
+        queueWaypoints = robot.queueWaypoints
+        def recordQueueWaypoints(waypoints, *args, **kwargs):
+            self.queuedWaypoints.append(len(waypoints))
+            self.moveStart = self.world.now
+            self.moveEstimate = robotManager.estimateDuration(waypoints, robot.getPositionPolar())
+            return queueWaypoints(waypoints, *args, **kwargs)
+        robot.queueWaypoints = recordQueueWaypoints
+
+    def wrapPlaceNextBlock(self, buildSite) -> None:
+        placeNextBlock = buildSite.placeNextBlock
+        def recordPlaceNextBlock():
+            location = placeNextBlock()
+            if location is not None:
+                self.pendingBuildSite = buildSite.buildSiteNumber
+            return location
+        buildSite.placeNextBlock = recordPlaceNextBlock
+
+    def wrapUpdateReadyFlg(self, buildSite) -> None:
+        # The build site empties itself when the minute hand gets to it
+        updateReadyFlg = buildSite.updateReadyFlg
+        def recordUpdateReadyFlg(minuteHandPosition):
+            height = buildSite.currentBlock
+            updateReadyFlg(minuteHandPosition)
+            if height and buildSite.currentBlock == 0:
+                self.sweptTowerHeights.append(height)
+        buildSite.updateReadyFlg = recordUpdateReadyFlg
+
+    def wrapPlanner(self, robotManager) -> None:
+        # Every move, planned ahead of time or not, goes through planMove.
+        # The moves planned ahead of time are planned by snapshots of the robot manager
+        snapshot = robotManager.snapshot
+        def recordSnapshot():
+            robotManagerSnapshot = snapshot()
+            self.wrapPlanner(robotManagerSnapshot)
+            return robotManagerSnapshot
+        robotManager.snapshot = recordSnapshot
+
+        planMove = robotManager.planMove
+        def recordPlanMove(*args, **kwargs):
+            start = time.process_time()
+            waypoints = planMove(*args, **kwargs)
+            elapsed = time.process_time() - start
+            self.planningTimes.setdefault(robotManager.lastMoveType, []).append(elapsed)
+            return waypoints
+        robotManager.planMove = recordPlanMove
+
+    def stateChanged(self, robot, newState: int) -> None:
+        now = self.world.now
+        self.timeInState[self.state] = self.timeInState.get(self.state, 0) + now - self.stateStart
+        self.state = newState
+        self.stateStart = now
+
+        # Moves to feeders and build sites end when the robot gets there and starts picking up or placing
+        if newState in (robot.STATE_PICKUP_BLOCK, robot.STATE_PLACE_BLOCK) and self.moveStart is not None:
+            self.moveEstimateErrors.append(now - self.moveStart - self.moveEstimate)
+        self.moveStart = None
+
+        if newState == robot.STATE_MOVE_TO_FEEDER:
+            self.cycleStart = now
+
+        elif newState == robot.STATE_PLACE_BLOCK:
+            if self.cycleStart is not None:
+                self.cycleTimes.append(now - self.cycleStart)
+                self.cycleStart = None
+            if self.pendingBuildSite is not None:
+                self.blocksPerBuildSite[self.pendingBuildSite] += 1
+                self.pendingBuildSite = None
+
+    def results(self, robot, duration: float) -> dict:
+        """Sums everything up in a dictionary that can be saved as JSON"""
+        # Count the time in the state we finished in
+        self.stateChanged(robot, self.state)
+
+        blocksPlaced = sum(self.blocksPerBuildSite.values())
+        return {
+            'simulatedHours': duration / 3600,
+            'blocksPlaced': blocksPlaced,
+            'blocksPerHour': blocksPlaced / (duration / 3600),
+            'cycleTime': summarize(self.cycleTimes),
+            'idleFraction': self.timeInState.get(robot.STATE_IDLE, 0) / duration,
+            'blocksPerBuildSite': {str(index): count for index, count in self.blocksPerBuildSite.items()},
+            'sweptTowerHeight': summarize(self.sweptTowerHeights),
+            'towersSweptPerHour': len(self.sweptTowerHeights) / (duration / 3600),
+            'planningCpuTime': {moveType: summarize(times) for moveType, times in sorted(self.planningTimes.items())},
+            'queuedWaypoints': summarize(self.queuedWaypoints),
+            'moveEstimateError': summarize(self.moveEstimateErrors),
+            'plansMadeAhead': {'used': self.planner.hits, 'thrownAway': self.planner.misses},
+            'planCache': dict(self.robotManager.planCacheStats),
+            'busTransactions': self.world.transactionCount,
+            'missedPickups': self.world.missedPickups,
+        }
+
+
+def summarize(values: list) -> dict:
+    """Count, mean and percentiles of a list of numbers"""
+    if not values:
+        return {'count': 0}
+
+    values = np.asarray(values, dtype=float)
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {
+        'count': len(values),
+        'mean': float(values.mean()),
+        'min': float(values.min()),
+        'p50': float(p50),
+        'p90': float(p90),
+        'p99': float(p99),
+        'max': float(values.max()),
+    }
+
+
+def currentCommit() -> str or None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def runBenchmark(hours: float = 1, seed: int = 0, startTime: float = DEFAULT_START_TIME) -> dict:
+    """Runs the simulation for a number of simulated hours and returns the results"""
+    world = SimulatedWorld(startTime=startTime)
+    recorder = ThroughputRecorder(world)
+    objects = {}
+
+    def onObjectsCreated(main):
+        objects['main'] = main
+        objects['robot'] = main.robot
+        recorder.attach(main)
+
+    duration = hours * 3600
+    wallStart = time.perf_counter()
+    # The objects print a lot, we only want the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        runSimulation(duration, seed, world, onObjectsCreated)
+    wallTime = time.perf_counter() - wallStart
+
+    results = recorder.results(objects['robot'], world.elapsed())
+    results['scheduler'] = objects['main'].scheduler.getStats()
+    clock = objects['main'].clock
+    results['clock'] = {'fastForwardSteps': clock.fastForwardSteps, 'finalTimeOffset': clock.timeOffset}
+    results['seed'] = seed
+    results['startTime'] = startTime
+    results['wallTime'] = wallTime
+    results['commit'] = currentCommit()
+    return results
+
+
+def compare(old: dict, new: dict) -> None:
+    """Prints the main numbers of two runs side by side"""
+    rows = [
+        ('blocks per hour', old['blocksPerHour'], new['blocksPerHour']),
+        ('cycle time p50 (s)', old['cycleTime'].get('p50'), new['cycleTime'].get('p50')),
+        ('cycle time p90 (s)', old['cycleTime'].get('p90'), new['cycleTime'].get('p90')),
+        ('idle fraction', old['idleFraction'], new['idleFraction']),
+        ('swept tower height (blocks)', old.get('sweptTowerHeight', {}).get('mean'),
+         new.get('sweptTowerHeight', {}).get('mean')),
+        ('towers swept per hour', old.get('towersSweptPerHour'), new.get('towersSweptPerHour')),
+        ('waypoints per move', old['queuedWaypoints'].get('mean'), new['queuedWaypoints'].get('mean')),
+        ('move estimate error p50 (s)', old.get('moveEstimateError', {}).get('p50'),
+         new.get('moveEstimateError', {}).get('p50')),
+    ]
+    for moveType in sorted(set(old['planningCpuTime']) | set(new['planningCpuTime'])):
+        rows.append((f'{moveType} planning (ms)',
+                     old['planningCpuTime'].get(moveType, {}).get('mean', float('nan')) * 1000,
+                     new['planningCpuTime'].get(moveType, {}).get('mean', float('nan')) * 1000))
+
+    print(f'{"":28}{old.get("commit") or "old":>12}{new.get("commit") or "new":>12}')
+    for name, oldValue, newValue in rows:
+        oldValue = float('nan') if oldValue is None else oldValue
+        newValue = float('nan') if newValue is None else newValue
+        print(f'{name:28}{oldValue:12.3f}{newValue:12.3f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Blocks per hour benchmark in the simulation')
+    parser.add_argument('--hours', type=float, default=1, help='simulated hours to run for')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--start-time', type=float, default=DEFAULT_START_TIME, help='simulated start time (epoch seconds)')
+    parser.add_argument('--output', help='file to save the results to')
+    parser.add_argument('--compare', help='results file from an earlier run to compare against')
+    args = parser.parse_args()
+
+    results = runBenchmark(args.hours, args.seed, args.start_time)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=4)
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), results)
+    else:
+        print(json.dumps(results, indent=4))
@@ -0,0 +1,59 @@
+"""Runs the whole project against the simulated hardware
+
+    python -m Simulation.runSimulation --duration 3600 --seed 0
+
+Nothing here needs the DPi boards, so this runs on any computer with numpy.
+"""
+import argparse
+import time
+
+import numpy as np
+
+import Objects.hardware as hardware
+from Simulation.simulatedWorld import SimulatedWorld
+
+
+def runSimulation(duration: float, seed: int = None, world: SimulatedWorld = None, onObjectsCreated=None) -> SimulatedWorld:
+    """Sets up and runs main for duration simulated seconds
+    Args:
+        duration (float): How long to run the main loop for, in simulated seconds
+        seed (int): Seed for numpy's random numbers so runs can be repeated
+        world (SimulatedWorld): World to run in, a new one is made if this is None
+        onObjectsCreated (callable): Called with the main module once its objects exist, before setup
+    Returns:
+        The world the simulation ran in, it holds all the boards and stats
+    """
+    if seed is not None:
+        np.random.seed(seed)
+
+    if world is None:
+        world = SimulatedWorld()
+    hardware.useSimulation(world)
+
+    # Import main only once the simulation is in place
+    import main
+    try:
+        main.createObjects()
+        if onObjectsCreated is not None:
+            onObjectsCreated(main)
+        main.setup()
+        main.main(duration)
+    finally:
+        hardware.useHardware()
+
+    return world
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the clock and block against simulated hardware')
+    parser.add_argument('--duration', type=float, default=3600, help='simulated seconds to run for')
+    parser.add_argument('--seed', type=int, default=None, help='random seed')
+    args = parser.parse_args()
+
+    wallStart = time.perf_counter()
+    world = runSimulation(args.duration, args.seed)
+    wallTime = time.perf_counter() - wallStart
+
+    print(f'Simulated {world.elapsed():.0f} s in {wallTime:.1f} s ({world.elapsed() / wallTime:.1f}x real time)')
+    print(f'Blocks placed: {world.blocksPlaced}, missed pickups: {world.missedPickups}')
+    print(f'Waypoints sent: {world.robot.waypointsAdded}, bus transactions: {world.transactionCount}')
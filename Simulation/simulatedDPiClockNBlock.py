@@ -0,0 +1,128 @@
+class SimulatedFeeder:
+
+    # The mechanics of one block feeder.
+    #
+    # Blocks wait in the hopper (the first one sits on the feed 1 sensor, the one behind it on the entrance sensor).
+    # Pushing the side piston moves the front block over to feed 2 and pushing the up piston lifts it to the exit,
+    # where the robot picks it up. Pistons take pistonTime to finish a push.
+    #
+    # The sensors can be scripted from a simulation by adding blocks or taking the exit block away at any time,
+    # either directly or with world.schedule().
+
+    def __init__(self, world, index: int, sidePiston: int, upPiston: int, blocks: int = 10, pistonTime: float = 0.5):
+        self.world = world
+        self.index = index
+        self.sidePiston = sidePiston
+        self.upPiston = upPiston
+        self.pistonTime = pistonTime
+
+        self.hopperBlocks = blocks
+        self.feed2Flg = False
+        self.exitFlg = False
+
+        self.arrowOnFlg = False
+        self.arrowBlinkingFlg = False
+
+        # Stats
+        self.blocksFed = 0
+
+    # Sensors
+    def entrance(self) -> bool:
+        return self.hopperBlocks >= 2
+
+    def feed1(self) -> bool:
+        return self.hopperBlocks >= 1
+
+    def feed2(self) -> bool:
+        return self.feed2Flg
+
+    def exit(self) -> bool:
+        return self.exitFlg
+
+    # Scripting
+    def addBlocks(self, numBlocks: int = 1) -> None:
+        self.hopperBlocks += numBlocks
+
+    def takeBlock(self) -> bool:
+        """Takes the block at the exit, returns False if there wasn't one"""
+        if not self.exitFlg:
+            return False
+        self.exitFlg = False
+        return True
+
+    # Pistons
+    def pistonSwitched(self, driverNumber: int, onFlg: bool) -> None:
+        if not onFlg:
+            return
+        if driverNumber == self.sidePiston:
+            self.world.schedule(self.pistonTime, self.pushOver)
+        elif driverNumber == self.upPiston:
+            self.world.schedule(self.pistonTime, self.pushUp)
+
+    def pushOver(self) -> None:
+        if self.hopperBlocks and not self.feed2Flg:
+            self.hopperBlocks -= 1
+            self.feed2Flg = True
+
+    def pushUp(self) -> None:
+        if self.feed2Flg and not self.exitFlg:
+            self.feed2Flg = False
+            self.exitFlg = True
+            self.blocksFed += 1
+
+
+class SimulatedDPiClockNBlock:
+
+    # Simulated stand in for DPi_ClockNBlock_Python.DPiClockNBlock
+    # Setting the board number connects it to the simulated feeder with the same index.
+
+    def __init__(self, world):
+        self.world = world
+        self.feeder = None
+
+    def setBoardNumber(self, boardNumber: int) -> None:
+        self.feeder = self.world.feeders[boardNumber]
+
+    def ping(self) -> bool:
+        self.world.transaction()
+        return self.feeder is not None
+
+    def initialize(self) -> bool:
+        self.world.transaction()
+        return self.feeder is not None
+
+    def readEntrance(self) -> bool:
+        self.world.transaction()
+        return self.feeder.entrance()
+
+    def readFeed_1(self) -> bool:
+        self.world.transaction()
+        return self.feeder.feed1()
+
+    def readFeed_2(self) -> bool:
+        self.world.transaction()
+        return self.feeder.feed2()
+
+    def readExit(self) -> bool:
+        self.world.transaction()
+        return self.feeder.exit()
+
+    def arrowOn(self) -> bool:
+        self.world.transaction()
+        self.feeder.arrowOnFlg = True
+        return True
+
+    def arrowOff(self) -> bool:
+        self.world.transaction()
+        self.feeder.arrowOnFlg = False
+        return True
+
+    def toggleArrow(self, onOffValue: bool) -> bool:
+        if onOffValue:
+            return self.arrowOn()
+        return self.arrowOff()
+
+    def blinkArrow(self, enableFlg=False, blinkDurationMS=1000) -> bool:
+        self.world.transaction()
+        self.feeder.arrowBlinkingFlg = enableFlg
+        return True
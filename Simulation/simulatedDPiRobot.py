@@ -0,0 +1,264 @@
+import collections
+import itertools
+import numpy as np
+
+
+class SimulatedDPiRobot:
+
+    # Simulated stand in for dpeaDPi.DPiRobot
+    #
+    # The robot has a waypoint queue and moves through it in a straight line at each waypoint's speed.
+    # Its position is only worked out when something asks for it, based on how much simulated time has passed.
+    # Every call that would go over the RS-485 bus costs one bus transaction of simulated time.
+    #
+    # With an acceleration, it speeds up and slows down like the board does: it slows down for corners
+    # (using the junction deviation) and plans to stop at the last waypoint it has, looking ahead
+    # at most LOOKAHEAD waypoints. Without one, it changes speed instantly.
+
+    LOOKAHEAD = 64
+
+    # Robot states, same values as DPiRobot
+    STATE_NOT_READY = 2
+    STATE_MOTORS_DISABLED = 3
+    STATE_NOT_HOMED = 4
+    STATE_HOMING = 5
+    STATE_STOPPED = 6
+    STATE_PREPARING_TO_MOVE = 7
+    STATE_MOVING = 8
+    STATE_E_STOPPED_PRESSED = 9
+
+    def __init__(self, world, homePosition: tuple = (0, 0, -1200), homingTime: float = 5, waypointBufferSize: int = None,
+                 acceleration: float = None, junctionDeviation: float = 1):
+        self.world = world
+        self.homePosition = np.array(homePosition, dtype=float)
+        self.homingTime = homingTime
+
+        # None means the buffer never fills up
+        self.waypointBufferSize = waypointBufferSize
+
+        # mm/s^2 and mm, None means speed changes are instant
+        self.acceleration = acceleration
+        self.junctionDeviation = junctionDeviation
+
+        self.position = self.homePosition.copy()
+        self.speed = 0
+        self.waypoints = collections.deque()
+        # Speed the robot plans to have as it reaches each queued waypoint, None when it needs working out again
+        self.exitSpeeds = None
+        self.bufferingFlg = False
+        self.homedFlg = False
+        self.eStopFlg = False
+        self.lastUpdate = world.now
+
+        # Stats
+        self.waypointsAdded = 0
+        self.distanceTravelled = 0
+
+    # ---------------------------------------------------------------------------------
+    #                               Simulation controls
+    # ---------------------------------------------------------------------------------
+
+    def pressEStop(self, pressedFlg: bool = True) -> None:
+        """Presses or releases the E-Stop. Pressing it stops the robot and it will need to be homed again"""
+        self.update()
+        self.eStopFlg = pressedFlg
+        if pressedFlg:
+            self.clearWaypoints()
+            self.homedFlg = False
+
+    def clearWaypoints(self) -> None:
+        self.waypoints.clear()
+        self.exitSpeeds = None
+        self.speed = 0
+
+    def update(self) -> None:
+        """Moves the robot along its waypoints for however long it has been since the last update"""
+        remainingTime = self.world.now - self.lastUpdate
+        self.lastUpdate = self.world.now
+
+        if self.bufferingFlg:
+            return
+
+        if self.acceleration is not None:
+            self.updateAccelerating(remainingTime)
+            return
+
+        while remainingTime > 0 and self.waypoints:
+            target, speed = self.waypoints[0]
+            delta = target - self.position
+            distance = np.linalg.norm(delta)
+            timeToTarget = distance / speed
+
+            if timeToTarget <= remainingTime:
+                self.position = target
+                self.waypoints.popleft()
+                self.distanceTravelled += distance
+                remainingTime -= timeToTarget
+            else:
+                self.position = self.position + delta * (remainingTime / timeToTarget)
+                self.distanceTravelled += speed * remainingTime
+                remainingTime = 0
+
+    def updateAccelerating(self, remainingTime: float) -> None:
+        """Moves the robot along its waypoints for remainingTime seconds, speeding up and slowing down"""
+        acceleration = self.acceleration
+        while remainingTime > 0 and self.waypoints:
+            if not self.exitSpeeds:
+                self.planExitSpeeds()
+
+            target, maxSpeed = self.waypoints[0]
+            delta = target - self.position
+            distance = np.linalg.norm(delta)
+            startSpeed = self.speed
+            endSpeed = self.exitSpeeds[0]
+
+            # Speed up to peakSpeed, cruise, then slow down to endSpeed
+            peakSpeed = min(maxSpeed, np.sqrt((startSpeed ** 2 + endSpeed ** 2) / 2 + acceleration * distance))
+            peakSpeed = max(peakSpeed, startSpeed, endSpeed)
+            speedUpTime = (peakSpeed - startSpeed) / acceleration
+            speedUpDistance = (peakSpeed + startSpeed) / 2 * speedUpTime
+            slowDownTime = (peakSpeed - endSpeed) / acceleration
+            slowDownDistance = (peakSpeed + endSpeed) / 2 * slowDownTime
+            cruiseDistance = max(distance - speedUpDistance - slowDownDistance, 0)
+            cruiseTime = cruiseDistance / peakSpeed if peakSpeed > 0 else 0
+            timeToTarget = speedUpTime + cruiseTime + slowDownTime
+
+            if timeToTarget <= remainingTime or distance == 0:
+                self.position = target
+                self.speed = endSpeed
+                self.waypoints.popleft()
+                self.exitSpeeds.popleft()
+                if len(self.waypoints) >= self.LOOKAHEAD:
+                    # The next waypoint just came into view, so we don't have to stop at the old last one
+                    self.exitSpeeds = None
+                self.distanceTravelled += distance
+                remainingTime -= timeToTarget
+                continue
+
+            # We only get part of the way there
+            t = remainingTime
+            if t < speedUpTime:
+                travelled = startSpeed * t + acceleration * t * t / 2
+                self.speed = startSpeed + acceleration * t
+            elif t < speedUpTime + cruiseTime:
+                travelled = speedUpDistance + peakSpeed * (t - speedUpTime)
+                self.speed = peakSpeed
+            else:
+                t -= speedUpTime + cruiseTime
+                travelled = speedUpDistance + cruiseDistance + peakSpeed * t - acceleration * t * t / 2
+                self.speed = peakSpeed - acceleration * t
+            travelled = min(travelled, distance)
+
+            self.position = self.position + delta * (travelled / distance)
+            self.distanceTravelled += travelled
+            remainingTime = 0
+
+    def planExitSpeeds(self) -> None:
+        """Works out how fast the robot can go through each queued waypoint, stopping at the last one it knows"""
+        acceleration = self.acceleration
+        lookahead = list(itertools.islice(self.waypoints, self.LOOKAHEAD))
+        points = np.array([self.position] + [target for target, _speed in lookahead])
+        maxSpeeds = np.array([speed for _target, speed in lookahead])
+
+        deltas = np.diff(points, axis=0)
+        lengths = np.linalg.norm(deltas, axis=1)
+        directions = deltas / np.where(lengths > 0, lengths, 1)[:, np.newaxis]
+
+        # Corner speeds from the junction deviation, like the board
+        cosAngles = np.clip(-(directions[:-1] * directions[1:]).sum(axis=1), -1, 1)
+        sinHalfAngles = np.sqrt((1 - cosAngles) / 2)
+        with np.errstate(divide='ignore'):
+            cornerSpeedsSquared = acceleration * self.junctionDeviation * sinHalfAngles / (1 - sinHalfAngles)
+        exitSpeedsSquared = np.append(np.minimum(cornerSpeedsSquared, np.minimum(maxSpeeds[:-1], maxSpeeds[1:]) ** 2), 0)
+
+        # Make sure we can slow down in time, then that we can speed up in time
+        for i in range(len(lengths) - 2, -1, -1):
+            exitSpeedsSquared[i] = min(exitSpeedsSquared[i], exitSpeedsSquared[i + 1] + 2 * acceleration * lengths[i + 1])
+        entrySpeedSquared = min(self.speed ** 2, exitSpeedsSquared[0] + 2 * acceleration * lengths[0])
+        for i in range(len(lengths)):
+            exitSpeedsSquared[i] = min(exitSpeedsSquared[i], entrySpeedSquared + 2 * acceleration * lengths[i])
+            entrySpeedSquared = exitSpeedsSquared[i]
+
+        self.speed = min(self.speed, np.sqrt(exitSpeedsSquared[0] + 2 * acceleration * lengths[0]))
+        self.exitSpeeds = collections.deque(np.sqrt(exitSpeedsSquared).tolist())
+
+    def getState(self) -> int:
+        self.update()
+        if self.eStopFlg:
+            return self.STATE_E_STOPPED_PRESSED
+        if not self.homedFlg:
+            return self.STATE_NOT_HOMED
+        if not self.waypoints:
+            return self.STATE_STOPPED
+        if self.bufferingFlg:
+            return self.STATE_PREPARING_TO_MOVE
+        return self.STATE_MOVING
+
+    # ---------------------------------------------------------------------------------
+    #                                DPiRobot functions
+    # ---------------------------------------------------------------------------------
+
+    def setBoardNumber(self, boardNumber: int) -> None:
+        pass
+
+    def initialize(self) -> bool:
+        self.world.transaction()
+        return True
+
+    def getRobotStatus(self) -> tuple:
+        self.world.transaction()
+        return True, self.getState()
+
+    def getRobotStatusWithWaypointBufferFullFlg(self) -> tuple:
+        self.world.transaction()
+        state = self.getState()
+        bufferFullFlg = self.waypointBufferSize is not None and len(self.waypoints) >= self.waypointBufferSize
+        return True, state, bufferFullFlg
+
+    def getCurrentPosition(self) -> tuple:
+        self.world.transaction()
+        self.update()
+        x, y, z = self.position
+        return True, x, y, z
+
+    def addWaypoint(self, x: float, y: float, z: float, speed: float) -> bool:
+        # Like the real board, wait for room in the buffer if it is full
+        while self.waypointBufferSize is not None and len(self.waypoints) >= self.waypointBufferSize:
+            if self.bufferingFlg or self.getState() != self.STATE_MOVING:
+                return False
+            self.world.transaction()
+
+        self.world.transaction()
+        if self.getState() not in (self.STATE_STOPPED, self.STATE_PREPARING_TO_MOVE, self.STATE_MOVING):
+            return False
+
+        self.waypoints.append((np.array((x, y, z), dtype=float), speed))
+        self.waypointsAdded += 1
+        self.exitSpeeds = None
+        return True
+
+    def bufferWaypointsBeforeStartingToMove(self, bufferFlg: bool) -> bool:
+        self.world.transaction()
+        self.update()
+        self.bufferingFlg = bufferFlg
+        return True
+
+    def waitWhileRobotIsMoving(self) -> None:
+        self.bufferWaypointsBeforeStartingToMove(False)
+        while self.getState() in (self.STATE_MOVING, self.STATE_PREPARING_TO_MOVE, self.STATE_HOMING):
+            self.world.sleep(0.01)
+
+    def homeRobot(self, alwaysHomeFlg: bool) -> bool:
+        self.world.transaction()
+        if self.eStopFlg:
+            return False
+
+        if alwaysHomeFlg or not self.homedFlg:
+            self.clearWaypoints()
+            self.bufferingFlg = False
+            self.world.sleep(self.homingTime)
+            self.position = self.homePosition.copy()
+            self.lastUpdate = self.world.now
+            self.homedFlg = True
+
+        return True
@@ -0,0 +1,27 @@
+class SimulatedDPiSolenoid:
+
+    # Simulated stand in for dpeaDPi.DPiSolenoid
+    # Switching a driver tells the world, so the feeders' pistons and the robot's magnet react to it.
+
+    NUMBER_OF_DRIVERS = 12
+
+    def __init__(self, world):
+        self.world = world
+        self.drivers = [False] * self.NUMBER_OF_DRIVERS
+
+        # Stats
+        self.switchCount = 0
+
+    def setBoardNumber(self, boardNumber: int) -> None:
+        pass
+
+    def initialize(self) -> bool:
+        self.world.transaction()
+        return True
+
+    def switchDriverOnOrOff(self, driverNumber: int, onOffValue: bool) -> bool:
+        self.world.transaction()
+        self.drivers[driverNumber] = bool(onOffValue)
+        self.switchCount += 1
+        self.world.solenoidSwitched(driverNumber, bool(onOffValue))
+        return True
@@ -0,0 +1,211 @@
+import math
+
+
+class SimulatedStepperMotor:
+
+    # One motor on the simulated stepper board.
+    # Moves follow a trapezoidal profile: accelerate up to the set speed, cruise, then slow down to stop on the target.
+    # The speed can be changed in the middle of a move, same as the real board.
+
+    def __init__(self, speed: float = 1000, acceleration: float = 1000):
+        self.position = 0.0
+        self.velocity = 0.0
+        self.target = 0.0
+        self.speed = speed
+        self.acceleration = acceleration
+
+    def isStopped(self) -> bool:
+        return self.velocity == 0 and self.position == self.target
+
+    def stop(self) -> None:
+        self.target = self.position
+        self.velocity = 0.0
+
+    def advance(self, seconds: float) -> None:
+        """Moves the motor along its profile for a number of seconds"""
+        # Every pass through the loop is one part of the profile with a constant acceleration
+        while seconds > 0 and not self.isStopped():
+            offset = self.target - self.position
+            if offset != 0:
+                direction = 1 if offset > 0 else -1
+            else:
+                direction = -1 if self.velocity > 0 else 1
+            distance = abs(offset)
+
+            # Velocity in the direction of the target
+            velocity = self.velocity * direction
+
+            if self.acceleration <= 0 or math.isinf(self.acceleration):
+                # No acceleration limit, jump straight to the set speed
+                if self.speed <= 0:
+                    self.velocity = 0.0
+                    break
+                phaseTime = min(seconds, distance / self.speed)
+                seconds -= phaseTime
+                if phaseTime * self.speed >= distance:
+                    self.stopOnTarget()
+                    break
+                self.position += direction * self.speed * phaseTime
+                self.velocity = direction * self.speed
+                continue
+
+            acceleration = self.acceleration
+            stoppingDistance = velocity * velocity / (2 * acceleration) if velocity > 0 else 0
+
+            if velocity < 0:
+                # Moving away from the target, slow down to a stop first
+                phaseTime = min(seconds, -velocity / acceleration)
+                newVelocity = velocity + acceleration * phaseTime
+
+            elif stoppingDistance >= distance - 1e-6:
+                # We need to be slowing down now to stop on the target
+                if distance <= 1e-6 or velocity == 0:
+                    self.stopOnTarget()
+                    break
+                deceleration = velocity * velocity / (2 * distance)
+                stoppingTime = velocity / deceleration
+                if seconds >= stoppingTime:
+                    self.stopOnTarget()
+                    break
+                phaseTime = seconds
+                newVelocity = velocity - deceleration * phaseTime
+
+            elif velocity < self.speed - 1e-9:
+                # Speed up until we get to our speed or until we need to start slowing down
+                peakVelocity = min(self.speed, math.sqrt(acceleration * distance + velocity * velocity / 2))
+                phaseTime = min(seconds, (peakVelocity - velocity) / acceleration)
+                newVelocity = velocity + acceleration * phaseTime
+
+            elif velocity > self.speed + 1e-9:
+                # The speed got turned down, slow down to it
+                phaseTime = min(seconds, (velocity - self.speed) / acceleration)
+                newVelocity = velocity - acceleration * phaseTime
+
+            elif velocity <= 0:
+                # The speed is set to 0 and we are stopped
+                break
+
+            else:
+                # Cruise until we have to start slowing down
+                phaseTime = min(seconds, (distance - stoppingDistance) / velocity)
+                newVelocity = velocity
+
+            self.position += direction * (velocity + newVelocity) / 2 * phaseTime
+            self.velocity = direction * newVelocity
+            seconds -= phaseTime
+
+    def stopOnTarget(self) -> None:
+        self.position = self.target
+        self.velocity = 0.0
+
+
+class SimulatedDPiStepper:
+
+    # Simulated stand in for dpeaDPi.DPiStepper
+    # Every call that would go over the RS-485 bus costs one bus transaction of simulated time.
+
+    NUMBER_OF_STEPPERS = 3
+
+    def __init__(self, world):
+        self.world = world
+        self.motors = [SimulatedStepperMotor() for _ in range(self.NUMBER_OF_STEPPERS)]
+        self.microstepping = 1
+        self.enabledFlg = False
+        self.lastUpdate = world.now
+
+    def update(self) -> None:
+        """Moves every motor along for however long it has been since the last update"""
+        seconds = self.world.now - self.lastUpdate
+        self.lastUpdate = self.world.now
+        if seconds > 0:
+            for motor in self.motors:
+                motor.advance(seconds)
+
+    def waitUntilStopped(self) -> None:
+        while not all(motor.isStopped() for motor in self.motors):
+            self.world.sleep(0.01)
+            self.update()
+
+    # ---------------------------------------------------------------------------------
+    #                               DPiStepper functions
+    # ---------------------------------------------------------------------------------
+
+    def setBoardNumber(self, boardNumber: int) -> None:
+        pass
+
+    def initialize(self) -> bool:
+        self.world.transaction()
+        return True
+
+    def setMicrostepping(self, microstepping: int) -> bool:
+        self.world.transaction()
+        self.microstepping = microstepping
+        return True
+
+    def enableMotors(self, enableFlg: bool) -> bool:
+        self.world.transaction()
+        self.enabledFlg = enableFlg
+        return True
+
+    def setSpeedInStepsPerSecond(self, stepperNum: int, speed: float) -> bool:
+        self.world.transaction()
+        self.update()
+        self.motors[stepperNum].speed = speed
+        return True
+
+    def setAccelerationInStepsPerSecondPerSecond(self, stepperNum: int, acceleration: float) -> bool:
+        self.world.transaction()
+        self.update()
+        self.motors[stepperNum].acceleration = acceleration
+        return True
+
+    def moveToRelativePositionInSteps(self, stepperNum: int, steps: int, waitToFinishFlg: bool) -> bool:
+        self.world.transaction()
+        self.update()
+        motor = self.motors[stepperNum]
+        motor.target = motor.position + steps
+        if waitToFinishFlg:
+            self.waitUntilStopped()
+        return True
+
+    def moveToAbsolutePositionInSteps(self, stepperNum: int, position: int, waitToFinishFlg: bool) -> bool:
+        self.world.transaction()
+        self.update()
+        self.motors[stepperNum].target = position
+        if waitToFinishFlg:
+            self.waitUntilStopped()
+        return True
+
+    def moveToHomeInSteps(self, stepperNum: int, directionTowardHome: int, speed: float, maxDistanceToMoveInSteps: int) -> bool:
+        # The home switch is at position 0 in the simulation
+        self.world.transaction()
+        self.update()
+        motor = self.motors[stepperNum]
+        motor.speed = speed
+        motor.target = 0
+        return True
+
+    def getAllMotorsStopped(self) -> bool:
+        self.world.transaction()
+        self.update()
+        return all(motor.isStopped() for motor in self.motors)
+
+    def getCurrentPositionInSteps(self, stepperNum: int) -> tuple:
+        self.world.transaction()
+        self.update()
+        return True, int(round(self.motors[stepperNum].position))
+
+    def setCurrentPositionInSteps(self, stepperNum: int, position: int) -> bool:
+        self.world.transaction()
+        self.update()
+        motor = self.motors[stepperNum]
+        motor.position = float(position)
+        motor.target = float(position)
+        motor.velocity = 0.0
+        return True
+
+    def emergencyStop(self, stepperNum: int) -> bool:
+        self.world.transaction()
+        self.update()
+        self.motors[stepperNum].stop()
+        return True
@@ -0,0 +1,198 @@
+import heapq
+import itertools
+import time as _time
+
+import numpy as np
+
+import Objects.constants as constants
+from Objects.clock import Clock
+from Simulation.simulatedDPiRobot import SimulatedDPiRobot
+from Simulation.simulatedDPiStepper import SimulatedDPiStepper
+from Simulation.simulatedDPiSolenoid import SimulatedDPiSolenoid
+from Simulation.simulatedDPiClockNBlock import SimulatedFeeder, SimulatedDPiClockNBlock
+
+
+class SimulatedWorld:
+
+    # Everything the simulated boards share: the simulated time, the block feeders and the blocks the robot moves.
+    #
+    # Time only moves forward when something sleeps or talks to a board. Every bus transaction costs
+    # transactionTime seconds, so a loop that never sleeps still moves time along like it would on the real bus.
+    # Things that need to happen later (a piston finishing a push, a person refilling a feeder) are scheduled
+    # with schedule() and run as time passes them.
+    #
+    # Like on the real clock, the minute hand knocks over the blocks it sweeps past. They roll into the next
+    # feeder the hand comes to, so the same blocks keep going around.
+    #
+    # Use it with Objects.hardware:
+    #     world = SimulatedWorld()
+    #     hardware.useSimulation(world)
+    # then create the objects as usual.
+
+    # How often (s) the minute hand knocks over blocks, and how close (degrees) it has to be to a block
+    SWEEP_PERIOD = 1
+    SWEEP_WIDTH = 1
+
+    def __init__(self, startTime: float = None, transactionTime: float = 0.001, blocksPerFeeder: int = 10,
+                 pickupTolerance: float = 10):
+        # Simulated seconds since the epoch, defaults to now
+        self.now = _time.time() if startTime is None else startTime
+        self.startTime = self.now
+        self.transactionTime = transactionTime
+
+        # Events are (time, order, callback), the order keeps events at the same time first in first out
+        self.events = []
+        self.eventOrder = itertools.count()
+
+        # The robot speeds up and slows down like the real one is set up to
+        self.robot = SimulatedDPiRobot(self, acceleration=constants.robotAcceleration,
+                                       junctionDeviation=constants.robotJunctionDeviation)
+        self.stepper = SimulatedDPiStepper(self)
+        self.solenoid = SimulatedDPiSolenoid(self)
+
+        self.feeders = [SimulatedFeeder(self, index, sidePiston, upPiston, blocksPerFeeder)
+                        for index, (sidePiston, upPiston) in enumerate(constants.blockFeederSolenoids)]
+        self.feederLocations = constants.polarToCartesianArray(constants.blockFeederLocations)
+        self.feederAngles = np.array([location[1] for location in constants.blockFeederLocations])
+
+        # Blocks the robot has put down, in cartesian coordinates. It can pick them back up.
+        self.pickupTolerance = pickupTolerance
+        self.placedBlocks = []
+        self.carryingBlockFlg = False
+
+        # Stats
+        self.transactionCount = 0
+        self.blocksPickedUp = 0
+        self.blocksPlaced = 0
+        self.missedPickups = 0
+        self.blocksSwept = 0
+
+        # Where the minute hand was at the last sweep, so blocks it passed in between get knocked over too
+        self.lastHandAngle = None
+        self.schedule(self.SWEEP_PERIOD, self.sweepBlocks)
+
+    # ---------------------------------------------------------------------------------
+    #                                      Time
+    # ---------------------------------------------------------------------------------
+
+    def advance(self, seconds: float) -> None:
+        """Moves the simulated time forward, running any events on the way"""
+        endTime = self.now + seconds
+        while self.events and self.events[0][0] <= endTime:
+            eventTime, _order, callback = heapq.heappop(self.events)
+            self.now = max(self.now, eventTime)
+            callback()
+        self.now = endTime
+
+    def sleep(self, seconds: float) -> None:
+        self.advance(max(seconds, 0))
+
+    def transaction(self) -> None:
+        """One command over the RS-485 bus"""
+        self.transactionCount += 1
+        self.advance(self.transactionTime)
+
+    def time(self) -> float:
+        return self.now
+
+    def localtime(self) -> _time.struct_time:
+        return _time.localtime(self.now)
+
+    def elapsed(self) -> float:
+        """Simulated seconds since the world was created"""
+        return self.now - self.startTime
+
+    def schedule(self, delay: float, callback) -> None:
+        """Runs callback() once delay simulated seconds have passed"""
+        heapq.heappush(self.events, (self.now + delay, next(self.eventOrder), callback))
+
+    # ---------------------------------------------------------------------------------
+    #                                     Boards
+    # ---------------------------------------------------------------------------------
+
+    def createClockNBlock(self) -> SimulatedDPiClockNBlock:
+        return SimulatedDPiClockNBlock(self)
+
+    def solenoidSwitched(self, driverNumber: int, onFlg: bool) -> None:
+        """Called by the solenoid board whenever a driver gets switched"""
+        if driverNumber == constants.magnetSolenoid:
+            if onFlg:
+                self.pickUpBlock()
+            else:
+                self.dropBlock()
+            return
+
+        for feeder in self.feeders:
+            feeder.pistonSwitched(driverNumber, onFlg)
+
+    # ---------------------------------------------------------------------------------
+    #                                     Blocks
+    # ---------------------------------------------------------------------------------
+
+    def pickUpBlock(self) -> None:
+        """The magnet turned on, grab the block under the robot if there is one"""
+        if self.carryingBlockFlg:
+            return
+
+        self.robot.update()
+        position = self.robot.position
+
+        distances = np.linalg.norm(self.feederLocations - position, axis=1)
+        closestFeeder = int(np.argmin(distances))
+        if distances[closestFeeder] < self.pickupTolerance and self.feeders[closestFeeder].takeBlock():
+            self.carryingBlockFlg = True
+            self.blocksPickedUp += 1
+            return
+
+        for index, blockPosition in enumerate(self.placedBlocks):
+            if np.linalg.norm(blockPosition - position) < self.pickupTolerance:
+                self.placedBlocks.pop(index)
+                self.carryingBlockFlg = True
+                self.blocksPickedUp += 1
+                return
+
+        self.missedPickups += 1
+
+    def dropBlock(self) -> None:
+        """The magnet turned off, put down the block we are carrying"""
+        if not self.carryingBlockFlg:
+            return
+
+        self.robot.update()
+        self.placedBlocks.append(self.robot.position.copy())
+        self.carryingBlockFlg = False
+        self.blocksPlaced += 1
+
+    def minuteHandDegrees(self) -> float:
+        """Where the minute hand is, the same way Clock.getPositionDegrees works it out"""
+        self.stepper.update()
+        position = self.stepper.motors[Clock.MINUTE_HAND_PIN].position % Clock.MINUTE_HAND_STEPS_PER_REVOLUTION
+        return 360 - position / Clock.MINUTE_HAND_STEPS_PER_REVOLUTION * 360
+
+    def sweepBlocks(self) -> None:
+        """Knocks over the blocks the minute hand passed since the last sweep, they end up in the next feeder it comes to"""
+        self.schedule(self.SWEEP_PERIOD, self.sweepBlocks)
+        handAngle = self.minuteHandDegrees()
+        lastHandAngle = handAngle if self.lastHandAngle is None else self.lastHandAngle
+        self.lastHandAngle = handAngle
+        if not self.placedBlocks:
+            return
+
+        # The hand's angle goes down as it moves forwards. When it moved fast, like the clock fast forwarding,
+        # it went over more than the width of the sweep. If it went backwards only where it is now counts
+        sweptAngle = (lastHandAngle - handAngle) % 360
+        if sweptAngle > 180:
+            lastHandAngle, sweptAngle = handAngle, 0
+
+        standingBlocks = []
+        for blockPosition in self.placedBlocks:
+            blockAngle = constants.cartesianToPolar(blockPosition)[1]
+            if (lastHandAngle + self.SWEEP_WIDTH - blockAngle) % 360 > sweptAngle + 2 * self.SWEEP_WIDTH:
+                standingBlocks.append(blockPosition)
+                continue
+
+            # The hand's angle goes down, so the next feeder is the first one with a smaller angle
+            feeder = self.feeders[int(np.argmin((blockAngle - self.feederAngles) % 360))]
+            feeder.addBlocks()
+            self.blocksSwept += 1
+        self.placedBlocks = standingBlocks
@@ -0,0 +1,30 @@
+"""Fixtures for the tests, everything runs against the simulated hardware in Simulation/"""
+import numpy as np
+import pytest
+
+import Objects.constants as constants
+import Objects.hardware as hardware
+from Objects.buildSite import BuildSite
+from Simulation.simulatedWorld import SimulatedWorld
+
+# Midnight, January 1st 2024 UTC, the same start time the throughput benchmark uses
+START_TIME = 1704067200
+
+
+@pytest.fixture
+def world():
+    """A simulated world that every board created during the test runs in"""
+    np.random.seed(0)
+    simulatedWorld = SimulatedWorld(startTime=START_TIME)
+    hardware.useSimulation(simulatedWorld)
+    yield simulatedWorld
+    hardware.useHardware()
+
+
+@pytest.fixture
+def buildSites():
+    """The real build sites, set up and ready with the minute hand out of the way"""
+    sites = [BuildSite(index, location[0], location[1]) for index, location in enumerate(constants.buildLocations)]
+    for buildSite in sites:
+        buildSite.setup()
+    return sites
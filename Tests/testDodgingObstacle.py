@@ -71,13 +71,7 @@ def main():
     robot.movePolar((rMovement, initialTheta, zHeight))
 
     # Update the buildSite intersection rectangle to reflect the tower we are building
-    buildSite.intersectionRectangle[2] = (buildSite.intersectionRectangle[2][0],
-                                          buildSite.intersectionRectangle[2][1],
-                                          buildSite.intersectionRectangle[2][2] + constants.blockSize * 5)
-
-    buildSite.intersectionRectangle[3] = (buildSite.intersectionRectangle[3][0],
-                                          buildSite.intersectionRectangle[3][1],
-                                          buildSite.intersectionRectangle[3][2] + constants.blockSize * 5)
+    buildSite.setIntersectionHeight(buildSite.intersectionRectangle[2][2] + constants.blockSize * 5)
 
 
     # Check the intersection
@@ -28,8 +28,8 @@ def main():
     finalPoint = (500, 30, -1350)
 
     # Run this with debugger, adding print statements as necessary
-    waypoints, _ = robotManager.planZigZagMove(initialPoint, finalPoint)
-    # waypoints, _ = robotManager.planStraightMove(initialPoint, finalPoint)
+    waypoints = robotManager.planZigZagMove(initialPoint, finalPoint)
+    # waypoints = robotManager.planStraightMove(initialPoint, finalPoint)
     print(f'Waypoints before straightening: {waypoints}')
     print(f'Length: {len(waypoints)}')
     waypoints = robotManager.ensureStraightLineCartesian(waypoints)
@@ -0,0 +1,103 @@
+import threading
+
+import numpy as np
+import pytest
+
+import Objects.constants as constants
+from Objects.backgroundPlanner import BackgroundPlanner
+from Objects.robotManager import RobotManager
+
+CLOCK_POS = 300
+START_POS = constants.blockFeederLocations[1]
+
+
+@pytest.fixture
+def robotManager(buildSites):
+    np.random.seed(0)
+    for buildSite in buildSites:
+        buildSite.updateReadyFlg(CLOCK_POS)
+    return RobotManager(buildSites, [])
+
+
+@pytest.fixture(params=[True, False], ids=['threaded', 'unthreaded'])
+def planner(request, robotManager):
+    return BackgroundPlanner(robotManager, threadedFlg=request.param)
+
+
+def test_takeUsesTheSpeculatedPlan(planner, robotManager):
+    planner.speculate(planner.MOVE_TO_BUILD_SITE, START_POS, CLOCK_POS)
+    buildSite = planner.speculation[2].buildSite
+
+    waypoints = planner.take(planner.MOVE_TO_BUILD_SITE, START_POS)
+
+    assert waypoints is not None
+    assert planner.hits == 1
+    # The placement spot got taken
+    assert buildSite.currentBlock == 1
+
+
+def test_planIsThrownAwayWhenAnObstacleMoves(planner, buildSites):
+    planner.speculate(planner.MOVE_TO_BUILD_SITE, START_POS, CLOCK_POS)
+    buildSites[0].setIntersectionHeight(buildSites[0].intersectionRectangle[2][2] + 30)
+
+    assert planner.take(planner.MOVE_TO_BUILD_SITE, START_POS) is None
+    assert planner.misses == 1
+
+
+def test_planIsThrownAwayFromSomewhereElse(planner):
+    planner.speculate(planner.MOVE_TO_BUILD_SITE, START_POS, CLOCK_POS)
+
+    assert planner.take(planner.MOVE_TO_BUILD_SITE, constants.blockFeederLocations[2]) is None
+
+
+def test_planIsThrownAwayWhenTheHandCatchesUp(planner):
+    planner.speculate(planner.MOVE_TO_BUILD_SITE, START_POS, CLOCK_POS, delay=5)
+    target = planner.speculation[2]
+
+    # The robot got there late, and the minute hand is almost at the build site now
+    assert planner.take(planner.MOVE_TO_BUILD_SITE, START_POS, target.location[1] + 5) is None
+    assert planner.misses == 1
+    assert target.buildSite.currentBlock == 0
+
+
+def test_snapshotKeepsTheBuildSitesAsTheyWere(robotManager, buildSites):
+    snapshot = robotManager.snapshot()
+    rectangle = buildSites[1].intersectionRectangle
+
+    buildSites[1].setIntersectionHeight(rectangle[2][2] + 30)
+    buildSites[1].placeNextBlock()
+
+    assert snapshot.buildSites[1].intersectionRectangle == rectangle
+    assert snapshot.buildSites[1].currentBlock == 0
+    assert snapshot.getObstacleVersions() != robotManager.getObstacleVersions()
+    assert snapshot.planCache is robotManager.planCache
+
+
+def test_mainThreadKeepsGoingWhileThePlannerWorks(robotManager, buildSites):
+    planner = BackgroundPlanner(robotManager)
+    planning = threading.Event()
+    finish = threading.Event()
+
+    # Hold the worker in the middle of planning
+    snapshot = robotManager.snapshot
+    def slowSnapshot():
+        robotManagerSnapshot = snapshot()
+        planMove = robotManagerSnapshot.planMove
+        def slowPlanMove(*args, **kwargs):
+            planning.set()
+            assert finish.wait(5)
+            return planMove(*args, **kwargs)
+        robotManagerSnapshot.planMove = slowPlanMove
+        return robotManagerSnapshot
+    robotManager.snapshot = slowSnapshot
+
+    planner.speculate(planner.MOVE_TO_BUILD_SITE, START_POS, CLOCK_POS)
+    assert planning.wait(5)
+
+    # The build sites and choosing targets don't wait for the plan
+    for buildSite in buildSites:
+        buildSite.process(CLOCK_POS)
+    assert robotManager.chooseBuildSiteTarget(CLOCK_POS) is not None
+
+    finish.set()
+    assert planner.take(planner.MOVE_TO_BUILD_SITE, START_POS) is not None
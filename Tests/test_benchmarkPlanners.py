@@ -0,0 +1,96 @@
+"""Micro benchmarks for the planner and geometry hot paths
+
+Times each function on realistic inputs (the real feeder, build site and placement locations from constants).
+Random planners are reseeded before every benchmark so runs are comparable. Save a run and compare a later one
+against it with pytest-benchmark:
+
+    python -m pytest Tests/test_benchmarkPlanners.py --benchmark-autosave
+    python -m pytest Tests/test_benchmarkPlanners.py --benchmark-compare
+
+Nothing here needs the DPi boards.
+"""
+import numpy as np
+import pytest
+
+import Objects.constants as constants
+from Objects.robotManager import RobotManager
+
+# The benchmark fixture comes from pytest-benchmark
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.fixture
+def robotManager(buildSites):
+    for buildSite in buildSites:
+        buildSite.updateReadyFlg(0)
+    return RobotManager(buildSites, [])
+
+
+# A typical leg: from a feeder to the first placement on a build site, and back
+@pytest.fixture
+def feederLocation():
+    return constants.blockFeederLocations[0]
+
+
+@pytest.fixture
+def placement(buildSites):
+    return buildSites[1].blockPlacements[0]
+
+
+@pytest.fixture(autouse=True)
+def seed():
+    np.random.seed(0)
+
+
+def test_polarToCartesian(benchmark, placement):
+    benchmark(constants.polarToCartesian, placement)
+
+
+def test_cartesianToPolar(benchmark, placement):
+    benchmark(constants.cartesianToPolar, constants.polarToCartesian(placement))
+
+
+def test_checkIntersection(benchmark, robotManager, buildSites, feederLocation, placement):
+    benchmark(robotManager.checkIntersection, feederLocation, placement, buildSites[1].intersectionRectangle)
+
+
+def test_checkIntersections(benchmark, robotManager, feederLocation, placement):
+    # The unsmoothed circle, what the planners check against the build sites
+    points = robotManager.planCircle(feederLocation, placement).cartesian
+    benchmark(robotManager.checkIntersections, points[:-1], points[1:], robotManager.getBuildSiteObstacles())
+
+
+def test_planStraightMove(benchmark, robotManager, feederLocation, placement):
+    benchmark(robotManager.planStraightMove, feederLocation, placement)
+
+
+def test_planPolarMove(benchmark, robotManager, feederLocation, placement):
+    benchmark(robotManager.planPolarMove, feederLocation, placement)
+
+
+def test_planZigZagMove(benchmark, robotManager, feederLocation, placement):
+    benchmark(robotManager.planZigZagMove, placement, feederLocation)
+
+
+def test_planCircle(benchmark, robotManager, feederLocation, placement):
+    benchmark(robotManager.planCircle, feederLocation, placement)
+
+
+def test_ensureStraightLineCartesianStraight(benchmark, robotManager, feederLocation, placement):
+    benchmark(robotManager.ensureStraightLineCartesian, robotManager.planStraightMove(feederLocation, placement))
+
+
+def test_ensureStraightLineCartesianCircle(benchmark, robotManager, feederLocation, placement):
+    benchmark(robotManager.ensureStraightLineCartesian, robotManager.planCircle(feederLocation, placement))
+
+
+def test_ensureStraightLinePolar(benchmark, robotManager, feederLocation, placement):
+    benchmark(robotManager.ensureStraightLinePolar, robotManager.planPolarMove(feederLocation, placement))
+
+
+def test_generatePlacementList(benchmark, buildSites):
+    benchmark(buildSites[1].generatePlacementList, constants.placementArrays[1], buildSites[1].location0)
+
+
+def test_chooseBuildSite(benchmark, robotManager):
+    benchmark(robotManager.chooseBuildSite, 0)
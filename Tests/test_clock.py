@@ -0,0 +1,171 @@
+import time
+
+import pytest
+
+import Objects.constants as constants
+import Objects.hardware as hardware
+from Objects.clock import Clock, HandStateEstimator, HandTracker
+from Simulation.runSimulation import runSimulation
+from Simulation.simulatedWorld import SimulatedWorld
+from conftest import START_TIME
+
+
+# ---------------------------------------------------------------------------------
+#                                  Estimator
+# ---------------------------------------------------------------------------------
+
+def test_estimatorFollowsTheSpeed(world):
+    estimator = HandStateEstimator(resyncPeriod=10)
+    estimator.speedChanged(100)
+    estimator.measured(1000, hardware.time())
+
+    assert estimator.estimate(hardware.time() + 2) == pytest.approx(1200)
+
+
+def test_estimatorCarriesOnAfterASpeedChange(world):
+    estimator = HandStateEstimator(resyncPeriod=10)
+    estimator.speedChanged(100)
+    estimator.measured(1000, hardware.time())
+
+    world.advance(2)
+    estimator.speedChanged(50)
+    assert estimator.estimate(hardware.time() + 2) == pytest.approx(1300)
+
+
+def test_estimatorNeedsAReading(world):
+    estimator = HandStateEstimator(resyncPeriod=10)
+    assert estimator.estimate(hardware.time()) is None
+
+    estimator.speedChanged(100)
+    estimator.measured(1000, hardware.time())
+    # Too long since it was read
+    assert estimator.estimate(hardware.time() + 11) is None
+
+    # We don't know how the hand moves
+    estimator.speedChanged(None)
+    assert estimator.estimate(hardware.time()) is None
+
+
+# ---------------------------------------------------------------------------------
+#                                   Tracker
+# ---------------------------------------------------------------------------------
+
+@pytest.fixture
+def stepper(world):
+    world.stepper.setAccelerationInStepsPerSecondPerSecond(Clock.MINUTE_HAND_PIN, Clock.MINUTE_HAND_ACCELERATION)
+    return world.stepper
+
+
+@pytest.fixture
+def tracker(stepper):
+    return HandTracker(stepper, Clock.MINUTE_HAND_PIN, Clock.MINUTE_HAND_STEPS_PER_REVOLUTION,
+                       Clock.MINUTE_HAND_BASE_SPEED, Clock.MINUTE_HAND_MAX_SPEED)
+
+
+def runTracker(world, tracker, stepper, desiredStart: float, duration: float, rate: float = 1) -> float:
+    """Processes the tracker twice a second with the desired position moving at rate, returns the last error"""
+    start = world.now
+    error = None
+    while world.now - start < duration:
+        desired = (desiredStart + rate * tracker.baseSpeed * (world.now - start)) % tracker.stepsPerRevolution
+        _successFlg, position = stepper.getCurrentPositionInSteps(tracker.pin)
+        tracker.process(position, desired, rate)
+        error = (desired - position + tracker.stepsPerRevolution / 2) % tracker.stepsPerRevolution - tracker.stepsPerRevolution / 2
+        world.advance(0.5)
+    return error
+
+
+def test_trackerKeepsTheHandOnTime(world, tracker, stepper):
+    error = runTracker(world, tracker, stepper, 0, 600)
+
+    assert abs(error) < tracker.baseSpeed
+    assert tracker.corrections == 0
+    # It runs on its own at its speed instead of being sent moves all the time
+    assert tracker.commandsSent < 20
+
+
+def test_trackerTrimsOutDrift(world, tracker, stepper):
+    # Start a couple of seconds behind, not far enough for a correction move
+    error = runTracker(world, tracker, stepper, 2 * tracker.baseSpeed, 300)
+
+    assert tracker.corrections == 0
+    assert abs(error) < 0.5 * tracker.baseSpeed
+
+
+def test_trackerCorrectsBigErrors(world, tracker, stepper):
+    error = runTracker(world, tracker, stepper, 60 * tracker.baseSpeed, 120)
+
+    assert tracker.corrections == 1
+    assert abs(error) < tracker.baseSpeed
+
+
+def test_trackerGoesTheShortWayAround(world, tracker, stepper):
+    # 11:59:59 to 12:00, the hand is a second behind, not most of a revolution ahead
+    stepper.setCurrentPositionInSteps(tracker.pin, tracker.stepsPerRevolution - tracker.baseSpeed)
+    runTracker(world, tracker, stepper, 0, 60)
+
+    assert tracker.corrections == 0
+
+
+def test_trackerFollowsTheRate(world, tracker, stepper):
+    error = runTracker(world, tracker, stepper, 0, 300, rate=0.5)
+
+    assert tracker.corrections == 0
+    assert abs(error) < tracker.baseSpeed
+    assert tracker.estimator.speed == pytest.approx(0.5 * tracker.baseSpeed, rel=tracker.MAX_TRIM)
+
+
+# ---------------------------------------------------------------------------------
+#                                    Clock
+# ---------------------------------------------------------------------------------
+
+def test_processUsesOneReadingOfTheTime(world, monkeypatch):
+    clock = Clock()
+    # Just before a minute goes over
+    world.advance(60 - world.now % 60 - 0.0005)
+    now = world.now
+    t = time.localtime(now)
+    expected = t.tm_hour * 3600 + t.tm_min * 60 + t.tm_sec + now % 1
+
+    # The time moves on between reading it and using it, like when the bus is busy
+    updateTimeOffset = clock.updateTimeOffset
+    monkeypatch.setattr(clock, 'updateTimeOffset', lambda now: world.advance(0.001) or updateTimeOffset(now))
+    times = []
+    convertTimeToSteps = clock.convertTimeToSteps
+    monkeypatch.setattr(clock, 'convertTimeToSteps',
+                        lambda hour, minute, second: times.append((hour, minute, second)) or convertTimeToSteps(hour, minute, second))
+
+    clock.process()
+
+    hour, minute, second = times[0]
+    assert hour * 3600 + minute * 60 + second == pytest.approx(expected)
+
+
+# ---------------------------------------------------------------------------------
+#                                 Fast forward
+# ---------------------------------------------------------------------------------
+
+def test_fastForwardsWhileTheFeedersAreEmpty(monkeypatch):
+    # Two steps ahead at most, so catching up again doesn't take long
+    monkeypatch.setattr(constants, 'clockMaxDrift', 2 * Clock.FAST_FORWARD_STEP)
+    world = SimulatedWorld(startTime=START_TIME, blocksPerFeeder=0)
+    # Somebody fills the feeders up after a couple of minutes
+    world.schedule(120, lambda: [feeder.addBlocks(10) for feeder in world.feeders])
+    objects = {}
+
+    runSimulation(500, 0, world, lambda main: objects.update(clock=main.clock))
+
+    clock = objects['clock']
+    assert clock.fastForwardSteps > 0
+    assert clock.timeOffset == 0
+
+    # The hands show the time again
+    now = world.now
+    t = time.localtime(now)
+    hourToSteps, minuteToSteps = clock.convertTimeToSteps(t.tm_hour, t.tm_min, t.tm_sec + now % 1)
+    hourPosition, minutePosition = clock.getPositionsInSteps()
+    for toSteps, position, stepsPerRevolution, baseSpeed in (
+            (hourToSteps, hourPosition, Clock.HOUR_HAND_STEPS_PER_REVOLUTION, Clock.HOUR_HAND_BASE_SPEED),
+            (minuteToSteps, minutePosition, Clock.MINUTE_HAND_STEPS_PER_REVOLUTION, Clock.MINUTE_HAND_BASE_SPEED)):
+        error = (toSteps - position + stepsPerRevolution / 2) % stepsPerRevolution - stepsPerRevolution / 2
+        assert abs(error) < 2 * baseSpeed
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import Objects.constants as constants
+from Objects.path import Path
+
+
+def test_appendAndExtendGrowTheBuffer():
+    path = Path(capacity=1)
+    path.append((300, 10, -1400))
+    path.extend([(310, 20, -1400), (320, 30, -1400), (330, 40, -1400)])
+
+    assert len(path) == 4
+    np.testing.assert_array_equal(path.polar[:, 0], [300, 310, 320, 330])
+
+
+def test_insertMovesMarkersWithTheirPoints():
+    path = Path([(300, 0, -1400), (300, 10, -1400), (300, 20, -1400)])
+    path.setMarker('start', 0)
+    path.setMarker(Path.CHECK_COLLISIONS_UNTIL, 1)
+
+    path.insert(1, [(300, 5, -1400), (300, 7, -1400)])
+
+    assert path.getMarker('start') == 0
+    assert path.getMarker(Path.CHECK_COLLISIONS_UNTIL) == 3
+    np.testing.assert_array_equal(path[3], (300, 10, -1400))
+
+
+def test_extendCarriesMarkersOver():
+    first = Path([(300, 0, -1400), (300, 10, -1400)])
+    second = Path([(300, 20, -1400), (300, 30, -1400)])
+    second.setMarker(Path.CHECK_COLLISIONS_UNTIL, 1)
+
+    first.extend(second)
+
+    assert first.getMarker(Path.CHECK_COLLISIONS_UNTIL) == 3
+
+
+def test_cartesianIsCachedUntilThePathChanges():
+    path = Path([(300, 90, -1400)])
+    cartesian = path.cartesian
+    np.testing.assert_allclose(cartesian[0], constants.polarToCartesian((300, 90, -1400)), atol=1e-9)
+    assert path.cartesian is cartesian
+
+    path.append((300, 180, -1400))
+    assert path.cartesian is not cartesian
+    assert len(path.cartesian) == 2
+
+
+def test_changingThePointsDropsTheSpeeds():
+    path = Path([(300, 0, -1400), (300, 10, -1400)])
+    path.setSpeeds([100, 60])
+    np.testing.assert_array_equal(path.speeds, [100, 60])
+
+    path[1] = (300, 15, -1400)
+    assert path.speeds is None
+
+    with pytest.raises(ValueError):
+        path.setSpeeds([100])
+
+
+def test_copyIsIndependent():
+    path = Path([(300, 0, -1400)])
+    path.setMarker('start')
+    copy = path.copy()
+
+    copy.append((300, 10, -1400))
+    copy.setMarker('start', 1)
+
+    assert len(path) == 1
+    assert path.getMarker('start') == 0
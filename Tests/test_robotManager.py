@@ -0,0 +1,256 @@
+import numpy as np
+import pytest
+
+import Objects.constants as constants
+from Objects.path import Path
+from Objects.robotManager import ClockHand, RobotManager
+from Objects.waypointStreamer import WaypointStreamer
+
+
+@pytest.fixture
+def robotManager(buildSites):
+    return RobotManager(buildSites, [])
+
+
+# ---------------------------------------------------------------------------------
+#                                 Collisions
+# ---------------------------------------------------------------------------------
+
+def test_checkIntersectionsMatchesCheckIntersection(robotManager, buildSites):
+    np.random.seed(0)
+    starts = np.column_stack((np.random.uniform(200, 550, 200), np.random.uniform(0, 360, 200),
+                              np.random.uniform(-1460, -1380, 200)))
+    ends = np.column_stack((np.random.uniform(200, 550, 200), np.random.uniform(0, 360, 200),
+                            np.random.uniform(-1460, -1380, 200)))
+    obstacles = robotManager.getBuildSiteObstacles()
+
+    hits, clearances = robotManager.checkIntersections(constants.polarToCartesianArray(starts),
+                                                       constants.polarToCartesianArray(ends), obstacles)
+
+    assert hits.shape == (len(starts), len(buildSites))
+    assert hits.any()
+    for segment, (start, end) in enumerate(zip(starts, ends)):
+        for row, buildSite in enumerate(buildSites):
+            hitFlg, clearance = robotManager.checkIntersection(start, end, buildSite.intersectionRectangle)
+            assert hitFlg == hits[segment, row]
+            if hitFlg:
+                assert clearance == clearances[row]
+
+
+def test_moveOverABuildSiteGoesAboveIt(robotManager, buildSites):
+    buildSite = buildSites[1]
+    start = (buildSite.location0[0] + 50, buildSite.location0[1] - 20, -1440)
+    end = (buildSite.location0[0] + 50, buildSite.location0[1] + 20, -1440)
+
+    hitFlg, clearance = robotManager.checkIntersection(start, end, buildSite.intersectionRectangle)
+    assert hitFlg
+    assert clearance > buildSite.intersectionRectangle[2][2]
+
+    hitFlg, _clearance = robotManager.checkIntersection((start[0], start[1], clearance), (end[0], end[1], clearance),
+                                                        buildSite.intersectionRectangle)
+    assert not hitFlg
+
+
+def test_obstaclesFollowTheBuildSites(robotManager, buildSites):
+    obstacles = robotManager.getBuildSiteObstacles()
+    clearance = obstacles[-1][2]
+
+    buildSites[2].setIntersectionHeight(buildSites[2].intersectionRectangle[2][2] + 60)
+
+    assert robotManager.getBuildSiteObstacles()[-1][2] == pytest.approx(clearance + 60)
+
+
+# ---------------------------------------------------------------------------------
+#                                 Clock hands
+# ---------------------------------------------------------------------------------
+
+def test_handWindowFollowsTheMeasuredSpeed():
+    position = (400, 50, -1440)
+    clearance = constants.handClearance(position[0])
+
+    start, end = ClockHand.minuteHand(100).window(position)
+    assert start == pytest.approx((50 - clearance) / constants.minuteHandSpeed)
+    assert end == pytest.approx((50 + clearance) / constants.minuteHandSpeed)
+
+    # Fast forwarding gets there sooner
+    start, _end = ClockHand.minuteHand(100, 4 * constants.minuteHandSpeed).window(position)
+    assert start == pytest.approx((50 - clearance) / (4 * constants.minuteHandSpeed))
+
+    # The hour hand doesn't reach out that far
+    assert ClockHand.hourHand(50).window(position) == (np.inf, np.inf)
+
+
+def test_handSweepsAMoveOnlyWhileItIsThere():
+    hand = ClockHand.minuteHand(100, 0.1)
+    startPoint = constants.polarToCartesianArray(np.array([[400, 80, -1430]]))
+    endPoint = constants.polarToCartesianArray(np.array([[400, 81, -1430]]))
+
+    # The hand is 20 degrees away to start with, and over the move 200 seconds later
+    assert not hand.sweeps(startPoint, endPoint, [0], [1]).any()
+    assert hand.sweeps(startPoint, endPoint, [200], [201]).all()
+    # Going over the hand there is fine
+    startPoint[:, 2] = endPoint[:, 2] = constants.clockMinuteHandZHeight + constants.robotMovingPadding
+    assert not hand.sweeps(startPoint, endPoint, [200], [201]).any()
+
+
+def test_hourHandIsInTheWayCloseToTheCenter():
+    hand = ClockHand.hourHand(90, 0)
+    # Across the middle of the clock, and across the hour hand further out than it reaches
+    startPoint = constants.polarToCartesianArray(np.array([[150, 0, -1430], [400, 85, -1430]]))
+    endPoint = constants.polarToCartesianArray(np.array([[150, 180, -1430], [400, 95, -1430]]))
+
+    np.testing.assert_array_equal(hand.sweeps(startPoint, endPoint, [0, 0], [1, 1]), [True, False])
+
+
+def test_moveAboveHandsRaisesTheTravelHeight(robotManager):
+    # Up from a build site to the travel height, and over to the next one past the hand
+    robotPos = (300, 80, -1440)
+    path = Path([(300, 80, -1420), (300, 60, -1420), (300, 40, -1420)])
+    path.setMarker(Path.CHECK_COLLISIONS_UNTIL, 2)
+    robotManager.planSpeeds(path, robotPos)
+    hands = (ClockHand.minuteHand(50, 0),)
+    assert robotManager.getHandHits(path, robotPos, hands).any()
+
+    robotManager.moveAboveHands(path, robotPos, hands)
+
+    assert path.polar[:, 2].min() >= constants.clockMinuteHandZHeight + robotManager.HAND_CLEARANCE_HEIGHT
+    assert path.speeds is not None
+    assert not robotManager.getHandHits(path, robotPos, hands).any()
+
+
+def test_planMoveKeepsClearOfTheHands(robotManager):
+    np.random.seed(0)
+    robotPos = constants.blockFeederLocations[0]
+    target = constants.buildLocations[0][0]
+    robotManager.updateHands(constants.minuteHandSpeed, 0, constants.hourHandSpeed)
+
+    paths = {}
+    for clockPos in range(0, 360, 10):
+        paths[clockPos] = robotManager.planMove(robotPos, target, robotManager.BUILD_SITE_MOVES, clockPos=clockPos)
+        if paths[clockPos] is not None:
+            assert not robotManager.getHandHits(paths[clockPos], robotPos, robotManager.getHands(clockPos)).any()
+
+    # The minute hand coming up on the build site holds us up, it doesn't stop us going there the rest of the time
+    assert paths[0] is None
+    assert sum(path is not None for path in paths.values()) > 30
+
+
+# ---------------------------------------------------------------------------------
+#                                  Planning
+# ---------------------------------------------------------------------------------
+
+def test_simplifyPathStaysWithinTolerance(robotManager):
+    # A finely split arc and a straight move out from it
+    start = (300, 0, -1400)
+    path = Path([start])
+    path.extend(robotManager.planArc(start, (300, 90, -1400), tolerance=0.01))
+    path.extend(robotManager.ensureStraightLineCartesian([(300, 90, -1400), (500, 90, -1400)])[1:])
+    simplified = robotManager.simplifyPath(path)
+
+    assert len(simplified) < len(path)
+    np.testing.assert_array_equal(simplified[-1], path[-1])
+
+    # Every original point is within the tolerance of the simplified moves
+    points = path.cartesian
+    simplifiedPoints = simplified.cartesian
+    starts, ends = simplifiedPoints[:-1], simplifiedPoints[1:]
+    directions = ends - starts
+    lengthsSquared = np.maximum((directions * directions).sum(axis=1), 1e-12)
+    for point in points:
+        fractions = np.clip(((point - starts) * directions).sum(axis=1) / lengthsSquared, 0, 1)
+        distances = np.linalg.norm(starts + fractions[:, np.newaxis] * directions - point, axis=1)
+        assert distances.min() <= robotManager.SIMPLIFY_TOLERANCE + 1e-6
+
+    assert np.linalg.norm(directions, axis=1).max() <= robotManager.MAX_SEGMENT_LENGTH + 1e-6
+
+
+def test_simplifyPathKeepsTheApproach(robotManager):
+    path = robotManager.ensureStraightLineCartesian(
+        robotManager.planStraightMove(constants.blockFeederLocations[0], constants.buildLocations[1][0]))
+    approachStart = path.getMarker(Path.CHECK_COLLISIONS_UNTIL)
+
+    simplified = robotManager.simplifyPath(path)
+
+    newStart = simplified.getMarker(Path.CHECK_COLLISIONS_UNTIL)
+    np.testing.assert_array_equal(simplified.polar[newStart:], path.polar[approachStart:])
+
+
+@pytest.mark.parametrize('start, end, direction, extraRotations, sweep', [
+    ((200, 10, -1400), (200, 80, -1400), None, 0, 70),
+    ((200, 10, -1400), (200, 300, -1400), None, 0, -70),
+    ((200, 10, -1400), (200, 80, -1400), -1, 0, -290),
+    ((200, 10, -1400), (200, 80, -1400), None, 1, 430),
+])
+def test_planArc(start, end, direction, extraRotations, sweep):
+    arc = RobotManager.planArc(start, end, direction, extraRotations)
+
+    np.testing.assert_array_equal(arc[-1], end)
+    thetas = np.concatenate(([start[1]], arc.polar[:-1, 1]))
+    steps = np.diff(np.concatenate((thetas, [start[1] + sweep])))
+    assert steps.sum() == pytest.approx(sweep)
+    assert np.all(np.sign(steps) == np.sign(sweep))
+
+    lengths = np.linalg.norm(np.diff(np.vstack((constants.polarToCartesian(start), arc.cartesian)), axis=0), axis=1)
+    assert lengths.max() <= RobotManager.MAX_SEGMENT_LENGTH + 1e-6
+
+
+def test_planSpeedsRespectsTheLimits(robotManager):
+    np.random.seed(0)
+    robotPos = constants.blockFeederLocations[0]
+    path = robotManager.planFunMove(robotPos, constants.buildLocations[1][0], (robotManager.MOVE_NOTHING,))
+
+    speeds = path.speeds
+    assert speeds is not None and len(speeds) == len(path)
+    assert speeds.min() >= constants.robotMinSpeed
+    assert speeds.max() <= constants.robotMaxSpeed
+    # The last moves onto the target are slow
+    assert speeds[-1] <= constants.robotApproachSpeed
+
+
+def test_estimateDurationMatchesTheSimulatedRobot(world, robotManager):
+    np.random.seed(0)
+    robot = world.robot
+    robot.homeRobot(True)
+    startPos = constants.cartesianToPolar(robot.position)
+    path = robotManager.planFunMove(startPos, constants.blockFeederLocations[1], (robotManager.MOVE_CIRCLE,))
+    estimate = robotManager.estimateDuration(path, startPos)
+
+    streamer = WaypointStreamer(robot)
+    start = world.now
+    assert streamer.start(path.cartesian, path.speeds)
+    assert streamer.finish()
+    robot.waitWhileRobotIsMoving()
+
+    assert world.now - start == pytest.approx(estimate, rel=0.02, abs=0.1)
+    np.testing.assert_allclose(robot.position, path.cartesian[-1], atol=1e-6)
+
+
+def test_estimateDurationOfATrapezoid():
+    # Long enough to get to full speed: speed up, cruise, slow down
+    path = Path([(0, 0, 0), (1000, 0, 0)])
+    speed = 100
+    expected = speed / constants.robotAcceleration + 1000 / speed
+    assert RobotManager.estimateDuration(path, speeds=speed) == pytest.approx(expected)
+
+
+def test_estimateMoveDurationsAddUpToEstimateDuration(robotManager):
+    np.random.seed(0)
+    robotPos = constants.blockFeederLocations[0]
+    path = robotManager.planFunMove(robotPos, constants.buildLocations[1][0], (robotManager.MOVE_CIRCLE,))
+
+    durations = robotManager.estimateMoveDurations(path, robotPos)
+    assert len(durations) == len(path)
+    assert durations.min() >= 0
+    assert durations.sum() == pytest.approx(robotManager.estimateDuration(path, robotPos))
+
+
+def test_moveToMinuteHandCountsPlacements(robotManager, monkeypatch):
+    robotPos = constants.blockFeederLocations[0]
+    assert robotManager.moveToMinuteHand(robotPos, 90, constants.minuteHandSpeed) is not None
+    assert robotManager.moveToMinuteHand(robotPos, 90, None) is None
+
+    # Tries that can't meet the hand aren't placements
+    monkeypatch.setattr(robotManager, 'planIntercept', lambda *args, **kwargs: (None, None))
+    assert robotManager.moveToMinuteHand(robotPos, 90, constants.minuteHandSpeed) is None
+
+    assert robotManager.minuteHandPlacements == 1
@@ -0,0 +1,55 @@
+import pytest
+
+from Objects.scheduler import Scheduler
+
+
+def test_tasksRunAtTheirRates(world):
+    runs = {'fast': 0, 'slow': 0}
+    scheduler = Scheduler()
+    scheduler.addTask('fast', lambda: runs.__setitem__('fast', runs['fast'] + 1), 10)
+    scheduler.addTask('slow', lambda: runs.__setitem__('slow', runs['slow'] + 1), 2)
+
+    while world.elapsed() < 10:
+        scheduler.runOnce()
+
+    assert runs['fast'] == pytest.approx(100, abs=1)
+    assert runs['slow'] == pytest.approx(20, abs=1)
+    assert scheduler.getStats()['fast']['missedDeadlines'] == 0
+
+
+def test_slowTaskMakesOthersMissDeadlines(world):
+    scheduler = Scheduler()
+    fast = scheduler.addTask('fast', lambda: None, 10)
+    scheduler.addTask('slow', lambda: world.advance(0.5), 1)
+
+    while world.elapsed() < 10:
+        scheduler.runOnce()
+
+    assert fast.missedDeadlines > 0
+    # It starts again from now instead of running all the runs it missed
+    assert fast.runs < 100
+
+
+def test_tasksRunInOrder(world):
+    order = []
+    scheduler = Scheduler()
+    scheduler.addTask('first', lambda: order.append('first'), 1)
+    scheduler.addTask('second', lambda: order.append('second'), 1)
+
+    scheduler.runOnce()
+
+    assert order == ['first', 'second']
+
+
+def test_resetMakesEveryTaskDue(world):
+    runs = []
+    scheduler = Scheduler()
+    scheduler.addTask('task', lambda: runs.append(world.now), 0.1)
+    scheduler.runOnce()
+    assert len(runs) == 1
+
+    world.advance(1)
+    scheduler.reset()
+    scheduler.runOnce()
+
+    assert len(runs) == 2
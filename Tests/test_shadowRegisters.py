@@ -0,0 +1,60 @@
+import Objects.hardware as hardware
+from Objects.shadowRegisters import ShadowRegisters
+
+
+def test_sameValueIsSkipped(world):
+    solenoid = hardware.createSolenoid()
+
+    solenoid.switchDriverOnOrOff(3, True)
+    solenoid.switchDriverOnOrOff(3, True)
+    solenoid.switchDriverOnOrOff(3, False)
+
+    assert world.solenoid.switchCount == 2
+    assert solenoid.shadow.skippedWrites == 1
+    assert not world.solenoid.drivers[3]
+
+
+def test_unchangedValueIsResent(world):
+    solenoid = hardware.createSolenoid()
+    solenoid.switchDriverOnOrOff(3, True)
+
+    world.advance(solenoid.shadow.resyncPeriod)
+    solenoid.switchDriverOnOrOff(3, True)
+
+    assert world.solenoid.switchCount == 2
+
+
+def test_initializeForgetsTheOutputs(world):
+    solenoid = hardware.createSolenoid()
+    solenoid.switchDriverOnOrOff(3, True)
+
+    solenoid.initialize()
+    solenoid.switchDriverOnOrOff(3, True)
+
+    assert world.solenoid.switchCount == 2
+
+
+def test_failedWriteIsSentAgain(world):
+    shadow = ShadowRegisters(resyncPeriod=None)
+    assert shadow.needsWrite('arrow', True)
+    shadow.written('arrow', True, successFlg=False)
+
+    assert shadow.needsWrite('arrow', True)
+    shadow.written('arrow', True, successFlg=True)
+    assert not shadow.needsWrite('arrow', True)
+
+
+def test_arrowAndBlinkResendEachOther(world):
+    clockNBlock = hardware.createClockNBlock()
+    clockNBlock.setBoardNumber(0)
+    feeder = world.feeders[0]
+
+    clockNBlock.arrowOn()
+    clockNBlock.arrowOn()
+    transactions = world.transactionCount
+    clockNBlock.blinkArrow(True, 200)
+    clockNBlock.arrowOn()
+
+    # The blink could have turned the arrow off on the board, so the arrow gets written again
+    assert world.transactionCount == transactions + 2
+    assert feeder.arrowOnFlg
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from Objects.waypointStreamer import WaypointStreamer
+
+
+@pytest.fixture
+def robot(world):
+    world.robot.homeRobot(True)
+    world.robot.waypointBufferSize = 8
+    return world.robot
+
+
+def makeWaypoints(count: int) -> np.ndarray:
+    return np.column_stack((np.linspace(0, 100, count), np.zeros(count), np.full(count, -1300)))
+
+
+def test_startOnlySendsTheFirstWaypoints(robot):
+    streamer = WaypointStreamer(robot, initialWaypoints=4, waypointsPerProcess=2)
+
+    assert streamer.start(makeWaypoints(20), 100)
+
+    assert robot.waypointsAdded == 4
+    assert streamer.isStreaming()
+
+
+def test_processSendsTheRest(world, robot):
+    streamer = WaypointStreamer(robot, initialWaypoints=4, waypointsPerProcess=2)
+    waypoints = makeWaypoints(20)
+    streamer.start(waypoints, 100)
+
+    while streamer.process():
+        world.advance(0.02)
+    robot.waitWhileRobotIsMoving()
+
+    assert robot.waypointsAdded == 20
+    np.testing.assert_allclose(robot.position, waypoints[-1])
+
+
+def test_fullBufferIsNotOverfilled(world, robot):
+    streamer = WaypointStreamer(robot, initialWaypoints=16, waypointsPerProcess=4)
+
+    streamer.start(makeWaypoints(20), 100)
+
+    # It stops at the board's buffer size before the robot starts moving
+    assert robot.waypointsAdded == robot.waypointBufferSize
+    assert streamer.process()
+    assert streamer.bufferFullCount == 1
+
+
+def test_speedsGoWithTheirWaypoints(robot):
+    streamer = WaypointStreamer(robot, initialWaypoints=3)
+    streamer.start(makeWaypoints(3), [50, 60, 70])
+
+    assert [speed for _point, speed in robot.waypoints] == [50, 60, 70]
+
+
+def test_finishSendsEverything(robot):
+    streamer = WaypointStreamer(robot, initialWaypoints=2)
+    streamer.start(makeWaypoints(12), 100)
+
+    assert streamer.finish()
+    assert not streamer.isStreaming()
+    assert robot.waypointsAdded == 12
+
+
+def test_stopsWhenTheRobotDoesNotTakeWaypoints(robot):
+    streamer = WaypointStreamer(robot, initialWaypoints=2)
+    streamer.start(makeWaypoints(12), 100)
+
+    robot.pressEStop()
+
+    assert not streamer.process()
+    assert not streamer.isStreaming()
@@ -1,38 +1,59 @@
 """ Main file for the project. Sets up all global objects and runs the Objects loop."""
-from time import sleep
-
-from dpeaDPi.DPiSolenoid import DPiSolenoid
-
 import Objects.constants as constants
+import Objects.hardware as hardware
 from Objects.robotArm import RobotArm
 from Objects.buildSite import BuildSite
 from Objects.blockFeeder import BlockFeeder
 from Objects.clock import Clock
+from Objects.hardwareMonitor import HardwareMonitor
+from Objects.scheduler import Scheduler
 
 
-# Create the DPiSolenoid object since it is referenced by multiple objects
-dpiSolenoid = DPiSolenoid()
+# Global objects, made by createObjects()
+dpiSolenoid = None
+buildSites = []
+blockFeeders = []
+clock = None
+robot = None
+hardwareMonitor = None
 
-dpiSolenoid.setBoardNumber(0)
+# Runs the objects in main(), and where the hands were and how fast they were going last time the clock was processed
+scheduler = None
+minutePos = None
+minuteSpeed = None
+hourPos = None
+hourSpeed = None
 
-if not dpiSolenoid.initialize():
-    raise Exception("Solenoid initialization failed")
 
+def createObjects():
+    """Creates all of our objects. To run in the simulation, call hardware.useSimulation() first"""
+    global dpiSolenoid, buildSites, blockFeeders, clock, robot, hardwareMonitor
 
-buildSites = []
-for idx, location in enumerate(constants.buildLocations):
-    buildSites.append(BuildSite(idx, location[0], location[1]))
+    # Create the DPiSolenoid object since it is referenced by multiple objects
+    dpiSolenoid = hardware.createSolenoid()
 
-blockFeeders = []
-for num, blockFeederInfo in enumerate(zip(constants.blockFeederLocations, constants.blockFeederSolenoids)):
-    blockFeeders.append(BlockFeeder(blockFeederInfo[0], blockFeederInfo[1], num, dpiSolenoid))
+    dpiSolenoid.setBoardNumber(0)
+
+    if not dpiSolenoid.initialize():
+        raise Exception("Solenoid initialization failed")
 
+    buildSites = []
+    for idx, location in enumerate(constants.buildLocations):
+        buildSites.append(BuildSite(idx, location[0], location[1]))
 
-clock = Clock()
+    blockFeeders = []
+    for num, blockFeederInfo in enumerate(zip(constants.blockFeederLocations, constants.blockFeederSolenoids)):
+        blockFeeders.append(BlockFeeder(blockFeederInfo[0], blockFeederInfo[1], num, dpiSolenoid))
 
+    clock = Clock()
 
-# Create the robot arm object
-robot = RobotArm(dpiSolenoid, constants.magnetSolenoid, constants.rotationSolenoid, buildSites, blockFeeders)
+    # Create the robot arm object
+    robot = RobotArm(dpiSolenoid, constants.magnetSolenoid, constants.rotationSolenoid, buildSites, blockFeeders)
+
+    # Reads the boards once for everyone instead of each object reading them itself
+    hardwareMonitor = HardwareMonitor(robot.dpiRobot, clock.dpiStepper, Clock.HOUR_HAND_PIN, Clock.MINUTE_HAND_PIN)
+    robot.hardwareMonitor = hardwareMonitor
+    clock.hardwareMonitor = hardwareMonitor
 
 
 def setup():
@@ -63,44 +84,72 @@ def setup():
     if not clock.setup2():
         raise Exception("Clock setup 2 failed")
 
-    main()
 
+def processClock():
+    global minutePos, minuteSpeed, hourPos, hourSpeed
+    clock.process()
+    hourPos, minutePos = clock.getPositionDegrees()
+    minuteSpeed = clock.getMinuteHandSpeed()
+    hourSpeed = clock.getHourHandSpeed()
 
-def main():
 
-    while True:
-        # Process all  the loops
-        if robot.isHomedFlg:
-            clock.process()
-            hourPos, minutePos = clock.getPositionDegrees()
+def processBlockFeeders():
+    [blockFeeder.process(minutePos) for blockFeeder in blockFeeders]
+
+
+def processBuildSites():
+    [buildSite.process(minutePos) for buildSite in buildSites]
+
 
-            [blockFeeder.process(minutePos) for blockFeeder in blockFeeders]
-            [buildSite.process(minutePos) for buildSite in buildSites]
+def processRobot():
+    robot.process(minutePos, minuteSpeed, hourPos, hourSpeed)
 
-            robot.process(minutePos)
+    # With no block to pick up or nowhere to put it, the robot is waiting on the minute hand, see Clock
+    clock.robotMovingFlg = robot.isMoving()
+    clock.nothingToBuildFlg = (not any(blockFeeder.isReadyFlg for blockFeeder in blockFeeders)
+                               or not any(buildSite.isReadyFlg for buildSite in buildSites))
 
-            if robot.state == robot.STATE_IDLE:
-                clock.robotIdleFlg = True
-            else:
-                clock.robotIdleFlg = False
 
+def createScheduler() -> Scheduler:
+    """Each object gets processed at its own rate, see the process rates in constants
+    The clock goes first so everything else has the minute hand position
+    In the simulation the hardware monitor's reads go in here too, on the real hardware they get their own thread
+    """
+    newScheduler = Scheduler()
+    if hardware.isSimulated():
+        hardwareMonitor.addTasks(newScheduler)
+    else:
+        hardwareMonitor.start()
+    newScheduler.addTask('clock', processClock, constants.clockProcessRate)
+    newScheduler.addTask('blockFeeders', processBlockFeeders, constants.feederProcessRate)
+    newScheduler.addTask('buildSites', processBuildSites, constants.buildSiteProcessRate)
+    newScheduler.addTask('robot', processRobot, constants.robotProcessRate)
+    return newScheduler
+
+
+def main(duration: float = None):
+    """Runs the loop, forever unless a duration in seconds is given"""
+    global scheduler
+    scheduler = createScheduler()
+    startTime = hardware.time()
+
+    while duration is None or hardware.time() - startTime < duration:
+        # Process all  the loops
+        if robot.isHomedFlg:
+            scheduler.runOnce()
 
         # Read for when the E-Stop gets released
         elif robot.dpiRobot.getRobotStatus()[1] != robot.dpiRobot.STATE_NOT_HOMED:
             clock.emergencyStop()
-            sleep(0.1)
+            hardware.sleep(0.1)
 
         else:
             setup()
-
+            # Everything has moved while we set up, start fresh
+            scheduler.reset()
 
 
 if __name__ == '__main__':
+    createObjects()
     setup()
-
-
-
-
-
-
-
+    main()